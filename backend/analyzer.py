@@ -1,8 +1,17 @@
+from bisect import bisect_left, bisect_right, insort
 from collections import defaultdict
-from datetime import datetime, timedelta
 import logging
+import time
 from enum import Enum
-from typing import Dict, List, Any, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional
+
+from backend.baselines import BaselineStore
+from backend.business_calendar import BusinessCalendar, load_calendar
+from backend.history_store import SessionHistoryStore
+from backend.ip_detector import SourceIpDetector
+from backend.log_entry import LogEntry
+from backend.risk_rules import RuleSet, load_rules, reject_reload, reload_if_changed
+from backend.session_tracker import SessionTracker
 
 
 class RiskFactors(Enum):
@@ -11,77 +20,141 @@ class RiskFactors(Enum):
     MULTIPLE_FAILED_LOGINS = 'multiple_failed_logins'
     REMOTE_LOGIN = 'remote_login'
 
+# Seconds between checks of the rules file for changes
+RULES_CHECK_INTERVAL = 5.0
+
 
-def get_session_duration(logon_time: str, logoff_time: str) -> Optional[float]:
-    """Calculate the duration of a session."""
-    try:
-        logon_dt = datetime.strptime(logon_time, '%Y-%m-%d %H:%M:%S')
-        logoff_dt = datetime.strptime(logoff_time, '%Y-%m-%d %H:%M:%S')
-        return (logoff_dt - logon_dt).total_seconds()
-    except ValueError as e:
-        logging.error(f"Error parsing timestamps: {e}")
+def get_session_duration(logon_time: int, logoff_time: int) -> Optional[float]:
+    """Calculate the duration of a session from epoch-second timestamps."""
+    if logon_time is None or logoff_time is None:
         return None
+    return float(logoff_time - logon_time)
 
 
 class SessionAnalyzer:
-    def __init__(self, business_hours: Tuple[int, int] = (9, 18)):
+    def __init__(
+            self,
+            business_hours: Optional[Tuple[int, int]] = None,
+            rapid_login_window: Optional[int] = None,
+            rapid_login_threshold: Optional[int] = None,
+            history: Optional[SessionHistoryStore] = None,
+            sessions: Optional[SessionTracker] = None,
+            rules: Optional[RuleSet] = None,
+            ip_detector: Optional[SourceIpDetector] = None,
+            baselines: Optional[BaselineStore] = None,
+            calendar: Optional[BusinessCalendar] = None
+    ):
         """
         Initialize the SessionAnalyzer.
         Args:
-            business_hours: Tuple defining start and end of business hours (24-hour format)
-        """
-        if not (0 <= business_hours[0] < 24 and 0 <= business_hours[1] < 24):
-            raise ValueError("Business hours must be between 0 and 23")
-        if business_hours[0] >= business_hours[1]:
-            raise ValueError("Start time must be before end time")
-
-        self.session_history: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
-        self.logon_sessions: Dict[str, str] = {}
-        self.business_hours = business_hours
-
-        self.RISK_WEIGHTS = {
-            RiskFactors.OUTSIDE_BUSINESS_HOURS.value: 15,
-            RiskFactors.RAPID_LOGIN_ATTEMPTS.value: 30,
-            RiskFactors.MULTIPLE_FAILED_LOGINS.value: 20,
-            RiskFactors.REMOTE_LOGIN.value: 10
+            business_hours: Tuple defining start and end of business hours (24-hour, local time);
+                overrides the saved settings and the rules file
+            rapid_login_window: Seconds around a logon in which earlier attempts count as rapid;
+                overrides the rules file
+            rapid_login_threshold: Number of earlier attempts within the window that makes a logon
+                rapid; overrides the rules file
+            history: Bounded store for per-user session history; defaults to a
+                SessionHistoryStore with its default retention and memory limits
+            sessions: Logon/logoff pairing engine; defaults to a SessionTracker
+                with its default TTL
+            rules: Compiled risk rules; defaults to backend/risk_rules.json
+            ip_detector: Per-source-IP brute-force and spray detector; defaults to a
+                SourceIpDetector with its default window and sketch sizes
+            baselines: Per-user behavioral baselines; defaults to a BaselineStore
+                with its default half-life
+            calendar: Per-user business hours in local time; defaults to the calendar
+                loaded from the saved settings and business_calendar.json
+        """
+        self._window_overrides = {
+            'business_hours': business_hours,
+            'rapid_login_window': rapid_login_window,
+            'rapid_login_threshold': rapid_login_threshold,
         }
+        self.rules = (rules if rules is not None else load_rules()).with_windows(**self._window_overrides)
+        self._rules_checked_at = time.monotonic()
+        self.calendar = calendar if calendar is not None else load_calendar(
+            default_hours=business_hours, fallback_hours=self.rules.business_hours
+        )
+
+        self.session_history = history if history is not None else SessionHistoryStore()
+        self.recent_logons: Dict[str, List[int]] = defaultdict(list)
+        self._window_floors: Dict[str, int] = {}
+        self.session_history.on_user_evicted = self._forget_user
+        self.sessions = sessions if sessions is not None else SessionTracker()
+        self.ip_detector = ip_detector if ip_detector is not None else SourceIpDetector()
+        self.baselines = baselines if baselines is not None else BaselineStore()
 
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
 
-    def get_logon_time(self, logon_id: str) -> Optional[str]:
-        """Retrieve the logon time for a given logon_id."""
-        return self.logon_sessions.get(logon_id)
+    @property
+    def business_hours(self) -> Tuple[int, int]:
+        return self.calendar.default_hours
+
+    @property
+    def rapid_login_window(self) -> int:
+        return self.rules.rapid_login_window
+
+    @property
+    def rapid_login_threshold(self) -> int:
+        return self.rules.rapid_login_threshold
+
+    def reload_rules(self, force: bool = False) -> bool:
+        """
+        Pick up changes to the rules file, checking at most every RULES_CHECK_INTERVAL seconds.
+
+        The new rules are compiled completely before the reference is swapped,
+        so events are always scored against one consistent rule set.
+
+        Returns:
+            True if new rules were loaded
+        """
+        now = time.monotonic()
+        if not force and now - self._rules_checked_at < RULES_CHECK_INTERVAL:
+            return False
+        self._rules_checked_at = now
+
+        reloaded = reload_if_changed(self.rules)
+        if reloaded is None:
+            return False
+        try:
+            self.rules = reloaded.with_windows(**self._window_overrides)
+        except ValueError as e:
+            logging.error(f"Keeping current risk rules, reloaded windows are invalid: {e}")
+            reject_reload(reloaded)
+            return False
+        if self.calendar.hours_from_fallback and self.calendar.default_hours != self.rules.business_hours:
+            self.calendar = self.calendar.with_default_hours(self.rules.business_hours, hours_from_fallback=True)
+        return True
+
+    def get_logon_time(self, logon_id: str, host: str = '') -> Optional[int]:
+        """Retrieve the logon time of the open session with this logon_id."""
+        return self.sessions.get_logon_time(logon_id, host)
 
-    def record_logon_event(self, logon_id: str, logon_time: str) -> None:
+    def record_logon_event(self, logon_id: str, logon_time: int, host: str = '') -> None:
         """Record a logon event for tracking."""
-        if not isinstance(logon_id, str) or not isinstance(logon_time, str):
+        if not isinstance(logon_id, str) or not isinstance(logon_time, int):
             raise ValueError("Invalid input types")
-        self.logon_sessions[logon_id] = logon_time
-
-    def record_logoff_event(self, logon_id: str, logoff_time: str) -> Optional[float]:
-        """Record a logoff event and calculate session duration."""
-        logon_time = self.get_logon_time(logon_id)
-        if logon_time:
-            duration = get_session_duration(logon_time, logoff_time)
-            del self.logon_sessions[logon_id]  # Remove logon session after logoff
-            return duration
-        return None
+        self.sessions.on_logon(LogEntry(epoch=logon_time, host=host, event_type='Logon', logon_id=logon_id))
+
+    def record_logoff_event(self, logon_id: str, logoff_time: int, host: str = '') -> Optional[float]:
+        """Record a logoff event and return the session duration if its logon was seen."""
+        return self.sessions.on_logoff(LogEntry(epoch=logoff_time, host=host, event_type='Logoff', logon_id=logon_id))
 
     @staticmethod
-    def is_human_session(log_entry):
+    def is_human_session(log_entry: LogEntry):
         """
         Determine if a log entry represents a human session.
-        :param log_entry: Dictionary containing log details.
+        :param log_entry: LogEntry containing log details.
         :return: True if the session is human, False otherwise.
         """
         system_accounts = {'SYSTEM', 'LOCAL SERVICE', 'NETWORK SERVICE', 'ANONYMOUS LOGON'}
         system_prefixes = ('$', 'NT ', 'UMFD-', 'DWM-', 'WINDOW MANAGER')
 
-        user = log_entry.get('user', '').upper()
-        logon_type = log_entry.get('logon_type', '')
+        user = log_entry.user.upper()
+        logon_type = log_entry.logon_type
 
         return (
             user
@@ -90,69 +163,90 @@ class SessionAnalyzer:
             and logon_type in {'Interactive', 'RemoteInteractive', 'CachedInteractive', 'Unlock'}
         )
 
-    def is_business_hours(self, timestamp: str) -> bool:
+    def is_business_hours(self, log_entry: LogEntry) -> bool:
         """
-        Check if the given timestamp falls within business hours.
-        :param timestamp: String representation of the timestamp.
+        Check if the entry falls within its user's business hours, in local time.
+        :param log_entry: LogEntry with the user and epoch of the event.
         :return: True if within business hours, False otherwise.
         """
-        try:
-            dt = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-            return (
-                 self.business_hours[0] <= dt.hour < self.business_hours[1]
-            )
-        except ValueError:
-            logging.warning(f"Invalid timestamp format: {timestamp}")
-            return False
-
-    def is_rapid_login(self, log_entry: Dict[str, Any]) -> bool:
+        return self.calendar.is_business_hours(log_entry.user, log_entry.epoch)
+
+    def _forget_user(self, user: str) -> None:
+        """Drop per-user state once the history store has evicted the user entirely."""
+        self.recent_logons.pop(user, None)
+        self._window_floors.pop(user, None)
+
+    def restore_recent_logons(self, windows: Dict[str, Iterable[int]]) -> None:
+        """Replace the rapid-login windows, e.g. from a snapshot; they may be in any order."""
+        self.recent_logons.clear()
+        self._window_floors.clear()
+        for user, epochs in windows.items():
+            self.recent_logons[user] = sorted(int(epoch) for epoch in epochs)
+
+    def record_session(self, log_entry: LogEntry) -> None:
+        """Add an assessed entry to the user's history and rapid-login window."""
+        self.session_history.append(log_entry)
+        if log_entry.event_type == 'Logon':
+            insort(self.recent_logons[log_entry.user], log_entry.epoch)
+
+    def is_rapid_login(self, log_entry: LogEntry) -> bool:
         """
-        Detects rapid logins within 60 seconds.
-        Returns True if 3 or more login attempts occur in 60 seconds.
+        Detects rapid logins within the rapid login window (60 seconds by default).
+        Returns True if the user already has rapid_login_threshold (2) recorded
+        logon attempts within the window, i.e. 3 or more attempts in total.
+
+        Each user's window is a sorted list of epochs, counted with bisect.
         """
-        if log_entry['event_type'] != 'Logon':
+        if log_entry.event_type != 'Logon':
             return False
 
-        user = log_entry['user']
-        current_time = datetime.strptime(log_entry['timestamp'], '%Y-%m-%d %H:%M:%S')
-
-        # Get all login attempts for this user in the last minute
-        recent_attempts = [
-            entry for entry in self.session_history[user]
-            if entry['event_type'] == 'Logon'
-            and abs((datetime.strptime(entry['timestamp'], '%Y-%m-%d %H:%M:%S') - current_time).total_seconds()) <= 60
-        ]
-        # print("len(recent_attempts): ", len(recent_attempts))
-
-        return len(recent_attempts) >= 2
+        window = self.recent_logons.get(log_entry.user)
+        if not window:
+            return False
 
-    def enrich_log_entry(self, log_entry: Dict[str, Any]) -> None:
+        current_time = log_entry.epoch
+        span = self.rapid_login_window
+        # Trim only epochs no later logon can reach, whatever order events arrive in:
+        # 1. A logon newer than every recorded one makes the previous newest epoch the floor
+        # 2. Drop epochs after t + window that are also a window below the newest epoch
+        # 3. Every later logon is newer than the floor, so drop epochs a window below it
+        if current_time > window[-1]:
+            self._window_floors[log_entry.user] = window[-1]
+        floor = self._window_floors.get(log_entry.user)
+        del window[bisect_right(window, current_time + span):bisect_left(window, window[-1] - span)]
+        if floor is not None:
+            del window[:bisect_left(window, floor - span)]
+
+        recent = bisect_right(window, current_time + span) - bisect_left(window, current_time - span)
+        return recent >= self.rapid_login_threshold
+
+    def enrich_log_entry(self, log_entry: LogEntry) -> None:
         """
-        Analyze and enrich a log entry with risk factors and a risk score.
-        :param log_entry: Dictionary containing log details.
+        Analyze and enrich a log entry with its window features, source IP verdict,
+        behavioral rarity, risk factors and risk score.
+        :param log_entry: LogEntry containing log details.
         """
-        if not isinstance(log_entry, dict) or 'timestamp' not in log_entry:
+        if not isinstance(log_entry, LogEntry):
             raise ValueError("Invalid log entry format")
 
-        user = log_entry.get('user')
-        timestamp = log_entry.get('timestamp')
+        self.enrich_user_features(log_entry)
+        self.score_log_entry(log_entry)
 
-        risk_factors = []
-
-        # Analyze risk factors
-        if not self.is_business_hours(timestamp):
-            risk_factors.append(RiskFactors.OUTSIDE_BUSINESS_HOURS.value)
-
-        if user in self.session_history:
-            if self.is_rapid_login(log_entry):
-                risk_factors.append(RiskFactors.RAPID_LOGIN_ATTEMPTS.value)
-
-        if log_entry.get('status') == 'failed':
-            risk_factors.append(RiskFactors.MULTIPLE_FAILED_LOGINS.value)
-
-        if log_entry.get('logon_type') == 'RemoteInteractive':
-            risk_factors.append(RiskFactors.REMOTE_LOGIN.value)
+    def enrich_user_features(self, log_entry: LogEntry) -> None:
+        """
+        Set the features that depend only on the entry's user: rapid login,
+        business hours and behavioral rarity.
+        :param log_entry: LogEntry containing log details.
+        """
+        log_entry.is_rapid_login = self.is_rapid_login(log_entry)
+        log_entry.is_business_hours = self.is_business_hours(log_entry)
+        log_entry.behavior_rarity = self.baselines.observe(log_entry)
 
-        # Calculate risk score
-        log_entry['risk_factors'] = risk_factors
-        log_entry['risk_score'] = sum(self.RISK_WEIGHTS[risk] for risk in risk_factors)
+    def score_log_entry(self, log_entry: LogEntry) -> None:
+        """
+        Set the source IP verdict, then evaluate the risk rules over the
+        entry's features.
+        :param log_entry: LogEntry with its user features already set.
+        """
+        self.ip_detector.observe(log_entry)
+        log_entry.risk_factors, log_entry.risk_score = self.rules.evaluate(log_entry)
@@ -0,0 +1,231 @@
+# baselines.py
+import math
+from array import array
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.log_entry import LogEntry
+from backend.timeUtils import DAY_NAMES
+
+HOURS_PER_WEEK = 168
+DEFAULT_HALF_LIFE = 30 * 24 * 3600
+DEFAULT_MAX_USERS = 10000
+DEFAULT_MAX_TABLE_KEYS = 32
+# Decayed logon count a user needs before their baseline is trusted
+DEFAULT_MIN_OBSERVATIONS = 5.0
+
+# Rebase stored weights before exp() of the growth exponent leaves a safe float range
+_MAX_EXPONENT = 300.0
+
+_WEEKDAY_INDEX = {name: index for index, name in enumerate(DAY_NAMES)}
+
+
+def hour_of_week(log_entry: LogEntry) -> int:
+    """Bucket 0..167 for the entry's day_of_week and hour_of_day, Monday 00:00 first."""
+    return _WEEKDAY_INDEX.get(log_entry.day_of_week, 0) * 24 + log_entry.hour_of_day
+
+
+class UserBaseline:
+    """
+    One user's decayed logon frequencies by hour of week, logon type and workstation.
+
+    Decay is applied lazily: instead of shrinking every bucket as time
+    passes, each new observation is added with weight exp(rate * (t - reference)),
+    which grows with time. Ratios between buckets are then exactly those of
+    the decayed counts, and an update touches a single bucket.
+    """
+    __slots__ = ('reference', 'hours', 'max_hour', 'logon_types', 'workstations', 'total')
+
+    def __init__(self, reference: int):
+        self.reference = reference
+        self.hours = array('d', bytes(8 * HOURS_PER_WEEK))
+        self.max_hour = 0.0
+        self.logon_types: Dict[str, float] = {}
+        self.workstations: Dict[str, float] = {}
+        self.total = 0.0
+
+    def rebase(self, reference: int, rate: float) -> None:
+        """Rescale the stored weights to a new reference time."""
+        factor = math.exp(-rate * (reference - self.reference))
+        hours = self.hours
+        for bucket in range(HOURS_PER_WEEK):
+            if hours[bucket]:
+                hours[bucket] *= factor
+        self.max_hour *= factor
+        self.total *= factor
+        for table in (self.logon_types, self.workstations):
+            for key in table:
+                table[key] *= factor
+        self.reference = reference
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'ref': self.reference,
+            'total': float(f"{self.total:.6g}"),
+            'hours': [[b, float(f"{w:.4g}")] for b, w in enumerate(self.hours) if w],
+            'logon_types': {k: float(f"{w:.4g}") for k, w in self.logon_types.items()},
+            'workstations': {k: float(f"{w:.4g}") for k, w in self.workstations.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'UserBaseline':
+        baseline = cls(int(data['ref']))
+        for bucket, weight in data.get('hours', []):
+            baseline.hours[int(bucket)] = float(weight)
+        baseline.max_hour = max(baseline.hours)
+        baseline.total = float(data.get('total', 0.0))
+        baseline.logon_types = {k: float(w) for k, w in data.get('logon_types', {}).items()}
+        baseline.workstations = {k: float(w) for k, w in data.get('workstations', {}).items()}
+        return baseline
+
+
+def _table_rarity(table: Dict[str, float], key: str) -> float:
+    return 1.0 - table.get(key, 0.0) / max(table.values())
+
+
+def _table_add(table: Dict[str, float], key: str, weight: float, max_keys: int) -> None:
+    table[key] = table.get(key, 0.0) + weight
+    if len(table) > max_keys:
+        del table[min((k for k in table if k != key), key=table.get)]
+
+
+class BaselineStore:
+    """
+    Per-user behavioral baselines, updated in O(1) per logon, that score how
+    unusual a logon is for that user.
+
+    behavior_rarity is 0 for a logon at the user's most common hour of week,
+    with their most common logon type and workstation, and 1 when any of the
+    three was never seen for the user. Users without DEFAULT_MIN_OBSERVATIONS
+    decayed logons score 0. Only successful logons update the baseline.
+
+    A logon must only be scored against earlier logons, but runs read the log
+    newest first. So observed logons are held back until commit, which adds
+    them oldest first once the run has been read: every logon of a run is
+    scored against the baseline built by the runs before it, never against
+    later logons of its own run.
+    """
+
+    def __init__(
+            self,
+            half_life: float = DEFAULT_HALF_LIFE,
+            max_users: int = DEFAULT_MAX_USERS,
+            max_table_keys: int = DEFAULT_MAX_TABLE_KEYS,
+            min_observations: float = DEFAULT_MIN_OBSERVATIONS
+    ):
+        """
+        Args:
+            half_life: Seconds after which an observation counts half
+            max_users: Users kept; the least recently active are dropped first
+            max_table_keys: Logon types and workstations kept per user
+            min_observations: Decayed logon count needed before rarity is scored
+        """
+        if half_life <= 0 or max_users < 1 or max_table_keys < 1:
+            raise ValueError("Baseline limits must be positive")
+        self.half_life = half_life
+        self.rate = math.log(2) / half_life
+        self.max_users = max_users
+        self.max_table_keys = max_table_keys
+        self.min_observations = min_observations
+        self._users: 'OrderedDict[str, UserBaseline]' = OrderedDict()
+        # (epoch, user, hour of week, logon type, workstation) of logons observed since the last commit
+        self._pending: List[Tuple[int, str, int, str, str]] = []
+
+    def __contains__(self, user: str) -> bool:
+        return user in self._users
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get(self, user: str) -> Optional[UserBaseline]:
+        return self._users.get(user)
+
+    def _growth(self, baseline: UserBaseline, epoch: int) -> float:
+        exponent = self.rate * (epoch - baseline.reference)
+        if abs(exponent) > _MAX_EXPONENT:
+            baseline.rebase(epoch, self.rate)
+            return 1.0
+        return math.exp(exponent)
+
+    def rarity(self, log_entry: LogEntry) -> float:
+        """How unusual the entry is for its user, from 0 (typical) to 1 (never seen)."""
+        baseline = self._users.get(log_entry.user)
+        if baseline is None:
+            return 0.0
+        growth = self._growth(baseline, log_entry.epoch)
+        if baseline.total < self.min_observations * growth:
+            return 0.0
+
+        # Combined as 1 - product of the per-dimension typicalities, so any
+        # one never-seen dimension makes the logon fully rare
+        typical = baseline.hours[hour_of_week(log_entry)] / baseline.max_hour
+        if log_entry.logon_type and baseline.logon_types:
+            typical *= 1.0 - _table_rarity(baseline.logon_types, log_entry.logon_type)
+        if log_entry.workstation_name and baseline.workstations:
+            typical *= 1.0 - _table_rarity(baseline.workstations, log_entry.workstation_name)
+        return round(1.0 - typical, 4)
+
+    def update(self, log_entry: LogEntry) -> None:
+        """Add a logon to its user's baseline."""
+        self._learn(
+            log_entry.epoch, log_entry.user, hour_of_week(log_entry), log_entry.logon_type, log_entry.workstation_name
+        )
+
+    def _learn(self, epoch: int, user: str, bucket: int, logon_type: str, workstation_name: str) -> None:
+        baseline = self._users.get(user)
+        if baseline is None:
+            baseline = self._users[user] = UserBaseline(epoch)
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user)
+
+        weight = self._growth(baseline, epoch)
+        baseline.hours[bucket] += weight
+        if baseline.hours[bucket] > baseline.max_hour:
+            baseline.max_hour = baseline.hours[bucket]
+        baseline.total += weight
+        if logon_type:
+            _table_add(baseline.logon_types, logon_type, weight, self.max_table_keys)
+        if workstation_name:
+            _table_add(baseline.workstations, workstation_name, weight, self.max_table_keys)
+
+    def observe(self, log_entry: LogEntry) -> float:
+        """Score the entry against its user's baseline; a successful logon is learnt from at the next commit."""
+        rarity = self.rarity(log_entry)
+        if log_entry.event_type == 'Logon' and log_entry.status == 'success':
+            self._pending.append((
+                log_entry.epoch, log_entry.user, hour_of_week(log_entry),
+                log_entry.logon_type, log_entry.workstation_name
+            ))
+        return rarity
+
+    def commit(self) -> int:
+        """
+        Learn from the logons observed since the last commit, oldest first.
+
+        Returns:
+            The number of logons added
+        """
+        pending, self._pending = self._pending, []
+        pending.sort(key=itemgetter(0))
+        for observed in pending:
+            self._learn(*observed)
+        return len(pending)
+
+    def discard(self) -> None:
+        """Drop the logons observed since the last commit, e.g. of a run that will be read again."""
+        self._pending = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Compact form for persistence: sparse hour buckets, weights to four significant digits."""
+        return {user: baseline.to_dict() for user, baseline in self._users.items()}
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Replace the baselines with ones saved by to_dict."""
+        self._users = OrderedDict((user, UserBaseline.from_dict(saved)) for user, saved in data.items())
+
+    def clear(self) -> None:
+        self._users.clear()
+        self._pending = []
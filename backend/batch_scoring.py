@@ -0,0 +1,208 @@
+# batch_scoring.py
+from dataclasses import MISSING, dataclass, fields as dataclass_fields
+from typing import Any, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backend.analyzer import SessionAnalyzer
+from backend.log_entry import LogEntry
+from backend.risk_rules import RuleSet
+
+ENTRY_DEFAULTS = {
+    field.name: field.default for field in dataclass_fields(LogEntry) if field.default is not MISSING
+}
+
+# Columns score_batch builds itself; rules may read any other LogEntry field via `columns`
+BATCH_COLUMNS = frozenset((
+    'epoch', 'user', 'status', 'event_type', 'hour_of_day', 'is_business_hours', 'is_rapid_login'
+))
+
+
+@dataclass
+class BatchScores:
+    """Per-row scores for a batch, aligned with the input rows."""
+    is_business_hours: np.ndarray
+    is_rapid_login: np.ndarray
+    risk_mask: np.ndarray
+    risk_score: np.ndarray
+    rules: RuleSet
+
+    def risk_factors(self) -> List[Tuple[str, ...]]:
+        """Decode the bitmask into the risk_factors tuples the per-event path sets."""
+        decode = self.rules.decode
+        return [decode(mask) for mask in self.risk_mask.tolist()]
+
+
+def rapid_login_flags(
+        epochs: np.ndarray,
+        user_codes: np.ndarray,
+        window: int,
+        threshold: int
+) -> np.ndarray:
+    """
+    Flag rows with at least `threshold` earlier rows of the same user within `window` seconds.
+
+    Rows must be in time order, ascending or descending, as SessionAnalyzer
+    sees them. A stable sort by user keeps each user's rows in arrival order,
+    so their times stay monotonic and the `threshold`-th earlier row is the
+    farthest of the last `threshold`: a row is rapid exactly when that row
+    belongs to the same user and lies within the window.
+
+    Args:
+        epochs: Event times in epoch seconds, in arrival order
+        user_codes: Non-negative integer user code per row
+        window: Rapid login window in seconds
+        threshold: Earlier attempts within the window that make a row rapid
+
+    Returns:
+        Boolean array, True where the row is a rapid login
+    """
+    n = len(epochs)
+    flags = np.zeros(n, dtype=bool)
+    if n <= threshold:
+        return flags
+
+    times = np.asarray(epochs, dtype=np.int64)
+    steps = np.diff(times)
+    if not ((steps >= 0).all() or (steps <= 0).all()):
+        raise ValueError("Batch rows must be in time order (ascending or descending)")
+
+    user_codes = np.asarray(user_codes)
+    if user_codes.max() < 1 << 16:
+        # numpy radix-sorts 16-bit keys, which is linear rather than a merge sort
+        user_codes = user_codes.astype(np.uint16)
+    order = np.argsort(user_codes, kind='stable')
+    times = times[order]
+    users = user_codes[order]
+
+    k = threshold
+    flags[order[k:]] = (users[k:] == users[:-k]) & (np.abs(times[k:] - times[:-k]) <= window)
+    return flags
+
+
+def score_batch(
+        epochs: Sequence[int],
+        users: Sequence[str],
+        statuses: Sequence[str],
+        event_types: Optional[Sequence[str]] = None,
+        hours: Optional[Sequence[int]] = None,
+        analyzer: Optional[SessionAnalyzer] = None,
+        columns: Optional[Mapping[str, Sequence[Any]]] = None
+) -> BatchScores:
+    """
+    Score a column-oriented batch the way enrich_log_entry scores one entry at a time.
+
+    The batch is scored as if it were fed through assess_risk from empty
+    rapid-login windows, in row order, with the analyzer's windows and its
+    compiled risk rules evaluated column-wise.
+
+    Args:
+        epochs: Event times in epoch seconds, in time order
+        users: User name per row
+        statuses: 'success' or 'failed' per row
+        event_types: Event type per row; only 'Logon' rows count towards rapid logins.
+            Defaults to all rows being logons
+        hours: Local hour of day per row; defaults to the hour derived from the epoch
+        analyzer: Analyzer supplying the calendar, windows and rules; defaults to a fresh SessionAnalyzer
+        columns: Further LogEntry fields the rules read, e.g. 'logon_type' or 'ip_verdict';
+            fields not given take their LogEntry default
+
+    Returns:
+        BatchScores aligned with the input rows
+    """
+    analyzer = analyzer if analyzer is not None else SessionAnalyzer()
+    rules = analyzer.rules
+    epochs = np.asarray(epochs, dtype=np.int64)
+    n = len(epochs)
+
+    users = np.asarray(users, dtype=object)
+    calendar = analyzer.calendar
+    if hours is None:
+        hours = calendar.local_epochs(epochs) // 3600 % 24
+    hours = np.asarray(hours, dtype=np.int64)
+    is_business_hours = calendar.business_hours_array(epochs, users)
+
+    if event_types is None:
+        event_types = np.full(n, 'Logon', dtype=object)
+    event_types = np.asarray(event_types, dtype=object)
+
+    is_rapid_login = np.zeros(n, dtype=bool)
+    user_codes, _ = pd.factorize(users)
+    logon_rows = np.flatnonzero(event_types == 'Logon')
+    is_rapid_login[logon_rows] = rapid_login_flags(
+        epochs[logon_rows], user_codes[logon_rows],
+        rules.rapid_login_window, rules.rapid_login_threshold
+    )
+
+    batch = {name: np.asarray(values) for name, values in (columns or {}).items()}
+    batch.update(
+        epoch=epochs,
+        user=users,
+        status=np.asarray(statuses, dtype=object),
+        event_type=event_types,
+        hour_of_day=hours,
+        is_business_hours=is_business_hours,
+        is_rapid_login=is_rapid_login,
+    )
+    for name in rules.fields.difference(batch):
+        batch[name] = np.full(n, ENTRY_DEFAULTS[name], dtype=object)
+    risk_mask, risk_score = rules.evaluate_columns(batch, n)
+
+    return BatchScores(
+        is_business_hours=is_business_hours,
+        is_rapid_login=is_rapid_login,
+        risk_mask=risk_mask,
+        risk_score=risk_score,
+        rules=rules,
+    )
+
+
+def score_frame(df: pd.DataFrame, analyzer: Optional[SessionAnalyzer] = None) -> pd.DataFrame:
+    """
+    Score a DataFrame with 'epoch', 'user' and 'status' columns (and optionally
+    'event_type', 'hour_of_day' and any field the rules read), returning a copy
+    with the score columns set.
+    """
+    analyzer = analyzer if analyzer is not None else SessionAnalyzer()
+    scores = score_batch(
+        df['epoch'].to_numpy(),
+        df['user'].to_numpy(),
+        df['status'].to_numpy(),
+        event_types=df['event_type'].to_numpy() if 'event_type' in df else None,
+        hours=df['hour_of_day'].to_numpy() if 'hour_of_day' in df else None,
+        analyzer=analyzer,
+        columns={name: df[name].to_numpy() for name in analyzer.rules.fields - BATCH_COLUMNS if name in df},
+    )
+    scored = df.copy()
+    scored['is_business_hours'] = scores.is_business_hours
+    scored['is_rapid_login'] = scores.is_rapid_login
+    scored['risk_factors'] = scores.risk_factors()
+    scored['risk_score'] = scores.risk_score
+    return scored
+
+
+def score_entries(entries: Sequence[LogEntry], analyzer: Optional[SessionAnalyzer] = None) -> BatchScores:
+    """Score LogEntry objects in place, e.g. a historical backfill, and return the raw scores."""
+    analyzer = analyzer if analyzer is not None else SessionAnalyzer()
+    scores = score_batch(
+        [entry.epoch for entry in entries],
+        [entry.user for entry in entries],
+        [entry.status for entry in entries],
+        event_types=[entry.event_type for entry in entries],
+        hours=[entry.hour_of_day for entry in entries],
+        analyzer=analyzer,
+        columns={name: [getattr(entry, name) for entry in entries] for name in analyzer.rules.fields - BATCH_COLUMNS},
+    )
+    for entry, business, rapid, factors, score in zip(
+            entries,
+            scores.is_business_hours.tolist(),
+            scores.is_rapid_login.tolist(),
+            scores.risk_factors(),
+            scores.risk_score.tolist()
+    ):
+        entry.is_business_hours = business
+        entry.is_rapid_login = rapid
+        entry.risk_factors = factors
+        entry.risk_score = score
+    return scores
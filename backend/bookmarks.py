@@ -0,0 +1,80 @@
+# bookmarks.py
+import json
+import logging
+import os
+import socket
+from typing import Dict, Optional
+
+
+def resolve_host(server: str) -> str:
+    """Map the server argument given to OpenEventLog to a stable host name."""
+    if not server or server.lower() in ('localhost', '127.0.0.1', '.'):
+        return socket.gethostname()
+    return server
+
+
+class BookmarkStore:
+    """
+    Persist the last processed RecordNumber per event log channel and host.
+
+    The Security log is read newest-first, so a stored bookmark marks the point
+    where the next backward read can stop: every record at or below it has
+    already been processed by an earlier run.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: JSON file holding the bookmarks
+        """
+        self.path = path
+        self._bookmarks: Dict[str, int] = {}
+        self._load()
+
+    @staticmethod
+    def _key(host: str, channel: str) -> str:
+        return f"{host.lower()}/{channel.lower()}"
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._bookmarks = {str(k): int(v) for k, v in data.items()}
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning(f"Ignoring unreadable bookmark file {self.path}: {e}")
+            self._bookmarks = {}
+
+    def get(self, host: str, channel: str) -> Optional[int]:
+        """Return the last processed RecordNumber, or None if the channel was never read."""
+        return self._bookmarks.get(self._key(host, channel))
+
+    def update(self, host: str, channel: str, record_number: int) -> None:
+        """Advance the bookmark for a channel; older record numbers are ignored."""
+        key = self._key(host, channel)
+        if record_number > self._bookmarks.get(key, -1):
+            self._bookmarks[key] = record_number
+
+    def as_dict(self) -> Dict[str, int]:
+        """Return a copy of all bookmarks, keyed by "host/channel"."""
+        return dict(self._bookmarks)
+
+    def reset(self, host: str, channel: str) -> None:
+        """Forget the bookmark, e.g. after the log was cleared and numbering restarted."""
+        self._bookmarks.pop(self._key(host, channel), None)
+
+    def save(self) -> None:
+        """Write the bookmarks atomically so a crash never leaves a truncated file."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._bookmarks, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Failed to save bookmarks to {self.path}: {e}")
@@ -0,0 +1,291 @@
+# business_calendar.py
+import json
+import logging
+import os
+import pickle
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:
+    ZoneInfo = None
+
+HOURS_PER_WEEK = 168
+ALL_DAYS = tuple(range(7))
+
+# Settings saved by the GUI, and the optional calendar file; both relative to the working directory
+DEFAULT_SETTINGS_PATH = 'user_data.pkl'
+DEFAULT_CALENDAR_PATH = 'business_calendar.json'
+
+# UTC offsets only change on quarter-hour boundaries, so one lookup per quarter hour is exact
+OFFSET_SLOT_SECONDS = 900
+MAX_CACHED_OFFSETS = 1 << 16
+
+# 1970-01-01 was a Thursday
+_EPOCH_WEEKDAY = 3
+_EPOCH_DATE = date(1970, 1, 1)
+
+
+def hour_of_week_mask(start: int, end: int, days: Iterable[int] = ALL_DAYS) -> int:
+    """
+    Bitmask with bit weekday * 24 + hour set for every business hour, Monday 00:00 as bit 0.
+
+    An end before the start wraps past midnight, e.g. (22, 6) for a night shift;
+    the hours after midnight belong to the day the shift started.
+    """
+    if not (0 <= start < 24 and 0 <= end <= 24) or start == end:
+        raise ValueError(f"Invalid business hours {start}-{end}")
+    mask = 0
+    for day in days:
+        if start < end:
+            hours = range(day * 24 + start, day * 24 + end)
+        else:
+            hours = range(day * 24 + start, day * 24 + 24 + end)
+        for hour in hours:
+            mask |= 1 << (hour % HOURS_PER_WEEK)
+    return mask
+
+
+def parse_hour(value: Any) -> Optional[int]:
+    """Read an hour as saved by the settings GUI ('9', 9 or '09:00'); None if unset or invalid."""
+    if value is None or value == '':
+        return None
+    try:
+        hour = int(str(value).split(':')[0])
+    except ValueError:
+        return None
+    return hour if 0 <= hour <= 24 else None
+
+
+class BusinessCalendar:
+    """
+    Business hours per user, in local time, as precomputed hour-of-week masks.
+
+    Events are converted to local time with a per-quarter-hour cache of the
+    UTC offset, which follows DST transitions; checking an event is then a
+    bit test against the user's 168-bit mask, plus a holiday set lookup.
+    """
+
+    def __init__(
+            self,
+            default_hours: Tuple[int, int] = (9, 18),
+            days: Sequence[int] = ALL_DAYS,
+            user_hours: Optional[Mapping[str, Tuple[int, int, Sequence[int]]]] = None,
+            holidays: Iterable[date] = (),
+            tz: Optional[Any] = None,
+            hours_from_fallback: bool = False
+    ):
+        """
+        Args:
+            default_hours: Start and end hour for users without their own hours
+            days: Business weekdays for the default hours, Monday = 0
+            user_hours: Per-user (start, end, days), keyed by user name
+            holidays: Local dates that are never business hours
+            tz: tzinfo events are localised to; None uses the operating system's local time
+            hours_from_fallback: True when default_hours are the rules file's rather than the user's
+                settings, so a rules reload may replace them
+        """
+        self.default_hours = (int(default_hours[0]), int(default_hours[1]))
+        self.days = tuple(days)
+        self.default_mask = hour_of_week_mask(*self.default_hours, self.days)
+        self.user_hours = dict(user_hours or {})
+        self.user_masks: Dict[str, int] = {
+            user.lower(): hour_of_week_mask(start, end, user_days)
+            for user, (start, end, user_days) in self.user_hours.items()
+        }
+        self.holidays: FrozenSet[int] = frozenset((day - _EPOCH_DATE).days for day in holidays)
+        self.tz = tz
+        self.hours_from_fallback = hours_from_fallback
+
+        self._offsets: Dict[int, int] = {}
+        self._mask_rows: Dict[int, np.ndarray] = {}
+
+    def with_default_hours(
+            self,
+            default_hours: Tuple[int, int],
+            hours_from_fallback: bool = False
+    ) -> 'BusinessCalendar':
+        """Return a copy with different default hours."""
+        return BusinessCalendar(
+            default_hours,
+            days=self.days,
+            user_hours=self.user_hours,
+            holidays=(date.fromordinal(_EPOCH_DATE.toordinal() + day) for day in self.holidays),
+            tz=self.tz,
+            hours_from_fallback=hours_from_fallback,
+        )
+
+    def utc_offset(self, epoch: int) -> int:
+        """Local UTC offset in seconds at epoch."""
+        slot = epoch // OFFSET_SLOT_SECONDS
+        offset = self._offsets.get(slot)
+        if offset is None:
+            start = slot * OFFSET_SLOT_SECONDS
+            if self.tz is None:
+                offset = time.localtime(start).tm_gmtoff
+            else:
+                offset = int(datetime.fromtimestamp(start, self.tz).utcoffset().total_seconds())
+            if len(self._offsets) >= MAX_CACHED_OFFSETS:
+                self._offsets.clear()
+            self._offsets[slot] = offset
+        return offset
+
+    def local_time(self, epoch: int) -> Tuple[int, int]:
+        """Return the local (hour of day, weekday) of an epoch, with Monday as weekday 0."""
+        local = epoch + self.utc_offset(epoch)
+        return local // 3600 % 24, (local // 86400 + _EPOCH_WEEKDAY) % 7
+
+    def user_mask(self, user: str) -> int:
+        if not self.user_masks:
+            return self.default_mask
+        return self.user_masks.get(user.lower(), self.default_mask)
+
+    def is_business_hours(self, user: str, epoch: int) -> bool:
+        """True if the local time of epoch falls within the user's business hours."""
+        local = epoch + self.utc_offset(epoch)
+        day = local // 86400
+        if day in self.holidays:
+            return False
+        hour_of_week = (day + _EPOCH_WEEKDAY) % 7 * 24 + local // 3600 % 24
+        return bool(self.user_mask(user) >> hour_of_week & 1)
+
+    def local_epochs(self, epochs: np.ndarray) -> np.ndarray:
+        """Shift epochs to local time; offsets are looked up once per run of equal quarter hours."""
+        epochs = np.asarray(epochs, dtype=np.int64)
+        if not len(epochs):
+            return epochs
+        slots = epochs // OFFSET_SLOT_SECONDS
+        starts = np.empty(len(slots), dtype=bool)
+        starts[0] = True
+        np.not_equal(slots[1:], slots[:-1], out=starts[1:])
+        run_slots = slots[starts]
+        offsets = np.fromiter(
+            (self.utc_offset(slot * OFFSET_SLOT_SECONDS) for slot in run_slots.tolist()),
+            dtype=np.int64, count=len(run_slots)
+        )
+        return epochs + offsets[np.cumsum(starts) - 1]
+
+    def _mask_row(self, mask: int) -> np.ndarray:
+        row = self._mask_rows.get(mask)
+        if row is None:
+            row = np.array([mask >> bit & 1 for bit in range(HOURS_PER_WEEK)], dtype=bool)
+            self._mask_rows[mask] = row
+        return row
+
+    def business_hours_array(self, epochs: np.ndarray, users: Sequence[str]) -> np.ndarray:
+        """Vectorized is_business_hours over a batch."""
+        local = self.local_epochs(epochs)
+        days = local // 86400
+        hours_of_week = (days + _EPOCH_WEEKDAY) % 7 * 24 + local // 3600 % 24
+
+        if self.user_masks and len(local):
+            codes, names = pd.factorize(np.asarray(users, dtype=object))
+            table = np.stack([self._mask_row(self.user_mask(name)) for name in names])
+            result = table[codes, hours_of_week]
+        else:
+            result = self._mask_row(self.default_mask)[hours_of_week]
+
+        if self.holidays:
+            result &= ~np.isin(days, np.fromiter(self.holidays, dtype=np.int64))
+        return result
+
+
+def _load_settings_hours(path: str) -> Optional[Tuple[int, int]]:
+    """Business hours saved by the settings GUI, or None if unset."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            settings = pickle.load(f)
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable settings {path}: {e}")
+        return None
+    start = parse_hour(getattr(settings, 'startingHours', None))
+    end = parse_hour(getattr(settings, 'endingHours', None))
+    if start is None or end is None or start == end:
+        return None
+    return start, end
+
+
+def _load_timezone(name: Optional[str]) -> Optional[Any]:
+    if not name:
+        return None
+    if name.upper() == 'UTC':
+        return timezone.utc
+    if ZoneInfo is None:
+        logging.warning(f"zoneinfo is unavailable, using the system time zone instead of {name}")
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError) as e:
+        logging.warning(f"Unknown time zone {name}, using the system time zone: {e}")
+        return None
+
+
+def load_calendar(
+        default_hours: Optional[Tuple[int, int]] = None,
+        fallback_hours: Tuple[int, int] = (9, 18),
+        settings_path: str = DEFAULT_SETTINGS_PATH,
+        calendar_path: str = DEFAULT_CALENDAR_PATH
+) -> BusinessCalendar:
+    """
+    Build the business calendar once from the saved settings and the optional calendar file.
+
+    The calendar file is JSON:
+        {"timezone": "Europe/Berlin", "days": [0, 1, 2, 3, 4],
+         "users": {"alice": {"start": 7, "end": 15, "days": [0, 1, 2, 3]}},
+         "holidays": ["2025-12-25"]}
+
+    Args:
+        default_hours: Explicit default hours; take precedence over the saved settings
+        fallback_hours: Default hours when neither explicit nor saved hours exist
+        settings_path: Pickled settings written by the GUI (startingHours/endingHours)
+        calendar_path: Optional calendar file with time zone, per-user hours and holidays
+    """
+    config: Dict[str, Any] = {}
+    if os.path.exists(calendar_path):
+        try:
+            with open(calendar_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable business calendar {calendar_path}: {e}")
+
+    hours_from_fallback = False
+    if default_hours is None:
+        default_hours = _load_settings_hours(settings_path)
+    if default_hours is None:
+        default_hours, hours_from_fallback = fallback_hours, True
+
+    days = tuple(config.get('days', ALL_DAYS))
+    user_hours = {}
+    for user, spec in config.get('users', {}).items():
+        start, end = parse_hour(spec.get('start')), parse_hour(spec.get('end'))
+        if start is None or end is None:
+            logging.warning(f"Ignoring business hours for {user}: start and end are required")
+            continue
+        user_hours[user] = (start, end, tuple(spec.get('days', days)))
+
+    holidays = []
+    for value in config.get('holidays', []):
+        try:
+            holidays.append(date.fromisoformat(value))
+        except (TypeError, ValueError):
+            logging.warning(f"Ignoring invalid holiday {value!r}")
+
+    try:
+        return BusinessCalendar(
+            default_hours,
+            days=days,
+            user_hours=user_hours,
+            holidays=holidays,
+            tz=_load_timezone(config.get('timezone')),
+            hours_from_fallback=hours_from_fallback,
+        )
+    except ValueError as e:
+        logging.error(f"Invalid business calendar, using {fallback_hours} every day: {e}")
+        return BusinessCalendar(fallback_hours, hours_from_fallback=True)
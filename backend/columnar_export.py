@@ -0,0 +1,324 @@
+# columnar_export.py
+import argparse
+import logging
+import os
+import time
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from backend.jsonl_archive import DAY_FORMAT, JsonlArchive
+from backend.log_entry import LogEntry
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: columnar exports are skipped without it
+    pa = ds = pq = None
+
+PYARROW_AVAILABLE = pa is not None
+PARTITION_COLUMNS = ['date', 'host']
+# A partition holding more files than this after a write is merged into one
+MAX_PARTITION_FILES = 8
+
+_DICTIONARY = ('dictionary', None)
+# Exported columns and their Arrow types; low-cardinality strings are
+# dictionary-encoded, so they load as pandas categoricals
+COLUMN_TYPES = [
+    ('epoch', 'int64'),
+    ('event_id', 'int32'),
+    ('event_task_category', 'int32'),
+    ('record_number', 'int64'),
+    ('event_type', _DICTIONARY),
+    ('user', _DICTIONARY),
+    ('domain', _DICTIONARY),
+    ('user_sid', _DICTIONARY),
+    ('logon_id', 'string'),
+    ('session_duration', 'float64'),
+    ('status', _DICTIONARY),
+    ('logon_type', _DICTIONARY),
+    ('source_ip', _DICTIONARY),
+    ('workstation_name', _DICTIONARY),
+    ('failure_reason', _DICTIONARY),
+    ('auth_package', _DICTIONARY),
+    ('elevated_token', 'bool'),
+    ('day_of_week', _DICTIONARY),
+    ('hour_of_day', 'int8'),
+    ('is_business_hours', 'bool'),
+    ('is_rapid_login', 'bool'),
+    ('risk_score', 'int32'),
+    ('risk_factors', 'list'),
+    ('ip_failed_attempts', 'int32'),
+    ('ip_distinct_users', 'int32'),
+    ('ip_verdict', _DICTIONARY),
+    ('behavior_rarity', 'float64'),
+]
+
+
+def _require_pyarrow() -> None:
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow is required for columnar exports: pip install pyarrow")
+
+
+def _arrow_type(kind: Any) -> 'pa.DataType':
+    if kind == _DICTIONARY:
+        return pa.dictionary(pa.int32(), pa.string())
+    if kind == 'list':
+        return pa.list_(pa.string())
+    return pa.type_for_alias(kind)
+
+
+def schema() -> 'pa.Schema':
+    """Schema of the files: a UTC timestamp, the typed columns, then the partition keys."""
+    _require_pyarrow()
+    return pa.schema(
+        [('timestamp', pa.timestamp('s', tz='UTC'))]
+        + [(name, _arrow_type(kind)) for name, kind in COLUMN_TYPES]
+        + [(name, pa.string()) for name in PARTITION_COLUMNS]
+    )
+
+
+def partitioning() -> 'ds.Partitioning':
+    """Hive-style date=YYYY-MM-DD/host=NAME directories."""
+    _require_pyarrow()
+    return ds.partitioning(pa.schema([(name, pa.string()) for name in PARTITION_COLUMNS]), flavor='hive')
+
+
+def _day(value: Union[str, date, datetime, None]) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        # Partitions are UTC days
+        value = value.astimezone(timezone.utc)
+    return value.strftime(DAY_FORMAT)
+
+
+def build_table(entries: Iterable[Union[LogEntry, Dict[str, Any]]]) -> 'pa.Table':
+    """
+    Build an Arrow table of enriched records, column by column.
+
+    Args:
+        entries: LogEntry records, or dicts in LogEntry.to_dict form (e.g. archive records)
+    """
+    _require_pyarrow()
+    records = [entry.to_dict() if isinstance(entry, LogEntry) else entry for entry in entries]
+    epochs = [record['epoch'] for record in records]
+
+    columns: Dict[str, List[Any]] = {'timestamp': epochs}
+    for name, _ in COLUMN_TYPES:
+        columns[name] = [record.get(name) for record in records]
+    columns['date'] = [time.strftime(DAY_FORMAT, time.gmtime(epoch)) for epoch in epochs]
+    # Unknown hosts go to the null partition rather than an empty directory name
+    columns['host'] = [record.get('host') or None for record in records]
+
+    return pa.Table.from_pydict(columns, schema=schema())
+
+
+class ColumnarExporter:
+    """
+    Parquet dataset of enriched events, partitioned by UTC day and host.
+
+    Each write adds new files under date=YYYY-MM-DD/host=NAME/, so a run costs
+    only its own events. Frequent small runs would leave many tiny files per
+    partition, so a partition the write leaves with more than
+    MAX_PARTITION_FILES files is merged into one; a past day ends up as a
+    single file, and the current day is rewritten only every few runs.
+    Readers prune whole partitions by day and host, and row groups by their
+    statistics, so a query over a date range opens only the files of those days.
+    """
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Root directory of the dataset; created on first write
+        """
+        _require_pyarrow()
+        self.directory = directory
+
+    def write(self, entries: Iterable[Union[LogEntry, Dict[str, Any]]]) -> int:
+        """
+        Append entries to the dataset, then merge the partitions written to that hold too many files.
+
+        Returns:
+            Number of rows written
+        """
+        table = build_table(entries)
+        if not table.num_rows:
+            return 0
+        # Collection order is newest first; ascending epochs give row groups disjoint time ranges
+        table = table.sort_by([('epoch', 'ascending')])
+        ds.write_dataset(
+            table,
+            self.directory,
+            format='parquet',
+            partitioning=partitioning(),
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
+        self.compact(set(table.column('date').to_pylist()), MAX_PARTITION_FILES)
+        return table.num_rows
+
+    def compact(self, days: Optional[Iterable[str]] = None, max_files: int = 1) -> int:
+        """
+        Merge the files of each partition holding more than max_files into one, oldest event first.
+
+        Args:
+            days: Only the partitions of these YYYY-MM-DD days; defaults to every day
+            max_files: Partitions with at most this many files are left alone
+
+        Returns:
+            Number of partitions merged
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        if days is None:
+            day_dirs = [name for name in os.listdir(self.directory) if name.startswith('date=')]
+        else:
+            day_dirs = [f"date={day}" for day in days]
+
+        merged = 0
+        for day_dir in sorted(day_dirs):
+            day_path = os.path.join(self.directory, day_dir)
+            if not os.path.isdir(day_path):
+                continue
+            for host_dir in sorted(os.listdir(day_path)):
+                path = os.path.join(day_path, host_dir)
+                files = _data_files(path)
+                if len(files) <= max_files:
+                    continue
+                try:
+                    _merge_files(path, files)
+                    merged += 1
+                except (OSError, pa.ArrowException) as e:
+                    logging.error(f"Failed to compact columnar partition {path}: {e}")
+        return merged
+
+    def dataset(self) -> 'ds.Dataset':
+        """The dataset over every file written so far."""
+        return ds.dataset(self.directory, schema=schema(), format='parquet', partitioning=partitioning())
+
+    def query(
+            self,
+            start: Union[str, date, datetime, None] = None,
+            end: Union[str, date, datetime, None] = None,
+            users: Optional[Sequence[str]] = None,
+            hosts: Optional[Sequence[str]] = None,
+            columns: Optional[Sequence[str]] = None
+    ) -> 'pa.Table':
+        """
+        Read the events in a date range, optionally for some users and hosts.
+
+        Args:
+            start: First day to include, as YYYY-MM-DD or a date; a datetime also bounds the time
+            end: Last day to include, as YYYY-MM-DD or a date; a datetime also bounds the time
+            users: Only these users
+            hosts: Only these hosts
+            columns: Only these columns
+
+        Returns:
+            The matching events, oldest first when the epoch column is selected
+        """
+        table = self.dataset().to_table(
+            columns=list(columns) if columns else None, filter=_filter(start, end, users, hosts)
+        )
+        if 'epoch' in table.column_names:
+            table = table.sort_by([('epoch', 'ascending')])
+        return table
+
+
+def _data_files(path: str) -> List[str]:
+    """Parquet files of a partition directory, skipping the hidden names readers ignore."""
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name.endswith('.parquet') and not name.startswith(('.', '_'))
+    )
+
+
+def _merge_files(path: str, files: Sequence[str]) -> None:
+    # Partition keys live in the directory names, not in the files
+    table = pa.concat_tables(pq.read_table(file, partitioning=None) for file in files)
+    table = table.sort_by([('epoch', 'ascending')])
+    name = uuid.uuid4().hex
+    # Written under a name readers skip, so they never see a partly written file
+    tmp_path = os.path.join(path, f"_part-{name}.parquet")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, os.path.join(path, f"part-{name}-0.parquet"))
+    for file in files:
+        os.remove(file)
+
+
+def _filter(
+        start: Union[str, date, datetime, None],
+        end: Union[str, date, datetime, None],
+        users: Optional[Sequence[str]],
+        hosts: Optional[Sequence[str]]
+) -> Optional['ds.Expression']:
+    conditions = []
+    # Partition keys prune directories before any file is opened
+    if start is not None:
+        conditions.append(ds.field('date') >= _day(start))
+    if end is not None:
+        conditions.append(ds.field('date') <= _day(end))
+    if hosts:
+        conditions.append(ds.field('host').isin(list(hosts)))
+    # Column predicates are checked against row group statistics, then rows
+    if isinstance(start, datetime):
+        conditions.append(ds.field('epoch') >= int(start.replace(tzinfo=start.tzinfo or timezone.utc).timestamp()))
+    if isinstance(end, datetime):
+        conditions.append(ds.field('epoch') <= int(end.replace(tzinfo=end.tzinfo or timezone.utc).timestamp()))
+    if users:
+        conditions.append(ds.field('user').isin(list(users)))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """
+    Convert a JSONL archive to a Parquet dataset, or query one.
+
+    Usage:
+        python -m backend.columnar_export export ARCHIVE_DIR DATASET_DIR [--prefix P] [--from DAY] [--to DAY]
+        python -m backend.columnar_export query DATASET_DIR [--from DAY] [--to DAY] [--user U ...] [--host H ...]
+        python -m backend.columnar_export compact DATASET_DIR
+    """
+    parser = argparse.ArgumentParser(description="Columnar exports of enriched events.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="Append archived records to a Parquet dataset")
+    export.add_argument('archive')
+    export.add_argument('dataset')
+    export.add_argument('--prefix', default='session_logons')
+
+    query = commands.add_parser('query', help="Print the events matching a date range, users and hosts")
+    query.add_argument('dataset')
+    query.add_argument('--user', action='append', dest='users')
+    query.add_argument('--host', action='append', dest='hosts')
+
+    compact = commands.add_parser('compact', help="Merge each partition's files into one")
+    compact.add_argument('dataset')
+
+    for command in (export, query):
+        command.add_argument('--from', dest='start_day', help="First day to include, YYYY-MM-DD")
+        command.add_argument('--to', dest='end_day', help="Last day to include, YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        records = JsonlArchive(args.archive, args.prefix).iter_records(args.start_day, args.end_day)
+        written = ColumnarExporter(args.dataset).write(records)
+        print(f"{written} rows written to {args.dataset}")
+    elif args.command == 'compact':
+        merged = ColumnarExporter(args.dataset).compact()
+        print(f"{merged} partitions compacted in {args.dataset}")
+    else:
+        table = ColumnarExporter(args.dataset).query(args.start_day, args.end_day, args.users, args.hosts)
+        print(table.to_pandas().to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+# csv_index.py
+import argparse
+import csv
+import hashlib
+import io
+import logging
+import math
+import os
+import struct
+from array import array
+from typing import Any, Iterable, List, Optional, Sequence, Set, Tuple
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'CSVIDX1\n'
+# Magic, then the byte size of the CSV the index was last synced with
+_HEADER = struct.Struct('<8sQ')
+
+
+def _field(value: Any) -> str:
+    """A value as csv.writer would write it, with missing values empty as pandas writes them."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    return str(value)
+
+
+def row_hash(fields: Sequence[str]) -> int:
+    """64-bit hash of a row's field texts."""
+    return int.from_bytes(hashlib.blake2b('\0'.join(fields).encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) in (b'\n', b'\r')
+
+
+def read_header(csv_path: str) -> Optional[List[str]]:
+    """Column names of an existing CSV, or None if it is missing or empty."""
+    if not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+        return None
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        return next(csv.reader(f), None)
+
+
+class CsvRowIndex:
+    """
+    Sidecar index of the row hashes in a CSV file, for deduplicating appends.
+
+    The index is <csv>.idx: a header recording the CSV size it matches,
+    followed by one 64-bit hash per data row. An index whose recorded size
+    differs from the CSV, e.g. after the CSV was edited or a crash between the
+    two writes, is rebuilt from the CSV on load.
+    """
+
+    def __init__(self, csv_path: str, index_path: Optional[str] = None):
+        """
+        Args:
+            csv_path: CSV file the index covers
+            index_path: Index file; defaults to the CSV path plus .idx
+        """
+        self.csv_path = csv_path
+        self.index_path = index_path or csv_path + INDEX_SUFFIX
+        self.hashes: Set[int] = set()
+
+    def __contains__(self, key: int) -> bool:
+        return key in self.hashes
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def load(self) -> bool:
+        """
+        Load the index, rebuilding it if it does not match the CSV.
+
+        Returns:
+            True if the stored index was used, False if it was rebuilt
+        """
+        csv_size = os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0
+        try:
+            with open(self.index_path, 'rb') as f:
+                magic, indexed_size = _HEADER.unpack(f.read(_HEADER.size))
+                if magic == INDEX_MAGIC and indexed_size == csv_size:
+                    hashes = array('Q')
+                    hashes.frombytes(f.read())
+                    self.hashes = set(hashes)
+                    return True
+        except (OSError, struct.error, ValueError):
+            pass
+
+        logging.info(f"Rebuilding row index for {self.csv_path}")
+        self.rebuild()
+        return False
+
+    def rebuild(self) -> None:
+        """Re-hash every data row of the CSV and rewrite the index."""
+        self.hashes = set()
+        if os.path.exists(self.csv_path) and os.path.getsize(self.csv_path):
+            with open(self.csv_path, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                self.hashes = {row_hash(row) for row in reader}
+        self._write(array('Q', self.hashes), 'wb')
+
+    def append(self, new_hashes: Iterable[int]) -> None:
+        """Record rows just appended to the CSV."""
+        new_hashes = array('Q', new_hashes)
+        self.hashes.update(new_hashes)
+        if os.path.exists(self.index_path):
+            self._write(new_hashes, 'r+b')
+        else:
+            self._write(array('Q', self.hashes), 'wb')
+
+    def _write(self, hashes: array, mode: str) -> None:
+        csv_size = os.path.getsize(self.csv_path) if os.path.exists(self.csv_path) else 0
+        header = _HEADER.pack(INDEX_MAGIC, csv_size)
+        with open(self.index_path, mode) as f:
+            if mode == 'wb':
+                f.write(header)
+                f.write(hashes.tobytes())
+            else:
+                # Append after the stored hashes, then record the new CSV size
+                f.seek(0, os.SEEK_END)
+                f.write(hashes.tobytes())
+                f.seek(0)
+                f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def append_unique_rows(csv_path: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+    """
+    Append the rows not already in the CSV, in O(rows) regardless of the CSV's size.
+
+    Rows are compared by the text they are written as. A new file gets a
+    header first. The caller handles a CSV whose header differs from columns.
+
+    Returns:
+        Number of rows appended
+    """
+    exists = read_header(csv_path) is not None
+    index = CsvRowIndex(csv_path)
+    if exists:
+        index.load()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator=os.linesep)
+    if not exists:
+        writer.writerow(columns)
+
+    new_hashes = []
+    seen = set()
+    for row in rows:
+        fields = [_field(value) for value in row]
+        key = row_hash(fields)
+        if key in index or key in seen:
+            continue
+        seen.add(key)
+        new_hashes.append(key)
+        writer.writerow(fields)
+
+    if not new_hashes and exists:
+        return 0
+
+    with open(csv_path, 'a' if exists else 'w', encoding='utf-8', newline='') as f:
+        if exists and not _ends_with_newline(csv_path):
+            f.write(os.linesep)
+        f.write(buffer.getvalue())
+        f.flush()
+        os.fsync(f.fileno())
+    if exists:
+        index.append(new_hashes)
+    else:
+        # Replaces any index left over from a deleted CSV; the file holds only this batch
+        index.rebuild()
+    return len(new_hashes)
+
+
+def compact(csv_path: str) -> Tuple[int, int]:
+    """
+    Rewrite a CSV without duplicate rows, keeping first occurrences, and rebuild its index.
+
+    Returns:
+        Rows kept and duplicate rows removed
+    """
+    header = read_header(csv_path)
+    if header is None:
+        raise FileNotFoundError(f"CSV file not found or empty: {csv_path}")
+
+    tmp_path = f"{csv_path}.tmp"
+    seen = set()
+    removed = 0
+    with open(csv_path, 'r', encoding='utf-8', newline='') as src, \
+            open(tmp_path, 'w', encoding='utf-8', newline='') as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst, lineterminator=os.linesep)
+        writer.writerow(next(reader))
+        for row in reader:
+            key = row_hash(row)
+            if key in seen:
+                removed += 1
+                continue
+            seen.add(key)
+            writer.writerow(row)
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_path, csv_path)
+
+    CsvRowIndex(csv_path).rebuild()
+    return len(seen), removed
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """
+    Maintain the row indexes of deduplicated CSV exports.
+
+    Usage:
+        python -m backend.csv_index compact CSV [CSV ...]
+        python -m backend.csv_index reindex CSV [CSV ...]
+    """
+    parser = argparse.ArgumentParser(description="Compact deduplicated CSV exports or rebuild their row indexes.")
+    parser.add_argument('command', choices=('compact', 'reindex'))
+    parser.add_argument('paths', nargs='+')
+    args = parser.parse_args(argv)
+
+    for path in args.paths:
+        if args.command == 'compact':
+            kept, removed = compact(path)
+            print(f"{path}: kept {kept} rows, removed {removed} duplicates")
+        else:
+            index = CsvRowIndex(path)
+            index.rebuild()
+            print(f"{path}: indexed {len(index)} rows")
+
+
+if __name__ == '__main__':
+    main()
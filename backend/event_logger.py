@@ -1,13 +1,14 @@
 # event_logger.py
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Tuple, Optional, Any, Iterator, Union
 import logging
 from datetime import datetime, timedelta
-import win32evtlog
-from contextlib import contextmanager
+from dataclasses import dataclass
 
-from backend.analyzer import SessionAnalyzer
-from backend.event_processor import process_event
-from backend.timeUtils import parse_timestamp
+from backend.bookmarks import BookmarkStore
+from backend.event_processor import analyzer, process_event
+from backend.event_source import EventSource, Win32EventSource
+from backend.log_entry import LogEntry
+from backend.timeUtils import to_epoch
 
 
 # Configure logging
@@ -20,63 +21,173 @@ logging.basicConfig(
     ]
 )
 
-# Initialize the session analyzer
-analyzer = SessionAnalyzer()
+# Tolerance for events stamped slightly out of order around the cutoff
+DEFAULT_CLOCK_SKEW = timedelta(minutes=5)
 
 
-@contextmanager
-def event_log_handle(server: str, log_type: str):
-    """Context manager for handling event log connections."""
-    handle = None
+@dataclass
+class ReadStats:
+    """Cost of one event log read, used to confirm reads scale with the window."""
+    records_read: int = 0
+    buffers_read: int = 0
+    stop_reason: str = 'end_of_log'
+
+
+def iter_session_events(
+        minutes_back: Optional[int] = None,
+        days_back: Optional[int] = None,
+        bookmarks: Optional[BookmarkStore] = None,
+        server: str = "localhost",
+        log_type: str = "Security",
+        stop_at_cutoff: bool = True,
+        clock_skew: timedelta = DEFAULT_CLOCK_SKEW,
+        stats: Optional[ReadStats] = None,
+        source: Optional[EventSource] = None,
+        batch_size: Optional[int] = None
+) -> Iterator[Union[LogEntry, List[LogEntry]]]:
+    """
+    Stream enriched session events, newest first, without accumulating them.
+
+    Args:
+        minutes_back: Number of minutes to look back
+        days_back: Number of days to look back
+        bookmarks: Optional store of the last processed RecordNumber; when given,
+            the read stops at the first record an earlier run already processed.
+            The bookmark only advances once the stream has been fully consumed,
+            as do the behavioral baselines, which then learn the run's logons oldest first.
+        server: Host whose event log is read
+        log_type: Event log channel to read
+        stop_at_cutoff: Stop after the first buffer whose events are all older
+            than the cutoff, since the log is read newest-first
+        clock_skew: How far before the cutoff an event must be before it may end
+            the read, to tolerate records written slightly out of order
+        stats: Optional ReadStats filled with the records and buffers read
+        source: Event source to read instead of the live log on server/log_type
+        batch_size: Yield lists of up to this many entries instead of single entries
+
+    Yields:
+        Enriched logon and logoff entries, or lists of them when batch_size is set
+    """
+    if batch_size is not None and batch_size < 1:
+        raise ValueError("Batch size must be at least 1")
+    stats = stats if stats is not None else ReadStats()
+    batch: List[LogEntry] = []
+    # Logons of a run that was not read to the end are read again by the next one
+    analyzer.baselines.discard()
+
     try:
-        handle = win32evtlog.OpenEventLog(server, log_type)
-        yield handle
-    finally:
-        if handle:
-            win32evtlog.CloseEventLog(handle)
+        # Calculate cutoff time
+        cutoff_epoch = int(calculate_cutoff_time(minutes_back, days_back).timestamp())
+        stop_before = cutoff_epoch - int(clock_skew.total_seconds())
+
+        with source if source is not None else Win32EventSource(server, log_type) as events_source:
+            last_seen = get_bookmark(events_source, bookmarks)
+            newest_record = None
+
+            for events in events_source.read_batches():
+                stats.buffers_read += 1
+                analyzer.reload_rules()
+
+                buffer_past_cutoff = True
+                for event in events:
+                    if last_seen is not None and event.RecordNumber <= last_seen:
+                        stats.stop_reason = 'bookmark'
+                        break
+                    stats.records_read += 1
+                    if newest_record is None:
+                        newest_record = event.RecordNumber
+
+                    event_epoch, log_entry = enrich_event(event, cutoff_epoch)
+                    if event_epoch is None or event_epoch >= stop_before:
+                        buffer_past_cutoff = False
+                    if log_entry is None:
+                        continue
+
+                    if batch_size is None:
+                        yield log_entry
+                    else:
+                        batch.append(log_entry)
+                        if len(batch) >= batch_size:
+                            yield batch
+                            batch = []
+
+                if stats.stop_reason == 'bookmark':
+                    break
+                if stop_at_cutoff and buffer_past_cutoff:
+                    stats.stop_reason = 'cutoff'
+                    break
+
+            if batch:
+                yield batch
+                batch = []
+
+            analyzer.baselines.commit()
+            if bookmarks is not None and newest_record is not None:
+                bookmarks.update(events_source.host, events_source.channel, newest_record)
+                bookmarks.save()
+
+        logging.info(
+            f"Read {stats.records_read} records in {stats.buffers_read} buffers "
+            f"from {events_source.channel} (stopped at {stats.stop_reason})"
+        )
+        logging.debug(f"Session history: {analyzer.session_history.stats()}")
+        logging.debug(f"Sessions: {analyzer.sessions.stats()}")
+
+    except Exception as e:
+        logging.error(f"Error in iter_session_events: {e}")
+        stats.stop_reason = 'error'
+        if batch:
+            yield batch
 
 
 def get_session_logs(
         minutes_back: Optional[int] = None,
-        days_back: Optional[int] = None
-) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        days_back: Optional[int] = None,
+        **kwargs: Any
+) -> Tuple[List[LogEntry], List[LogEntry]]:
     """
     Fetches and analyzes user session logs focusing on human interactions.
 
     Args:
         minutes_back: Number of minutes to look back
         days_back: Number of days to look back
+        **kwargs: Read options accepted by iter_session_events
 
     Returns:
         Tuple containing two lists: session logons and logoffs
     """
-    session_logons: List[Dict[str, Any]] = []
-    session_logoffs: List[Dict[str, Any]] = []
+    session_logons: List[LogEntry] = []
+    session_logoffs: List[LogEntry] = []
 
-    try:
-        # Calculate cutoff time
-        cutoff_time = calculate_cutoff_time(minutes_back, days_back)
+    for log_entry in iter_session_events(minutes_back, days_back, **kwargs):
+        if log_entry.event_type == 'Logoff':
+            session_logoffs.append(log_entry)
+        else:
+            session_logons.append(log_entry)
 
-        with event_log_handle("localhost", "Security") as handle:
-            flags = win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ
+    return session_logons, session_logoffs
 
-            while True:
-                try:
-                    events = win32evtlog.ReadEventLog(handle, flags, 0)
-                    if not events:
-                        break
 
-                    for event in events:
-                        process_single_event(event, cutoff_time, session_logons, session_logoffs)
+def get_bookmark(source: EventSource, bookmarks: Optional[BookmarkStore]) -> Optional[int]:
+    """
+    Return the RecordNumber a backward read may stop at, if any.
 
-                except win32evtlog.error as e:
-                    logging.error(f"Error reading event log: {e}")
-                    break
+    A bookmark beyond the newest record in the log means the log was cleared
+    and numbering restarted, so the bookmark is discarded.
+    """
+    if bookmarks is None:
+        return None
 
-    except Exception as e:
-        logging.error(f"Error in get_session_logs: {e}")
+    last_seen = bookmarks.get(source.host, source.channel)
+    if last_seen is None:
+        return None
 
-    return session_logons, session_logoffs
+    record_range = source.record_range()
+    if record_range is not None and last_seen > record_range[1]:
+        logging.info(f"Event log {source.channel} on {source.host} was cleared, discarding bookmark {last_seen}")
+        bookmarks.reset(source.host, source.channel)
+        return None
+    return last_seen
 
 
 def calculate_cutoff_time(
@@ -91,66 +202,82 @@ def calculate_cutoff_time(
     return datetime.now() - timedelta(days=7)  # Default to 7 days
 
 
-def process_single_event(
+def enrich_event(
         event: Any,
-        cutoff_time: datetime,
-        session_logons: List[Dict[str, Any]],
-        session_logoffs: List[Dict[str, Any]]
-) -> None:
-    """Process a single event and update the session lists."""
+        cutoff_epoch: int,
+        score: bool = True
+) -> Tuple[Optional[int], Optional[LogEntry]]:
+    """
+    Parse, filter and enrich a single event.
+
+    Args:
+        event: Event record
+        cutoff_epoch: Events before this time are skipped
+        score: False sets only the per-user features and leaves the source IP
+            verdict and risk score to a later analyzer.score_log_entry call
+
+    Returns:
+        The event time in epoch seconds (None if it could not be parsed) and the
+        enriched log entry, or None when the event is outside the window or
+        not a session event worth keeping
+    """
     try:
-        event_time = parse_timestamp(event.TimeGenerated)
-        event_dt = datetime.strptime(event_time, '%Y-%m-%d %H:%M:%S')
+        event_epoch = to_epoch(event.TimeGenerated)
 
-        if event_dt < cutoff_time:
-            return
+        if event_epoch < cutoff_epoch:
+            return event_epoch, None
 
         if event.EventID in [4624, 4634, 4625]:  # Successful, Logoff, Failed
             data = event.StringInserts or []
-            log_entry = process_event(event, data, event_time)
+            log_entry = process_event(event, data, event_epoch)
 
             if not log_entry:
-                return
+                return event_epoch, None
+
+            if log_entry.event_type == 'Logoff':
+                return event_epoch, log_entry
+            elif analyzer.is_human_session(log_entry) or log_entry.status == 'failed':
+                if score:
+                    log_entry = assess_risk(log_entry)
+                else:
+                    analyzer.enrich_user_features(log_entry)
+                analyzer.record_session(log_entry)
+                return event_epoch, log_entry
 
-            if log_entry['event_type'] == 'Logoff':
-                session_logoffs.append(log_entry)
-            elif analyzer.is_human_session(log_entry) or log_entry['status'] == 'failed':
-                log_entry = assess_risk(log_entry)
-                session_logons.append(log_entry)
-                analyzer.session_history[log_entry['user']].append(log_entry)
+        return event_epoch, None
 
     except Exception as e:
         logging.error(f"Error processing event: {e}")
+        return None, None
+
+
+def process_single_event(
+        event: Any,
+        cutoff_epoch: int,
+        session_logons: List[LogEntry],
+        session_logoffs: List[LogEntry]
+) -> Optional[int]:
+    """
+    Process a single event and update the session lists.
+
+    Returns:
+        The event time in epoch seconds, or None if the event could not be parsed
+    """
+    event_epoch, log_entry = enrich_event(event, cutoff_epoch)
+    if log_entry is not None:
+        if log_entry.event_type == 'Logoff':
+            session_logoffs.append(log_entry)
+        else:
+            session_logons.append(log_entry)
+    return event_epoch
 
 
-def assess_risk(log_entry: Dict[str, Any]) -> Dict[str, Any]:
+def assess_risk(log_entry: LogEntry) -> LogEntry:
     """
     Assess risk and prepare features for ML model.
     """
     try:
-        # Calculate is_rapid_login
-        is_rapid_login = analyzer.is_rapid_login(log_entry)
-
-        # Check business hours
-        is_business_hours = analyzer.is_business_hours(log_entry['timestamp'])
-
-        # Calculate risk score
-        risk_score = 0
-        if not is_business_hours:
-            risk_score += 1
-        if is_rapid_login:
-            risk_score += 3
-        if log_entry.get('status') == 'failed':
-            risk_score += 2
-
-        # Update log entry with ML features
-        log_entry.update({
-            'is_rapid_login': is_rapid_login,  # Ensure this is always calculated
-            'is_business_hours': is_business_hours,
-            'risk_score': risk_score,
-            'status': log_entry.get('status', 'success')
-        })
-
+        analyzer.enrich_log_entry(log_entry)
         return log_entry
     except Exception as e:
         logging.error(f"Error in assess_risk: {e}")
@@ -1,13 +1,14 @@
 # event_processor.py
-from datetime import datetime
-from typing import Dict, Any, Optional, Union, List
+from typing import Any, Optional, Union, List
 import logging
 from enum import Enum
 from dataclasses import dataclass
 
-from backend.analyzer import SessionAnalyzer, get_session_duration
+from backend.analyzer import SessionAnalyzer
+from backend.log_entry import LogEntry
+from backend.timeUtils import DAY_NAMES
 
-# Initialize analyzer
+# Session state shared by every reader: rapid-login windows, history and open sessions
 analyzer = SessionAnalyzer()
 
 
@@ -48,34 +49,20 @@ class LogonTypes:
                                     LogonType(str(type_code), 'Unknown')).description
 
 
-def create_base_entry(event: Any, timestamp: str) -> Dict[str, Any]:
-    """Create base entry dictionary with default values."""
+def create_base_entry(event: Any, epoch: int) -> LogEntry:
+    """Create base entry with default values."""
     try:
-        dt = datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S')
-        return {
-            'timestamp': timestamp,
-            'event_type': '',
-            'user': '',
-            'domain': '',
-            'user_sid': '',
-            'logon_id': '',
-            'session_duration': 0,
-            'status': 'success',
-            'logon_type': '',
-            'source_ip': '',
-            'destination_ip': '',
-            'is_rapid_logon': '',
-            'workstation_name': '',
-            'failure_reason': '',
-            'process_name': '',
-            'auth_package': '',
-            'risk_score': 0,
-            'day_of_week': dt.strftime('%A'),
-            'hour_of_day': dt.hour,
-            'is_business_hours': analyzer.is_business_hours(timestamp),
-            'event_id': event.EventID,
-            'event_task_category': event.EventCategory,
-        }
+        hour_of_day, weekday = analyzer.calendar.local_time(epoch)
+        return LogEntry(
+            epoch=epoch,
+            event_id=event.EventID,
+            event_task_category=event.EventCategory,
+            record_number=getattr(event, 'RecordNumber', 0),
+            host=getattr(event, 'ComputerName', '') or '',
+            day_of_week=DAY_NAMES[weekday],
+            hour_of_day=hour_of_day,
+            is_business_hours=analyzer.calendar.is_business_hours('', epoch),
+        )
     except Exception as e:
         logging.error(f"Error creating base entry: {e}")
         raise
@@ -84,21 +71,21 @@ def create_base_entry(event: Any, timestamp: str) -> Dict[str, Any]:
 def process_event(
         event: Any,
         data: List[str],
-        timestamp: str
-) -> Optional[Dict[str, Any]]:
+        epoch: int
+) -> Optional[LogEntry]:
     """
     Process individual event and extract relevant information.
 
     Args:
         event: Event object
         data: List of event data strings
-        timestamp: Event timestamp
+        epoch: Event time in epoch seconds
 
     Returns:
-        Processed event dictionary or None if processing fails
+        Processed log entry or None if processing fails
     """
     try:
-        base_entry = create_base_entry(event, timestamp)
+        base_entry = create_base_entry(event, epoch)
 
         if event.EventID == EventIDs.SUCCESSFUL_LOGON.value:
             return process_logon(data, base_entry)
@@ -113,78 +100,67 @@ def process_event(
     return None
 
 
-def process_logon(data: List[str], base_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def process_logon(data: List[str], base_entry: LogEntry) -> Optional[LogEntry]:
     """Process successful logon events."""
     if len(data) < 10:
         logging.warning("Insufficient data for logon event")
         return None
 
     try:
-        base_entry.update({
-            'event_type': EventTypes.LOGON.value,
-            'user': data[5],
-            'domain': data[6],
-            'user_sid': data[4],
-            'logon_id': data[3],
-            'logon_type': LogonTypes.get_description(data[8]),
-            'source_ip': data[18] if len(data) > 18 else '',
-            'workstation_name': data[1],
-            'elevated_token': 'Yes' in data[20] if len(data) > 20 else False
-        })
+        base_entry.event_type = EventTypes.LOGON.value
+        base_entry.user = data[5]
+        base_entry.domain = data[6]
+        base_entry.user_sid = data[4]
+        # TargetLogonId: the id the matching 4634 carries
+        base_entry.logon_id = data[7]
+        base_entry.logon_type = LogonTypes.get_description(data[8])
+        base_entry.source_ip = data[18] if len(data) > 18 else ''
+        base_entry.workstation_name = data[1]
+        base_entry.elevated_token = 'Yes' in data[20] if len(data) > 20 else False
+        analyzer.sessions.on_logon(base_entry)
         return base_entry
     except Exception as e:
         logging.error(f"Error processing logon event: {e}")
         return None
 
 
-def process_logoff(data: List[str], base_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def process_logoff(data: List[str], base_entry: LogEntry) -> Optional[LogEntry]:
     """Process logoff events."""
     if len(data) < 3:
         logging.warning("Insufficient data for logoff event")
         return None
 
     try:
-        logon_id = data[3]
-        logoff_time = base_entry['timestamp']
-        logon_time = analyzer.get_logon_time(logon_id)
-
-        session_duration = None
-        if logon_time and logoff_time:
-            session_duration = get_session_duration(logon_time, logoff_time)
-
-        base_entry.update({
-            'event_type': EventTypes.LOGOFF.value,
-            'user': data[1],
-            'domain': data[2],
-            'logon_id': logon_id,
-            'session_duration': session_duration
-        })
+        base_entry.event_type = EventTypes.LOGOFF.value
+        base_entry.user = data[1]
+        base_entry.domain = data[2]
+        base_entry.logon_id = data[3]
+        # None until the logon is seen; a newest-first read fills it in when the logon arrives
+        base_entry.session_duration = analyzer.sessions.on_logoff(base_entry)
         return base_entry
     except Exception as e:
         logging.error(f"Error processing logoff event: {e}")
         return None
 
 
-def process_failed_logon(data: List[str], base_entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def process_failed_logon(data: List[str], base_entry: LogEntry) -> Optional[LogEntry]:
     """Process failed logon events."""
     if len(data) < 8:
         logging.warning("Insufficient data for failed logon event")
         return None
 
     try:
-        base_entry.update({
-            'event_type': EventTypes.LOGON.value,
-            'status': 'failed',
-            'user': data[5],
-            'domain': data[6],
-            'user_sid': data[4],
-            'logon_id': data[3],
-            'logon_type': LogonTypes.get_description(data[8]),
-            'source_ip': data[19] if len(data) > 19 else '',
-            'failure_reason': data[7] if len(data) > 7 else '',
-            'auth_package': data[10] if len(data) > 10 else ''
-        })
+        base_entry.event_type = EventTypes.LOGON.value
+        base_entry.status = 'failed'
+        base_entry.user = data[5]
+        base_entry.domain = data[6]
+        base_entry.user_sid = data[4]
+        base_entry.logon_id = data[3]
+        base_entry.logon_type = LogonTypes.get_description(data[8])
+        base_entry.source_ip = data[19] if len(data) > 19 else ''
+        base_entry.failure_reason = data[7] if len(data) > 7 else ''
+        base_entry.auth_package = data[10] if len(data) > 10 else ''
         return base_entry
     except Exception as e:
         logging.error(f"Error processing failed logon event: {e}")
-        return None
\ No newline at end of file
+        return None
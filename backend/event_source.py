@@ -0,0 +1,302 @@
+# event_source.py
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from backend.bookmarks import resolve_host
+from backend.event_processor import EventIDs, LogonTypes
+
+try:
+    import win32evtlog
+except ImportError:  # Not on Windows: only replay and file sources are available
+    win32evtlog = None
+
+
+@dataclass
+class EventRecord:
+    """
+    Minimal event record with the attributes process_event reads from a
+    pywin32 PyEventLogRecord, so any source can feed the same pipeline.
+    """
+    EventID: int
+    TimeGenerated: datetime
+    StringInserts: Optional[List[str]]
+    EventCategory: int = 0
+    RecordNumber: int = 0
+    ComputerName: str = ''
+
+
+class EventSource(ABC):
+    """
+    A readable stream of event records, newest first.
+
+    Sources hand out events in buffers so readers can stop between buffers,
+    mirroring how ReadEventLog returns records from the live log.
+    """
+    host: str = ''
+    channel: str = ''
+
+    @abstractmethod
+    def read_batches(self) -> Iterator[Sequence[Any]]:
+        """Yield buffers of events, newest first."""
+
+    def record_range(self) -> Optional[Tuple[int, int]]:
+        """Return the (oldest, newest) RecordNumber available, if the source knows it."""
+        return None
+
+    def open(self) -> None:
+        """Acquire any underlying handle."""
+
+    def close(self) -> None:
+        """Release any underlying handle."""
+
+    def __enter__(self) -> 'EventSource':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Any]:
+        for batch in self.read_batches():
+            yield from batch
+
+
+class Win32EventSource(EventSource):
+    """Reads a live event log channel through win32evtlog."""
+
+    def __init__(self, server: str = "localhost", log_type: str = "Security"):
+        if win32evtlog is None:
+            raise RuntimeError("win32evtlog is not available; reading live event logs requires pywin32 on Windows")
+        self.server = server
+        self.channel = log_type
+        self.host = resolve_host(server)
+        self._handle = None
+
+    def open(self) -> None:
+        if self._handle is None:
+            self._handle = win32evtlog.OpenEventLog(self.server, self.channel)
+
+    def close(self) -> None:
+        if self._handle is not None:
+            win32evtlog.CloseEventLog(self._handle)
+            self._handle = None
+
+    def record_range(self) -> Optional[Tuple[int, int]]:
+        self.open()
+        oldest = win32evtlog.GetOldestEventLogRecord(self._handle)
+        return oldest, oldest + win32evtlog.GetNumberOfEventLogRecords(self._handle) - 1
+
+    def read_batches(self) -> Iterator[Sequence[Any]]:
+        self.open()
+        flags = win32evtlog.EVENTLOG_BACKWARDS_READ | win32evtlog.EVENTLOG_SEQUENTIAL_READ
+        while True:
+            try:
+                events = win32evtlog.ReadEventLog(self._handle, flags, 0)
+            except win32evtlog.error as e:
+                logging.error(f"Error reading event log: {e}")
+                return
+            if not events:
+                return
+            yield events
+
+
+class ReplayEventSource(EventSource):
+    """
+    Replays recorded events from JSON or JSON Lines files.
+
+    Two record shapes are accepted: raw records carrying the EventRecord
+    attributes (EventID, TimeGenerated, StringInserts, ...), and enriched log
+    entries as written by save_to_json (e.g. exports/session_logons.json) or
+    JsonlArchive segments, whose StringInserts are rebuilt from the exported
+    fields.
+    """
+
+    def __init__(
+            self,
+            paths: Union[str, Sequence[str]],
+            speed: Optional[float] = None,
+            batch_size: int = 128,
+            channel: str = "Security",
+            host: str = "replay"
+    ):
+        """
+        Args:
+            paths: One or more .json/.jsonl files, replayed in the given order
+            speed: None replays at full speed; otherwise the wall-clock gap between
+                consecutive events is their recorded gap divided by speed
+            batch_size: Number of events per buffer
+            channel: Channel name reported to bookmark stores
+            host: Host name reported to bookmark stores
+        """
+        if speed is not None and speed <= 0:
+            raise ValueError("Replay speed must be positive")
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1")
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.speed = speed
+        self.batch_size = batch_size
+        self.channel = channel
+        self.host = host
+
+    def read_batches(self) -> Iterator[Sequence[Any]]:
+        batch: List[EventRecord] = []
+        for event in self._paced(self._events()):
+            batch.append(event)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _events(self) -> Iterator[EventRecord]:
+        record_number = 0
+        for path in self.paths:
+            for record in iter_json_records(path):
+                record_number += 1
+                try:
+                    yield to_event_record(record, record_number)
+                except (KeyError, TypeError, ValueError) as e:
+                    logging.warning(f"Skipping unreadable replay record {record_number} in {path}: {e}")
+
+    def _paced(self, events: Iterator[EventRecord]) -> Iterator[EventRecord]:
+        if self.speed is None:
+            yield from events
+            return
+
+        start_wall = time.monotonic()
+        first_time = None
+        for event in events:
+            if first_time is None:
+                first_time = event.TimeGenerated
+            # Recorded files are usually newest first, so measure the distance, not the direction
+            offset = abs((event.TimeGenerated - first_time).total_seconds()) / self.speed
+            delay = start_wall + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            yield event
+
+
+def iter_json_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield records from a JSON array file or a JSON Lines file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+
+        if first == '[':
+            yield from json.load(f)
+            return
+
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                logging.warning(f"Skipping malformed line {line_number} in {path}: {e}")
+
+
+def _parse_time(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    return datetime.fromisoformat(str(value))
+
+
+def _logon_type_code(description: str) -> str:
+    for code, logon_type in LogonTypes.TYPES.items():
+        if logon_type.description == description:
+            return code
+    return '0'
+
+
+def rebuild_string_inserts(entry: Dict[str, Any], event_id: int) -> List[str]:
+    """
+    Rebuild the StringInserts positions process_event reads from an exported entry.
+    """
+    def field(name: str) -> str:
+        value = entry.get(name)
+        return '' if value is None else str(value)
+
+    if event_id == EventIDs.LOGOFF.value:
+        data = [''] * 5
+        data[1] = field('user')
+        data[2] = field('domain')
+        data[3] = field('logon_id')
+        data[4] = _logon_type_code(field('logon_type'))
+        return data
+
+    data = [''] * 21
+    data[3] = field('logon_id')
+    data[4] = field('user_sid')
+    data[5] = field('user')
+    data[6] = field('domain')
+    data[8] = _logon_type_code(field('logon_type'))
+
+    if event_id == EventIDs.FAILED_LOGON.value:
+        data[7] = field('failure_reason')
+        data[10] = field('auth_package')
+        data[19] = field('source_ip')
+    else:
+        data[7] = field('logon_id')
+        data[1] = field('workstation_name')
+        data[18] = field('source_ip')
+        data[20] = 'Yes' if entry.get('elevated_token') else 'No'
+    return data
+
+
+def to_event_record(record: Dict[str, Any], record_number: int = 0) -> EventRecord:
+    """Convert a raw or exported JSON record into an EventRecord."""
+    if 'EventID' in record:
+        return EventRecord(
+            EventID=int(record['EventID']),
+            TimeGenerated=_parse_time(record['TimeGenerated']),
+            StringInserts=record.get('StringInserts'),
+            EventCategory=int(record.get('EventCategory') or 0),
+            RecordNumber=int(record.get('RecordNumber') or record_number),
+            ComputerName=record.get('ComputerName') or '',
+        )
+
+    event_id = record.get('event_id')
+    if not event_id:
+        if record.get('event_type') == 'Logoff':
+            event_id = EventIDs.LOGOFF.value
+        elif record.get('status') == 'failed':
+            event_id = EventIDs.FAILED_LOGON.value
+        else:
+            event_id = EventIDs.SUCCESSFUL_LOGON.value
+    event_id = int(event_id)
+
+    return EventRecord(
+        EventID=event_id,
+        TimeGenerated=_parse_time(record['epoch'] if 'epoch' in record else record['timestamp']),
+        StringInserts=rebuild_string_inserts(record, event_id),
+        EventCategory=int(record.get('event_task_category') or 0),
+        RecordNumber=int(record.get('record_number') or record_number),
+        ComputerName=record.get('host') or '',
+    )
+
+
+def open_source(path: Optional[str] = None, **kwargs) -> EventSource:
+    """
+    Return a source for a recorded file, or the live Security log when no path is given.
+
+    .evtx exports are parsed directly; any other file is replayed as JSON/JSONL.
+    """
+    if path is None:
+        return Win32EventSource(**kwargs)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Event file not found: {path}")
+    if path.lower().endswith('.evtx'):
+        from backend.evtx_reader import EvtxEventSource
+        return EvtxEventSource(path, **kwargs)
+    return ReplayEventSource(path, **kwargs)
@@ -0,0 +1,465 @@
+# evtx_reader.py
+import logging
+import mmap
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Sequence, Tuple, Union
+
+from backend.event_source import EventRecord, EventSource
+
+FILE_MAGIC = b'ElfFile\x00'
+CHUNK_MAGIC = b'ElfChnk\x00'
+RECORD_MAGIC = b'\x2a\x2a\x00\x00'
+
+FILE_HEADER_SIZE = 4096
+CHUNK_SIZE = 65536
+CHUNK_HEADER_SIZE = 512
+TEMPLATE_HEADER_SIZE = 24
+
+# Event IDs the session pipeline consumes: successful logon, logoff, failed logon
+SESSION_EVENT_IDS = frozenset({4624, 4634, 4625})
+
+FILETIME_EPOCH = datetime(1601, 1, 1, tzinfo=timezone.utc)
+
+# BinXML tokens, without the 0x40 "more data" flag
+TOKEN_END_OF_STREAM = 0x00
+TOKEN_OPEN_START_ELEMENT = 0x01
+TOKEN_CLOSE_START_ELEMENT = 0x02
+TOKEN_CLOSE_EMPTY_ELEMENT = 0x03
+TOKEN_END_ELEMENT = 0x04
+TOKEN_VALUE = 0x05
+TOKEN_ATTRIBUTE = 0x06
+TOKEN_CDATA = 0x07
+TOKEN_CHAR_REF = 0x08
+TOKEN_ENTITY_REF = 0x09
+TOKEN_PI_TARGET = 0x0a
+TOKEN_PI_DATA = 0x0b
+TOKEN_TEMPLATE_INSTANCE = 0x0c
+TOKEN_NORMAL_SUBSTITUTION = 0x0d
+TOKEN_OPTIONAL_SUBSTITUTION = 0x0e
+TOKEN_FRAGMENT_HEADER = 0x0f
+
+# BinXML value types
+TYPE_NULL = 0x00
+TYPE_WSTRING = 0x01
+TYPE_STRING = 0x02
+TYPE_SIZE_T = 0x10
+TYPE_FILETIME = 0x11
+TYPE_SYSTEMTIME = 0x12
+TYPE_SID = 0x13
+TYPE_HEX_INT32 = 0x14
+TYPE_HEX_INT64 = 0x15
+TYPE_BINXML = 0x21
+TYPE_ARRAY_FLAG = 0x80
+
+INTEGER_FORMATS = {
+    0x03: '<b', 0x04: '<B', 0x05: '<h', 0x06: '<H',
+    0x07: '<i', 0x08: '<I', 0x09: '<q', 0x0a: '<Q',
+}
+
+_u16 = struct.Struct('<H').unpack_from
+_u32 = struct.Struct('<I').unpack_from
+_u64 = struct.Struct('<Q').unpack_from
+
+
+class EvtxFormatError(ValueError):
+    """Raised when an .evtx file or one of its structures is malformed."""
+
+
+class TemplateLayout:
+    """
+    Where the fields the pipeline needs live in a BinXML template.
+
+    Each field is a list of parts: an int is a substitution index into the
+    record's value array, a str is literal text from the template itself.
+    """
+    __slots__ = ('event_id', 'task', 'time_created', 'computer', 'data')
+
+    def __init__(self):
+        self.event_id: List[Union[int, str]] = []
+        self.task: List[Union[int, str]] = []
+        self.time_created: List[Union[int, str]] = []
+        self.computer: List[Union[int, str]] = []
+        self.data: List[List[Union[int, str]]] = []
+
+
+def filetime_to_datetime(value: int) -> datetime:
+    """Convert a Windows FILETIME (100ns ticks since 1601) to an aware UTC datetime."""
+    return FILETIME_EPOCH + timedelta(microseconds=value // 10)
+
+
+def _format_sid(raw: bytes) -> str:
+    revision, count = raw[0], raw[1]
+    authority = int.from_bytes(raw[2:8], 'big')
+    sub_authorities = struct.unpack_from(f'<{count}I', raw, 8)
+    return f"S-{revision}-{authority}" + ''.join(f"-{sub}" for sub in sub_authorities)
+
+
+def _format_guid(raw: bytes) -> str:
+    d1, d2, d3 = struct.unpack_from('<IHH', raw)
+    return f"{{{d1:08X}-{d2:04X}-{d3:04X}-{raw[8:10].hex().upper()}-{raw[10:16].hex().upper()}}}"
+
+
+def decode_value(raw: bytes, value_type: int) -> str:
+    """Render a substitution value the way the Win32 event log renders StringInserts."""
+    if value_type == TYPE_NULL or not raw:
+        return ''
+    if value_type == TYPE_WSTRING:
+        return raw.decode('utf-16-le', errors='replace').rstrip('\x00')
+    if value_type == TYPE_STRING:
+        return raw.decode('latin-1').rstrip('\x00')
+    if value_type in INTEGER_FORMATS:
+        return str(struct.unpack_from(INTEGER_FORMATS[value_type], raw)[0])
+    if value_type == 0x0b:
+        return str(struct.unpack_from('<f', raw)[0])
+    if value_type == 0x0c:
+        return str(struct.unpack_from('<d', raw)[0])
+    if value_type == 0x0d:
+        return 'true' if _u32(raw)[0] else 'false'
+    if value_type == 0x0f:
+        return _format_guid(raw)
+    if value_type in (TYPE_HEX_INT32, TYPE_HEX_INT64, TYPE_SIZE_T):
+        return hex(int.from_bytes(raw, 'little'))
+    if value_type == TYPE_FILETIME:
+        return filetime_to_datetime(_u64(raw)[0]).isoformat()
+    if value_type == TYPE_SYSTEMTIME:
+        year, month, _, day, hour, minute, second, millis = struct.unpack_from('<8H', raw)
+        return datetime(year, month, day, hour, minute, second, millis * 1000, tzinfo=timezone.utc).isoformat()
+    if value_type == TYPE_SID:
+        return _format_sid(raw)
+    if value_type == TYPE_ARRAY_FLAG | TYPE_WSTRING:
+        return ', '.join(s for s in raw.decode('utf-16-le', errors='replace').split('\x00') if s)
+    if value_type == TYPE_BINXML:
+        return ''
+    return raw.hex().upper()
+
+
+class EvtxReader:
+    """
+    Streaming reader for exported .evtx files.
+
+    The file is memory-mapped and walked one 64 KiB chunk at a time, so memory
+    use does not depend on the file size. BinXML templates are compiled once
+    into a TemplateLayout and cached by chunk offset and by template GUID;
+    records are matched against the wanted event IDs straight from their
+    substitution array before any other value is decoded.
+    """
+
+    def __init__(self, path: str, event_ids: Optional[FrozenSet[int]] = SESSION_EVENT_IDS):
+        """
+        Args:
+            path: Path to the .evtx file
+            event_ids: Event IDs to decode; None decodes every record
+        """
+        self.path = path
+        self.event_ids = event_ids
+        self._file = None
+        self._buf: Optional[mmap.mmap] = None
+        self._layouts_by_guid: Dict[Tuple[bytes, int], TemplateLayout] = {}
+        self._chunk_layouts: Dict[int, TemplateLayout] = {}
+        self._chunk_names: Dict[int, str] = {}
+        self.records_seen = 0
+        self.records_decoded = 0
+
+    def open(self) -> None:
+        if self._buf is not None:
+            return
+        self._file = open(self.path, 'rb')
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            self._file = None
+            raise EvtxFormatError(f"Empty EVTX file: {self.path}")
+        if self._buf[:8] != FILE_MAGIC:
+            self.close()
+            raise EvtxFormatError(f"Not an EVTX file: {self.path}")
+
+    def close(self) -> None:
+        if self._buf is not None:
+            self._buf.close()
+            self._buf = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> 'EvtxReader':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def chunk_offsets(self) -> List[Tuple[int, int, int]]:
+        """Return (first_record, last_record, offset) for every valid chunk, in file order."""
+        self.open()
+        chunks = []
+        offset = FILE_HEADER_SIZE
+        while offset + CHUNK_HEADER_SIZE <= len(self._buf):
+            if self._buf[offset:offset + 8] == CHUNK_MAGIC:
+                first_record, last_record = struct.unpack_from('<QQ', self._buf, offset + 24)
+                chunks.append((first_record, last_record, offset))
+            offset += CHUNK_SIZE
+        return chunks
+
+    def iter_chunks(self, newest_first: bool = False) -> Iterator[List[EventRecord]]:
+        """
+        Yield the matching events of each chunk as one list.
+
+        Args:
+            newest_first: Visit chunks by descending record number and reverse
+                each chunk's events, matching a backward read of the live log
+        """
+        chunks = sorted(self.chunk_offsets(), reverse=newest_first)
+        for _, _, offset in chunks:
+            try:
+                events = list(self._iter_chunk(offset))
+            except (EvtxFormatError, struct.error, IndexError, UnicodeDecodeError) as e:
+                logging.warning(f"Skipping corrupt chunk at offset {offset} in {self.path}: {e}")
+                continue
+            if newest_first:
+                events.reverse()
+            yield events
+
+    def __iter__(self) -> Iterator[EventRecord]:
+        for events in self.iter_chunks():
+            yield from events
+
+    def _iter_chunk(self, chunk_base: int) -> Iterator[EventRecord]:
+        buf = self._buf
+        self._chunk_layouts = {}
+        self._chunk_names = {}
+
+        free_space = _u32(buf, chunk_base + 48)[0]
+        end = chunk_base + min(free_space, CHUNK_SIZE)
+        pos = chunk_base + CHUNK_HEADER_SIZE
+        while pos + 28 <= end and buf[pos:pos + 4] == RECORD_MAGIC:
+            size = _u32(buf, pos + 4)[0]
+            if size < 28 or pos + size > end:
+                raise EvtxFormatError(f"Bad record size {size} at offset {pos}")
+            self.records_seen += 1
+            event = self._parse_record(chunk_base, pos, size)
+            if event is not None:
+                self.records_decoded += 1
+                yield event
+            pos += size
+
+    def _parse_record(self, chunk_base: int, pos: int, size: int) -> Optional[EventRecord]:
+        buf = self._buf
+        record_number, written = struct.unpack_from('<QQ', buf, pos + 8)
+
+        p = pos + 24
+        if buf[p] == TOKEN_FRAGMENT_HEADER:
+            p += 4
+        if buf[p] != TOKEN_TEMPLATE_INSTANCE:
+            return None
+
+        node_offset = p - chunk_base
+        definition_offset = _u32(buf, p + 6)[0]
+        p += 10
+        layout = self._chunk_layouts.get(definition_offset)
+        if definition_offset > node_offset:
+            # Resident template: the definition follows inline and must be skipped
+            data_size = _u32(buf, p + 20)[0]
+            if layout is None:
+                layout = self._layout_for(chunk_base, p)
+            p += TEMPLATE_HEADER_SIZE + data_size
+        elif layout is None:
+            layout = self._layout_for(chunk_base, chunk_base + definition_offset)
+
+        count = _u32(buf, p)[0]
+        p += 4
+        values_start = p + 4 * count
+        descriptors = struct.unpack_from(f'<{2 * count}H', buf, p)
+        offsets = []
+        cursor = values_start
+        for index in range(count):
+            offsets.append(cursor)
+            cursor += descriptors[2 * index]
+
+        def value(index: int) -> Tuple[bytes, int]:
+            if index >= count:
+                return b'', TYPE_NULL
+            start = offsets[index]
+            return buf[start:start + descriptors[2 * index]], descriptors[2 * index + 1] & 0xff
+
+        def render(parts: Sequence[Union[int, str]]) -> str:
+            return ''.join(part if isinstance(part, str) else decode_value(*value(part)) for part in parts)
+
+        event_id = _parse_int(render(layout.event_id))
+        if self.event_ids is not None and event_id not in self.event_ids:
+            return None
+
+        time_created = None
+        if len(layout.time_created) == 1 and isinstance(layout.time_created[0], int):
+            raw, value_type = value(layout.time_created[0])
+            if value_type == TYPE_FILETIME and len(raw) == 8:
+                time_created = filetime_to_datetime(_u64(raw)[0])
+
+        return EventRecord(
+            EventID=event_id,
+            TimeGenerated=time_created or filetime_to_datetime(written),
+            StringInserts=[render(parts) for parts in layout.data],
+            EventCategory=_parse_int(render(layout.task)),
+            RecordNumber=record_number,
+            ComputerName=render(layout.computer),
+        )
+
+    def _layout_for(self, chunk_base: int, definition: int) -> TemplateLayout:
+        buf = self._buf
+        guid = bytes(buf[definition + 4:definition + 20])
+        data_size = _u32(buf, definition + 20)[0]
+        key = (guid, data_size)
+
+        layout = self._layouts_by_guid.get(key)
+        if layout is None:
+            start = definition + TEMPLATE_HEADER_SIZE
+            layout = self._compile_template(chunk_base, start, start + data_size)
+            self._layouts_by_guid[key] = layout
+        self._chunk_layouts[definition - chunk_base] = layout
+        return layout
+
+    def _name(self, chunk_base: int, node_offset: int, pos: int) -> Tuple[str, int]:
+        """Read the name referenced at pos; returns the name and the position after the reference."""
+        buf = self._buf
+        name_offset = _u32(buf, pos)[0]
+        pos += 4
+        name = self._chunk_names.get(name_offset)
+        if name is None:
+            start = chunk_base + name_offset
+            length = _u16(buf, start + 6)[0]
+            name = buf[start + 8:start + 8 + 2 * length].decode('utf-16-le')
+            self._chunk_names[name_offset] = name
+        if name_offset > node_offset:
+            # Inline name: next offset, hash, length, characters and terminator
+            pos += 8 + 2 * _u16(buf, pos + 6)[0] + 2
+        return name, pos
+
+    def _compile_template(self, chunk_base: int, pos: int, end: int) -> TemplateLayout:
+        buf = self._buf
+        layout = TemplateLayout()
+        stack: List[str] = []
+        attribute: Optional[str] = None
+
+        def emit(part: Union[int, str]) -> None:
+            if not stack:
+                return
+            element = stack[-1]
+            if attribute is not None:
+                if element == 'TimeCreated' and attribute == 'SystemTime':
+                    layout.time_created.append(part)
+            elif element == 'EventID':
+                layout.event_id.append(part)
+            elif element == 'Task':
+                layout.task.append(part)
+            elif element == 'Computer':
+                layout.computer.append(part)
+            elif element == 'Data' and layout.data and 'EventData' in stack:
+                layout.data[-1].append(part)
+
+        while pos < end:
+            token = buf[pos] & 0x0f if buf[pos] & 0xf0 == 0x40 else buf[pos]
+            node_offset = pos - chunk_base
+
+            if token == TOKEN_END_OF_STREAM:
+                break
+            elif token == TOKEN_FRAGMENT_HEADER:
+                pos += 4
+            elif token == TOKEN_OPEN_START_ELEMENT:
+                has_attributes = buf[pos] & 0x40
+                name, pos = self._name(chunk_base, node_offset, pos + 7)
+                if has_attributes:
+                    pos += 4
+                if name == 'Data' and 'EventData' in stack:
+                    layout.data.append([])
+                stack.append(name)
+                attribute = None
+            elif token == TOKEN_CLOSE_START_ELEMENT:
+                attribute = None
+                pos += 1
+            elif token in (TOKEN_CLOSE_EMPTY_ELEMENT, TOKEN_END_ELEMENT):
+                if stack:
+                    stack.pop()
+                attribute = None
+                pos += 1
+            elif token == TOKEN_ATTRIBUTE:
+                attribute, pos = self._name(chunk_base, node_offset, pos + 1)
+            elif token == TOKEN_VALUE:
+                if buf[pos + 1] != TYPE_WSTRING:
+                    raise EvtxFormatError(f"Unsupported literal value type {buf[pos + 1]:#x}")
+                length = _u16(buf, pos + 2)[0]
+                emit(buf[pos + 4:pos + 4 + 2 * length].decode('utf-16-le'))
+                pos += 4 + 2 * length
+            elif token in (TOKEN_NORMAL_SUBSTITUTION, TOKEN_OPTIONAL_SUBSTITUTION):
+                emit(_u16(buf, pos + 1)[0])
+                pos += 4
+            elif token in (TOKEN_CDATA, TOKEN_PI_DATA):
+                pos += 3 + 2 * _u16(buf, pos + 1)[0]
+            elif token == TOKEN_CHAR_REF:
+                pos += 3
+            elif token in (TOKEN_ENTITY_REF, TOKEN_PI_TARGET):
+                _, pos = self._name(chunk_base, node_offset, pos + 1)
+            else:
+                raise EvtxFormatError(f"Unexpected BinXML token {buf[pos]:#x} at offset {pos}")
+
+        return layout
+
+
+def _parse_int(text: str) -> int:
+    try:
+        return int(text, 0) if text.startswith('0x') else int(text or 0)
+    except ValueError:
+        return 0
+
+
+class EvtxEventSource(EventSource):
+    """
+    Reads one exported .evtx file, newest chunk first, for the session pipeline.
+
+    Each file is its own source, so stop_at_cutoff and bookmarks apply per
+    file; pass several to iter_sharded_session_events, e.g. via evtx_sources,
+    to read a set of exports as one time-ordered stream.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            event_ids: Optional[FrozenSet[int]] = SESSION_EVENT_IDS,
+            channel: str = "Security",
+            host: str = ''
+    ):
+        """
+        Args:
+            path: The .evtx file
+            event_ids: Event IDs to decode; None decodes every record
+            channel: Channel name reported to bookmark stores
+            host: Host name reported to bookmark stores; defaults to the file path,
+                so every file keeps its own bookmark
+        """
+        if not isinstance(path, str):
+            raise TypeError("EvtxEventSource reads one file; use evtx_sources for several")
+        self.path = path
+        self.event_ids = event_ids
+        self.channel = channel
+        self.host = host or path
+
+    def record_range(self) -> Optional[Tuple[int, int]]:
+        with EvtxReader(self.path, self.event_ids) as reader:
+            chunks = reader.chunk_offsets()
+        if not chunks:
+            return None
+        return min(c[0] for c in chunks), max(c[1] for c in chunks)
+
+    def read_batches(self) -> Iterator[Sequence[Any]]:
+        with EvtxReader(self.path, self.event_ids) as reader:
+            for events in reader.iter_chunks(newest_first=True):
+                if events:
+                    yield events
+            logging.info(
+                f"{self.path}: decoded {reader.records_decoded} of {reader.records_seen} records"
+            )
+
+
+def evtx_sources(paths: Sequence[str], **kwargs) -> List[EvtxEventSource]:
+    """One EvtxEventSource per file, with the same options; see EvtxEventSource for them."""
+    return [EvtxEventSource(path, **kwargs) for path in paths]
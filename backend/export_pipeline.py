@@ -0,0 +1,233 @@
+# export_pipeline.py
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Union
+
+import pandas as pd
+
+from backend.jsonl_archive import JsonlArchive
+from backend.log_entry import LogEntry
+from data_clean import check_result
+
+# Columns of exported_logons.csv, as save_json_file_to_csv writes them
+FEATURE_COLUMNS = [
+    'timestamp',
+    'status',
+    'day_of_week',
+    'is_rapid_login',
+    'is_business_hours',
+    'risk_score',
+    'logon_type',
+    'behavior_rarity'
+]
+# Columns clean_csv label-encodes
+LABEL_COLUMNS = ['status', 'is_rapid_login', 'is_business_hours']
+# Fields the model input is aggregated from, as in analyze_first_three_logs
+MODEL_FIELDS = ['status', 'is_rapid_login', 'is_business_hours', 'risk_score']
+MODEL_WINDOW = 3
+# Label codes of the model features, as a LabelEncoder fitted on both values assigns them
+STATUS_CODES = {'failed': 0, 'success': 1}
+DEFAULT_SINK_WORKERS = 4
+
+_entry_row = attrgetter('epoch', *FEATURE_COLUMNS)
+
+
+def _record_row(record: Dict[str, Any]) -> tuple:
+    return tuple(record.get(col) for col in ('epoch', *FEATURE_COLUMNS))
+
+
+@dataclass
+class FeatureExport:
+    """The tables built for one export and the model input taken from them."""
+    features: pd.DataFrame
+    cleaned: pd.DataFrame
+    model_input: Optional[Dict[str, Any]]
+
+
+def build_feature_table(entries: Iterable[Union[LogEntry, Dict[str, Any]]]) -> pd.DataFrame:
+    """
+    Build the exported_logons.csv table straight from enriched records, newest first.
+
+    Args:
+        entries: LogEntry records, or dicts in LogEntry.to_dict form (e.g. archive records)
+    """
+    rows = [_entry_row(entry) if isinstance(entry, LogEntry) else _record_row(entry) for entry in entries]
+    if not rows:
+        return pd.DataFrame(columns=FEATURE_COLUMNS + ['weekday', 'result'])
+
+    df = pd.DataFrame(rows, columns=['epoch', *FEATURE_COLUMNS])
+    df = df.sort_values('epoch', ascending=False, kind='stable').drop(columns='epoch')
+    df['is_rapid_login'] = df['is_rapid_login'].astype(bool).astype(int)
+    df = df.drop_duplicates(keep='first')
+    df['weekday'] = df['day_of_week'].map(check_result)
+    df['result'] = df['risk_score'].map(check_result)
+    return df
+
+
+def clean_feature_table(features: pd.DataFrame) -> pd.DataFrame:
+    """
+    The cleaned_logons.csv table: parsed timestamps and label-encoded flags.
+
+    pd.factorize with sort=True assigns the same codes as a LabelEncoder
+    fitted on the column, as clean_csv does.
+    """
+    cleaned = features.copy()
+    cleaned['timestamp'] = pd.to_datetime(cleaned['timestamp'])
+    for column in LABEL_COLUMNS:
+        cleaned[column] = pd.factorize(cleaned[column], sort=True)[0]
+    return cleaned
+
+
+def model_features(window: Sequence[Dict[str, Any]], min_events: int = MODEL_WINDOW) -> Optional[Dict[str, Any]]:
+    """
+    Aggregate a window of events into the model's input.
+
+    Codes are fixed rather than fitted on the window, so the input is the
+    same whichever export or reader the window came from.
+
+    Args:
+        window: Records oldest first, e.g. from tail_archive, tail_database or a feature table
+        min_events: Fewest events to aggregate
+
+    Returns:
+        The aggregated input, or None with fewer than min_events events
+    """
+    if not window or len(window) < min_events:
+        logging.warning(f"Not enough logs to analyze (requires at least {min_events} entries)")
+        return None
+
+    latest = window[-1]
+    risk_scores = [int(record.get('risk_score') or 0) for record in window]
+    return {
+        "status": STATUS_CODES.get(str(latest.get('status', '')).lower(), 0),  # Take the latest status
+        "is_rapid_login": any(bool(record.get('is_rapid_login')) for record in window),  # If any log was rapid
+        "is_business_hours": int(bool(latest.get('is_business_hours'))),  # Take the latest business hour status
+        "risk_score": sum(risk_scores) // len(risk_scores)  # Avg risk score
+    }
+
+
+def export_features(
+        entries: Iterable[Union[LogEntry, Dict[str, Any]]],
+        exported_csv_path: Optional[str] = None,
+        cleaned_csv_path: Optional[str] = None
+) -> FeatureExport:
+    """
+    Build the feature tables once, in memory, and fan them out to every sink.
+
+    Args:
+        entries: Enriched records to export
+        exported_csv_path: Where to write the feature table, if anywhere
+        cleaned_csv_path: Where to write the cleaned table, if anywhere
+
+    Returns:
+        The tables and the model input
+    """
+    features = build_feature_table(entries)
+    if features.empty:
+        logging.info("No data to save after filtering.")
+        return FeatureExport(features, features, None)
+
+    cleaned = clean_feature_table(features)
+    for table, path in ((features, exported_csv_path), (cleaned, cleaned_csv_path)):
+        if path:
+            table.to_csv(path, index=False)
+            logging.info(f"Data successfully saved to {path}")
+    # The feature table is newest first; the window is read from the raw values, not the fitted labels
+    newest = features[MODEL_FIELDS].head(MODEL_WINDOW).to_dict('records')
+    return FeatureExport(features, cleaned, model_features(newest[::-1]))
+
+
+@dataclass
+class SinkResult:
+    """Outcome of one export sink: what it returned or raised, and how long it took."""
+    name: str
+    seconds: float
+    result: Any = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _run_sink(name: str, sink: Callable[[], Any]) -> SinkResult:
+    start = time.perf_counter()
+    try:
+        result = sink()
+    except Exception as e:
+        logging.error(f"❌ Export sink {name} failed: {e}")
+        return SinkResult(name, time.perf_counter() - start, error=e)
+    return SinkResult(name, time.perf_counter() - start, result=result)
+
+
+def run_sinks(sinks: Dict[str, Callable[[], Any]], max_workers: int = DEFAULT_SINK_WORKERS) -> Dict[str, SinkResult]:
+    """
+    Run independent export sinks concurrently on a small thread pool.
+
+    The sinks mostly wait on disk (fsync, SQLite commits, file writes), so
+    they overlap well in threads. Each is timed, and a failing sink is
+    logged and reported without stopping the others.
+
+    Args:
+        sinks: Zero-argument callables by sink name; they must only read shared data
+        max_workers: Most sinks running at once
+
+    Returns:
+        Each sink's result, by name, in the order given
+    """
+    if not sinks:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(sinks)), thread_name_prefix='export-sink') as pool:
+        futures = {name: pool.submit(_run_sink, name, sink) for name, sink in sinks.items()}
+    results = {name: future.result() for name, future in futures.items()}
+
+    timings = ', '.join(
+        f"{result.name} {result.seconds * 1000:.0f} ms{'' if result.ok else ' (failed)'}"
+        for result in sorted(results.values(), key=attrgetter('seconds'), reverse=True)
+    )
+    logging.info(f"Export sinks, slowest first: {timings}")
+    return results
+
+
+def reprocess_archive(
+        directory: str,
+        prefix: str = 'session_logons',
+        exported_csv_path: Optional[str] = None,
+        cleaned_csv_path: Optional[str] = None,
+        start_day: Optional[str] = None,
+        end_day: Optional[str] = None
+) -> FeatureExport:
+    """Rebuild the feature exports from archived records; the only export path that reads from disk."""
+    records = JsonlArchive(directory, prefix).iter_records(start_day, end_day)
+    return export_features(records, exported_csv_path, cleaned_csv_path)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    """
+    Re-process a JSONL archive into the CSV exports.
+
+    Usage:
+        python -m backend.export_pipeline ARCHIVE_DIR [--prefix P] [--from DAY] [--to DAY]
+            [--exported PATH] [--cleaned PATH]
+    """
+    parser = argparse.ArgumentParser(description="Rebuild the CSV exports from a JSONL archive.")
+    parser.add_argument('directory')
+    parser.add_argument('--prefix', default='session_logons')
+    parser.add_argument('--from', dest='start_day', help="First day to include, YYYY-MM-DD")
+    parser.add_argument('--to', dest='end_day', help="Last day to include, YYYY-MM-DD")
+    parser.add_argument('--exported', default='exported_logons.csv')
+    parser.add_argument('--cleaned', default='cleaned_logons.csv')
+    args = parser.parse_args(argv)
+
+    result = reprocess_archive(
+        args.directory, args.prefix, args.exported, args.cleaned, args.start_day, args.end_day
+    )
+    print(f"{len(result.features)} rows exported; model input: {result.model_input}")
+
+
+if __name__ == '__main__':
+    main()
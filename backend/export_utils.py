@@ -5,9 +5,12 @@ import logging
 import msvcrt  # Windows-specific file locking
 import os
 from contextlib import contextmanager
+from itertools import islice
 
 import pandas as pd
 
+from backend.csv_index import CsvRowIndex, append_unique_rows, read_header
+from backend.jsonl_archive import iter_records
 from data_clean import check_result
 
 
@@ -33,12 +36,12 @@ def save_to_json(logs, filepath):
     Save logs to JSON format.
 
     Args:
-        logs: List of log dictionaries.
+        logs: List of LogEntry records.
         filepath: Full path to the JSON file.
     """
     try:
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(logs, f, indent=2)
+            json.dump([log.to_dict() for log in logs], f, indent=2)
         logging.info(f"JSON file saved: {filepath}")
         return filepath
     except Exception as e:
@@ -57,7 +60,7 @@ def save_to_csv(data, filename='exported_logs.csv'):
 
     try:
         # Convert data to DataFrame
-        df = pd.DataFrame(data)
+        df = pd.DataFrame([log.to_dict() for log in data])
 
         # Debug: Check if 'is_rapid_login' exists and is populated
         if 'is_rapid_login' not in df.columns:
@@ -76,27 +79,27 @@ def save_to_csv(data, filename='exported_logs.csv'):
             'is_business_hours',
             'risk_score',
             'logon_type',
-            'source_ip'
+            'source_ip',
+            'behavior_rarity'
         ]
 
         # Filter columns and handle missing columns
         available_columns = [col for col in ml_columns if col in df.columns]
         df_ml = df[available_columns]
 
-        # Remove duplicates
-        df_unique = df_ml.drop_duplicates(keep='first')
-
-        # Save to CSV
-        if not os.path.exists(filename):
-            df_unique.to_csv(filename, index=False)
-            logging.debug(f"Created new file: {filename}")
-        else:
-            # Append to existing file
+        header = read_header(filename)
+        if header is not None and header != available_columns:
+            # Column set changed: merge once the slow way, then index the result
             df_existing = pd.read_csv(filename)
-            combined_df = pd.concat([df_existing, df_unique]).drop_duplicates(keep='first')
+            combined_df = pd.concat([df_existing, df_ml]).drop_duplicates(keep='first')
             combined_df.to_csv(filename, index=False)
-            logging.debug(f"Updated existing file: {filename}")
-            logging.debug(f"Total records in file: {len(combined_df)}")
+            CsvRowIndex(filename).rebuild()
+            logging.debug(f"Rewrote {filename} with columns {available_columns}")
+            return
+
+        # Deduplicate against the row index and append only the new rows
+        appended = append_unique_rows(filename, available_columns, df_ml.itertuples(index=False, name=None))
+        logging.debug(f"Appended {appended} new records to {filename}")
 
     except Exception as e:
         logging.error(f"Error saving to CSV: {e}")
@@ -104,10 +107,11 @@ def save_to_csv(data, filename='exported_logs.csv'):
 
 def save_json_file_to_csv(json_file_path, csv_file_path='exported_logs.csv'):
     """
-    Load JSON data from a file, filter ML-relevant columns, and save to a CSV file.
+    Stream log entries from JSON Lines archive segments (or an older JSON export),
+    filter ML-relevant columns, and save them newest first to a CSV file.
 
     Args:
-        json_file_path (str): Path to the JSON file containing log entries.
+        json_file_path (str or list): Path, or paths, of the segments or JSON file containing log entries.
         csv_file_path (str): Path to the CSV file to save filtered data.
     Returns:
         str: Path to the created CSV file if successful, None otherwise.
@@ -120,33 +124,42 @@ def save_json_file_to_csv(json_file_path, csv_file_path='exported_logs.csv'):
         'is_rapid_login',
         'is_business_hours',
         'risk_score',
-        'logon_type'
+        'logon_type',
+        'behavior_rarity'
     ]
 
+    paths = [json_file_path] if isinstance(json_file_path, str) else list(json_file_path)
+
     try:
-        # Check if the JSON file exists
-        if not os.path.exists(json_file_path):
-            logging.error(f"JSON file not found: {json_file_path}")
+        # Check if the JSON files exist
+        missing = [path for path in paths if not os.path.exists(path)]
+        if not paths or missing:
+            logging.error(f"JSON file not found: {missing or json_file_path}")
             return None
 
-        # Load JSON data from the file
-        with open(json_file_path, 'r') as f:
-            json_data = json.load(f)
-
-        # Convert JSON data to DataFrame
-        df = pd.DataFrame(json_data)
+        # Stream the records, keeping only the ML columns and the epoch to order by
+        wanted = ml_columns + ['epoch']
+        seen = set()
+        rows = []
+        for record in iter_records(paths):
+            seen.update(record)
+            rows.append([record.get(col) for col in wanted])
 
         # Ensure the JSON data is not empty
-        if df.empty:
+        if not rows:
             logging.warning(f"The JSON file {json_file_path} is empty.")
             return None
 
         # Filter only the required ML columns
-        available_columns = [col for col in ml_columns if col in df.columns]
+        available_columns = [col for col in ml_columns if col in seen]
         if not available_columns:
             logging.warning("No ML-relevant columns found in the JSON file.")
             return None
 
+        df = pd.DataFrame(rows, columns=wanted)
+        if 'epoch' in seen:
+            # Segments hold whole days oldest first; exports are newest first
+            df = df.sort_values('epoch', ascending=False, kind='stable')
         df_filtered = df[available_columns]
 
         # Ensure 'is_rapid_login' column is mapped to 1 and 0
@@ -180,7 +193,7 @@ def save_json_file_to_csv(json_file_path, csv_file_path='exported_logs.csv'):
 
 def analyze_first_three_logs(csv_file):
     """
-    Reads the first 3 rows of a CSV file and generates a final aggregated log entry for AI detection.
+    Reads only the first 3 rows of a CSV file and generates a final aggregated log entry for AI detection.
 
     Args:
         csv_file (str): Path to the input CSV file.
@@ -192,7 +205,7 @@ def analyze_first_three_logs(csv_file):
 
     try:
         with open(csv_file, mode='r', encoding='utf-8') as f:
-            reader = list(csv.DictReader(f))  # Convert to a list for indexing
+            reader = list(islice(csv.DictReader(f), 3))  # Stop reading after the rows used
 
             if len(reader) < 3:
                 print("❌ Not enough logs to analyze (Requires at least 3 entries)")
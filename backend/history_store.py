@@ -0,0 +1,196 @@
+# history_store.py
+import sys
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Iterator, Optional, Sequence
+
+from backend.log_entry import LogEntry
+
+DEFAULT_RETENTION_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_PER_USER = 1000
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# Appends between full sweeps for aged-out entries, so expiry stays amortised O(1)
+SWEEP_INTERVAL = 10000
+
+_STRING_FIELDS = ('user', 'domain', 'user_sid', 'logon_id', 'source_ip', 'workstation_name', 'host')
+
+
+def estimate_entry_size(entry: LogEntry) -> int:
+    """Approximate bytes held by a stored entry: the slotted object plus its main strings."""
+    return sys.getsizeof(entry) + sum(sys.getsizeof(getattr(entry, name)) for name in _STRING_FIELDS)
+
+
+def _insert_sorted(entries: Deque[LogEntry], entry: LogEntry) -> None:
+    """Insert an entry into a deque kept in epoch order, after any entries with the same epoch."""
+    if not entries or entry.epoch >= entries[-1].epoch:
+        entries.append(entry)
+    elif entry.epoch < entries[0].epoch:
+        # Newest-first reads
+        entries.appendleft(entry)
+    else:
+        # Out-of-order events land near the newest end
+        index = len(entries) - 1
+        while entries[index - 1].epoch > entry.epoch:
+            index -= 1
+        entries.insert(index, entry)
+
+
+class SessionHistoryStore:
+    """
+    Per-user session history with a retention horizon, a per-user cap and a
+    global memory budget.
+
+    Entries older than the retention horizon (measured from the newest event
+    seen) are dropped, each user keeps at most max_per_user entries, and when
+    the approximate memory held exceeds max_bytes the least recently active
+    users lose their oldest entries first.
+
+    Each user's entries are kept in epoch order whatever order they arrive in,
+    so the entry evicted is always the one with the smallest epoch. Forward
+    and newest-first streams insert at an end in O(1).
+    """
+
+    def __init__(
+            self,
+            retention_seconds: int = DEFAULT_RETENTION_SECONDS,
+            max_per_user: int = DEFAULT_MAX_PER_USER,
+            max_bytes: int = DEFAULT_MAX_BYTES,
+            on_user_evicted: Optional[Callable[[str], None]] = None
+    ):
+        """
+        Args:
+            retention_seconds: Age, relative to the newest event seen, beyond which entries are dropped
+            max_per_user: Maximum entries kept per user
+            max_bytes: Approximate memory budget for all stored entries
+            on_user_evicted: Called with the user name when a user's last entry is evicted
+        """
+        if retention_seconds <= 0 or max_per_user < 1 or max_bytes <= 0:
+            raise ValueError("History limits must be positive")
+
+        self.retention_seconds = retention_seconds
+        self.max_per_user = max_per_user
+        self.max_bytes = max_bytes
+        self.on_user_evicted = on_user_evicted
+
+        # Least recently active user first
+        self._users: 'OrderedDict[str, Deque[LogEntry]]' = OrderedDict()
+        self._entries = 0
+        self._bytes = 0
+        self._latest_epoch: Optional[int] = None
+        self._appends_since_sweep = 0
+
+        self.evicted_by_age = 0
+        self.evicted_by_user_cap = 0
+        self.evicted_by_budget = 0
+
+    def __contains__(self, user: str) -> bool:
+        return user in self._users
+
+    def __getitem__(self, user: str) -> Sequence[LogEntry]:
+        return self._users.get(user, ())
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._users)
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    @property
+    def size(self) -> int:
+        """Number of entries currently stored."""
+        return self._entries
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate bytes held by the stored entries."""
+        return self._bytes
+
+    def stats(self) -> Dict[str, int]:
+        """Current size and eviction counters."""
+        return {
+            'users': len(self._users),
+            'entries': self._entries,
+            'memory_bytes': self._bytes,
+            'evicted_by_age': self.evicted_by_age,
+            'evicted_by_user_cap': self.evicted_by_user_cap,
+            'evicted_by_budget': self.evicted_by_budget,
+        }
+
+    def clear(self) -> None:
+        """Drop all entries; eviction counters are kept."""
+        self._users.clear()
+        self._entries = 0
+        self._bytes = 0
+        self._latest_epoch = None
+        self._appends_since_sweep = 0
+
+    def append(self, entry: LogEntry) -> None:
+        """Store an entry, evicting by age, per-user cap or memory budget as needed."""
+        if self._latest_epoch is None or entry.epoch > self._latest_epoch:
+            self._latest_epoch = entry.epoch
+        horizon = self._latest_epoch - self.retention_seconds
+        if entry.epoch < horizon:
+            self.evicted_by_age += 1
+            return
+
+        user = entry.user
+        entries = self._users.get(user)
+        if entries is None:
+            entries = self._users[user] = deque()
+        else:
+            self._users.move_to_end(user)
+
+        _insert_sorted(entries, entry)
+        self._entries += 1
+        self._bytes += estimate_entry_size(entry)
+
+        # Entries are in epoch order, so the oldest is on the left
+        while entries and entries[0].epoch < horizon:
+            self._pop_oldest(user, entries)
+            self.evicted_by_age += 1
+        while len(entries) > self.max_per_user:
+            self._pop_oldest(user, entries)
+            self.evicted_by_user_cap += 1
+
+        while self._bytes > self.max_bytes and self._users:
+            lru_user, lru_entries = next(iter(self._users.items()))
+            self._pop_oldest(lru_user, lru_entries)
+            self.evicted_by_budget += 1
+
+        self._appends_since_sweep += 1
+        if self._appends_since_sweep >= SWEEP_INTERVAL:
+            self.expire()
+
+    def expire(self) -> None:
+        """Sweep every user for entries older than the retention horizon."""
+        self._appends_since_sweep = 0
+        if self._latest_epoch is None:
+            return
+        horizon = self._latest_epoch - self.retention_seconds
+
+        for user in list(self._users):
+            entries = self._users[user]
+            kept = deque(entry for entry in entries if entry.epoch >= horizon)
+            if len(kept) == len(entries):
+                continue
+            for entry in entries:
+                if entry.epoch < horizon:
+                    self._bytes -= estimate_entry_size(entry)
+            self.evicted_by_age += len(entries) - len(kept)
+            self._entries -= len(entries) - len(kept)
+            if kept:
+                self._users[user] = kept
+            else:
+                self._remove_user(user)
+
+    def _pop_oldest(self, user: str, entries: Deque[LogEntry]) -> None:
+        entry = entries.popleft()
+        self._entries -= 1
+        self._bytes -= estimate_entry_size(entry)
+        if not entries:
+            self._remove_user(user)
+
+    def _remove_user(self, user: str) -> None:
+        del self._users[user]
+        if self.on_user_evicted is not None:
+            self.on_user_evicted(user)
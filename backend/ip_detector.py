@@ -0,0 +1,202 @@
+# ip_detector.py
+import hashlib
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from backend.log_entry import LogEntry
+
+DEFAULT_WINDOW_SECONDS = 600
+DEFAULT_BUCKETS = 10
+DEFAULT_DEPTH = 4
+DEFAULT_WIDTH = 1024
+DEFAULT_REGISTERS = 16
+
+DEFAULT_FAILED_THRESHOLD = 10
+DEFAULT_DISTINCT_USERS_THRESHOLD = 5
+
+# Source addresses Windows reports for local or unknown origins
+IGNORED_SOURCE_IPS = frozenset(('', '-', '127.0.0.1', '::1'))
+
+# HyperLogLog bias correction for small register counts
+_HLL_ALPHA = {16: 0.673, 32: 0.697, 64: 0.709}
+
+
+class IpVerdicts:
+    BRUTE_FORCE = 'brute_force'
+    PASSWORD_SPRAY = 'password_spray'
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class SourceIpDetector:
+    """
+    Per-source-IP failed-attempt and distinct-user counts over a sliding window,
+    in fixed memory regardless of how many addresses are seen.
+
+    The window is a ring of time buckets keyed by event time, so it slides
+    correctly whether events arrive oldest-first or newest-first; a bucket is
+    cleared when its ring slot is reused for another bucket. Each bucket holds
+    a count-min sketch of failed attempts and, in each count-min cell, a small
+    HyperLogLog of the user names attempted. Estimates take the minimum over
+    the sketch rows, so collisions can only overstate a count, never hide an
+    attacker.
+    """
+
+    def __init__(
+            self,
+            window_seconds: int = DEFAULT_WINDOW_SECONDS,
+            buckets: int = DEFAULT_BUCKETS,
+            depth: int = DEFAULT_DEPTH,
+            width: int = DEFAULT_WIDTH,
+            registers: int = DEFAULT_REGISTERS,
+            failed_threshold: int = DEFAULT_FAILED_THRESHOLD,
+            distinct_users_threshold: int = DEFAULT_DISTINCT_USERS_THRESHOLD
+    ):
+        """
+        Args:
+            window_seconds: Length of the sliding window
+            buckets: Number of ring buckets the window is divided into
+            depth: Count-min rows (independent hashes)
+            width: Count-min columns per row
+            registers: HyperLogLog registers per cell; a power of two
+            failed_threshold: Failed attempts from one IP within the window that mean brute force
+            distinct_users_threshold: Distinct users tried from one IP within the window that mean a spray
+        """
+        if window_seconds <= 0 or buckets < 1 or depth < 1 or width < 1:
+            raise ValueError("Detector dimensions must be positive")
+        if registers < 16 or registers & (registers - 1):
+            raise ValueError("Registers must be a power of two, at least 16")
+
+        self.bucket_seconds = max(1, window_seconds // buckets)
+        self.buckets = buckets
+        self.depth = depth
+        self.width = width
+        self.registers = registers
+        self.failed_threshold = failed_threshold
+        self.distinct_users_threshold = distinct_users_threshold
+
+        self._register_bits = registers.bit_length() - 1
+        self._alpha = _HLL_ALPHA.get(registers, 0.7213 / (1 + 1.079 / registers))
+        self._rows = np.arange(depth)
+
+        self._bucket_ids = np.full(buckets, -1, dtype=np.int64)
+        self._failures = np.zeros((buckets, depth, width), dtype=np.uint32)
+        self._users = np.zeros((buckets, depth, width, registers), dtype=np.uint8)
+        self._columns: Dict[str, np.ndarray] = {}
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held by the sketches; fixed at construction."""
+        return self._failures.nbytes + self._users.nbytes + self._bucket_ids.nbytes
+
+    def _cells(self, source_ip: str) -> np.ndarray:
+        columns = self._columns.get(source_ip)
+        if columns is None:
+            h = _hash64(source_ip)
+            h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+            columns = (h1 + self._rows * h2) % self.width
+            if len(self._columns) >= self.width * self.depth:
+                # Bound the hash cache along with the sketches
+                self._columns.clear()
+            self._columns[source_ip] = columns
+        return columns
+
+    def _slot(self, epoch: int) -> int:
+        bucket = epoch // self.bucket_seconds
+        slot = bucket % self.buckets
+        if self._bucket_ids[slot] != bucket:
+            self._bucket_ids[slot] = bucket
+            self._failures[slot] = 0
+            self._users[slot] = 0
+        return slot
+
+    def record_failure(self, source_ip: str, user: str, epoch: int) -> None:
+        """Count one failed logon from source_ip for user at epoch."""
+        if source_ip in IGNORED_SOURCE_IPS:
+            return
+        slot = self._slot(epoch)
+        columns = self._cells(source_ip)
+        self._failures[slot, self._rows, columns] += 1
+
+        h = _hash64(user.lower())
+        register = h & (self.registers - 1)
+        remaining = h >> self._register_bits
+        rank = min(64 - self._register_bits - remaining.bit_length() + 1, 255)
+        cells = self._users[slot, self._rows, columns, register]
+        self._users[slot, self._rows, columns, register] = np.maximum(cells, rank)
+
+    def _live_slots(self, epoch: int) -> np.ndarray:
+        bucket = epoch // self.bucket_seconds
+        return np.flatnonzero(
+            (self._bucket_ids >= 0) & (np.abs(self._bucket_ids - bucket) < self.buckets)
+        )
+
+    def _estimate_distinct(self, registers: np.ndarray) -> int:
+        """HyperLogLog estimate per sketch row, with linear counting for small sets; minimum over rows."""
+        m = self.registers
+        raw = self._alpha * m * m / np.power(2.0, -registers.astype(np.float64)).sum(axis=1)
+        zeros = (registers == 0).sum(axis=1)
+        estimates = [
+            m * math.log(m / z) if e <= 2.5 * m and z else e
+            for e, z in zip(raw.tolist(), zeros.tolist())
+        ]
+        return int(round(min(estimates)))
+
+    def counts(self, source_ip: str, epoch: int) -> Tuple[int, int]:
+        """Estimated failed attempts and distinct users for source_ip in the window around epoch."""
+        if source_ip in IGNORED_SOURCE_IPS:
+            return 0, 0
+        slots = self._live_slots(epoch)
+        if not slots.size:
+            return 0, 0
+        columns = self._cells(source_ip)
+        failures = int(self._failures[slots[:, None], self._rows, columns].sum(axis=0).min())
+        if failures <= 1:
+            return failures, failures
+        registers = self._users[slots[:, None], self._rows, columns].max(axis=0)
+        # Every distinct user was attempted at least once
+        return failures, min(failures, self._estimate_distinct(registers))
+
+    def verdict(self, failed_attempts: int, distinct_users: int) -> str:
+        if distinct_users >= self.distinct_users_threshold:
+            return IpVerdicts.PASSWORD_SPRAY
+        if failed_attempts >= self.failed_threshold:
+            return IpVerdicts.BRUTE_FORCE
+        return ''
+
+    def observe(self, log_entry: LogEntry) -> Optional[str]:
+        """
+        Record a failed logon and set the entry's ip_* fields from the window.
+
+        Successful logons are not counted but still get the verdict for their
+        source, so a success after a spray is visible.
+
+        Returns:
+            The verdict for the entry's source IP
+        """
+        if log_entry.source_ip in IGNORED_SOURCE_IPS:
+            return None
+        log_entry.ip_failed_attempts, log_entry.ip_distinct_users, log_entry.ip_verdict = self.assess(
+            log_entry.source_ip, log_entry.user, log_entry.epoch, log_entry.status == 'failed'
+        )
+        return log_entry.ip_verdict
+
+    def assess(self, source_ip: str, user: str, epoch: int, failed: bool) -> Tuple[int, int, str]:
+        """
+        Record the attempt if it failed, then return the failed attempts,
+        distinct users and verdict for source_ip in the window around epoch.
+        """
+        if failed:
+            self.record_failure(source_ip, user, epoch)
+        failed_attempts, distinct_users = self.counts(source_ip, epoch)
+        return failed_attempts, distinct_users, self.verdict(failed_attempts, distinct_users)
+
+    def clear(self) -> None:
+        self._bucket_ids.fill(-1)
+        self._failures.fill(0)
+        self._users.fill(0)
+        self._columns.clear()
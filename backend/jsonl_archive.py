@@ -0,0 +1,406 @@
+# jsonl_archive.py
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from operator import itemgetter
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from backend.log_entry import LogEntry
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard library serializer is used instead
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: closed segments are gzipped instead
+    zstandard = None
+
+SEGMENT_SUFFIX = '.jsonl'
+DAY_FORMAT = '%Y-%m-%d'
+COMPRESSED_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def dumps_line(record: Dict[str, Any]) -> bytes:
+    """One compact JSON line, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(record) + b'\n'
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def loads_line(line: bytes) -> Any:
+    """Parse one JSON line, with orjson when it is installed."""
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def is_compressed(path: str) -> bool:
+    """Whether a segment is a compressed, closed one."""
+    return path.endswith(tuple(COMPRESSED_SUFFIXES.values()))
+
+
+def open_segment(path: str) -> BinaryIO:
+    """Open a segment for reading, decompressing gzip and zstd segments as a stream."""
+    if path.endswith(COMPRESSED_SUFFIXES['gzip']):
+        return gzip.open(path, 'rb')
+    if path.endswith(COMPRESSED_SUFFIXES['zstd']):
+        if zstandard is None:
+            raise ImportError(f"zstandard is required to read {path}: pip install zstandard")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True))
+    return open(path, 'rb')
+
+
+def open_listed_segment(path: str) -> Tuple[str, BinaryIO]:
+    """
+    Open a segment listed earlier, or its compressed copy if it was compressed since.
+
+    Compression removes the original once its copy is in place, so a reader
+    that listed the original can find it gone by the time it opens it.
+
+    Returns:
+        The path opened and the open segment
+    """
+    try:
+        return path, open_segment(path)
+    except FileNotFoundError:
+        if is_compressed(path):
+            raise
+        for suffix in COMPRESSED_SUFFIXES.values():
+            try:
+                return path + suffix, open_segment(path + suffix)
+            except FileNotFoundError:
+                continue
+        raise
+
+
+def compress_segment(path: str, compression: str) -> str:
+    """
+    Compress a closed segment next to itself, then remove the original.
+
+    The compressed file is written under a temporary name and renamed into
+    place once synced, so readers see either segment whole. If the original
+    cannot be removed yet (e.g. a reader has it open on Windows), both are
+    left and readers use the original until a later rotation removes it.
+
+    Returns:
+        Path of the compressed segment
+    """
+    target = path + COMPRESSED_SUFFIXES[compression]
+    tmp_path = f"{target}.tmp"
+    with open(path, 'rb') as src, open(tmp_path, 'wb') as raw:
+        if compression == 'zstd':
+            with zstandard.ZstdCompressor().stream_writer(raw, closefd=False) as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+        else:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp_path, target)
+    _remove(path)
+    return target
+
+
+class SegmentCompressor:
+    """Background thread compressing closed segments, shared by every archive."""
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, path: str, compression: str) -> None:
+        """Queue a segment, unless it is already queued."""
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='segment-compressor', daemon=True)
+                self._thread.start()
+        self._queue.put((path, compression))
+
+    def join(self) -> None:
+        """Wait until every queued segment has been compressed."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            path, compression = self._queue.get()
+            try:
+                if os.path.exists(path):
+                    compress_segment(path, compression)
+            except Exception as e:
+                logging.error(f"Failed to compress archive segment {path}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(path)
+                self._queue.task_done()
+
+
+compressor = SegmentCompressor()
+
+
+@dataclass
+class RotationPolicy:
+    """
+    When segments roll over, how closed segments are compressed and how long they are kept.
+
+    Attributes:
+        max_segment_bytes: A day's segment rolls over to a new part once it reaches this size
+        compression: 'gzip', 'zstd' or None to leave closed segments uncompressed
+        retention_days: Delete segments of days older than this many days
+        max_archive_bytes: Delete the oldest segments while the archive is larger than this
+    """
+    max_segment_bytes: int = 64 * 1024 * 1024
+    compression: Optional[str] = 'gzip'
+    retention_days: Optional[int] = None
+    max_archive_bytes: Optional[int] = None
+
+
+class Segment(NamedTuple):
+    day: str
+    part: int
+    path: str
+
+
+class JsonlArchive:
+    """
+    Append-only archive of log entries as JSON Lines, one segment file per UTC day.
+
+    Each run appends its entries instead of rewriting an export, so earlier
+    runs are kept and a write costs only the new entries. Segments are named
+    <prefix>-YYYY-MM-DD.jsonl after the day of the events they hold, and each
+    batch is written oldest event first, so a segment is in time order as
+    long as every run appends events newer than the last (as bookmarks
+    ensure) and can be read backwards from its end for the latest events. Every
+    append is one buffered write per segment followed by an fsync, so a batch
+    is either on disk or, after a crash, at worst a truncated last line that
+    readers skip.
+
+    Only the last segment of the newest day is written to. A segment that
+    reaches the policy's size limit rolls over to <prefix>-YYYY-MM-DD.N.jsonl,
+    and late events for an earlier day start a new part of that day. Every
+    other segment is closed: it is compressed in the background and removed
+    once the retention limits pass it. Readers decompress transparently.
+    """
+
+    def __init__(self, directory: str, prefix: str, policy: Optional[RotationPolicy] = None):
+        """
+        Args:
+            directory: Directory holding the segments; created on first append
+            prefix: Segment name prefix, e.g. 'session_logons'
+            policy: Rotation, compression and retention; defaults to RotationPolicy()
+        """
+        self.directory = directory
+        self.prefix = prefix
+        self.policy = policy or RotationPolicy()
+        if self.policy.compression == 'zstd' and zstandard is None:
+            logging.warning("zstandard is not installed, compressing archive segments with gzip")
+            self.policy.compression = 'gzip'
+        suffixes = '|'.join(re.escape(suffix) for suffix in COMPRESSED_SUFFIXES.values())
+        self._pattern = re.compile(
+            rf"^{re.escape(prefix)}-(\d{{4}}-\d{{2}}-\d{{2}})(?:\.(\d+))?{re.escape(SEGMENT_SUFFIX)}(?:{suffixes})?$"
+        )
+
+    def segment_path(self, day: str, part: int = 0) -> str:
+        """Path of the uncompressed segment for a part of a YYYY-MM-DD day."""
+        name = f"{self.prefix}-{day}" if part == 0 else f"{self.prefix}-{day}.{part}"
+        return os.path.join(self.directory, f"{name}{SEGMENT_SUFFIX}")
+
+    def _list(self) -> List[Segment]:
+        """Every segment in (day, part) order; an uncompressed segment wins over its compressed copy."""
+        if not os.path.isdir(self.directory):
+            return []
+        found: Dict[tuple, str] = {}
+        for name in os.listdir(self.directory):
+            match = self._pattern.match(name)
+            if not match:
+                continue
+            key = (match.group(1), int(match.group(2) or 0))
+            if key not in found or is_compressed(found[key]):
+                found[key] = os.path.join(self.directory, name)
+        return [Segment(day, part, found[(day, part)]) for day, part in sorted(found)]
+
+    def segments(self, start_day: Optional[str] = None, end_day: Optional[str] = None) -> List[str]:
+        """Segment paths in day order, optionally limited to days within [start_day, end_day]."""
+        return [
+            segment.path for segment in self._list()
+            if (start_day is None or segment.day >= start_day) and (end_day is None or segment.day <= end_day)
+        ]
+
+    def _writable_path(self, day: str, newest_day: str, by_day: Dict[str, List[Segment]]) -> str:
+        parts = by_day.get(day)
+        if not parts:
+            return self.segment_path(day)
+        last = parts[-1]
+        # A segment queued for compression is never written to again; one that was
+        # compressed since it was listed is gone, and counts as full
+        if day == newest_day and not is_compressed(last.path) and _size(last.path, full=True) < self.policy.max_segment_bytes:
+            return last.path
+        return self.segment_path(day, last.part + 1)
+
+    def append(self, entries: Iterable[Union[LogEntry, Dict[str, Any]]]) -> List[str]:
+        """
+        Append entries to the segments of their days, then rotate.
+
+        Args:
+            entries: LogEntry records, or dicts in LogEntry.to_dict form
+
+        Returns:
+            The paths of the segments written, in day order
+        """
+        records = [entry.to_dict() if isinstance(entry, LogEntry) else entry for entry in entries]
+        lines: Dict[str, List[bytes]] = defaultdict(list)
+        # Collection order is newest first; a stable sort keeps ties in that order
+        for record in sorted(records, key=itemgetter('epoch')):
+            day = time.strftime(DAY_FORMAT, time.gmtime(record['epoch']))
+            lines[day].append(dumps_line(record))
+        if not lines:
+            return []
+
+        os.makedirs(self.directory, exist_ok=True)
+        by_day: Dict[str, List[Segment]] = defaultdict(list)
+        for segment in self._list():
+            by_day[segment.day].append(segment)
+        newest_day = max([*by_day, *lines])
+
+        written = []
+        for day in sorted(lines):
+            path = self._writable_path(day, newest_day, by_day)
+            try:
+                with open(path, 'ab') as f:
+                    if f.tell() and not _ends_with_newline(path):
+                        # Terminate a line left truncated by a crash, so it costs only itself
+                        f.write(b'\n')
+                    f.write(b''.join(lines[day]))
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                logging.error(f"Failed to append to archive segment {path}: {e}")
+                raise
+            written.append(path)
+        logging.info(f"Archived {sum(len(day_lines) for day_lines in lines.values())} entries to {len(written)} segments")
+
+        self.rotate()
+        return written
+
+    def rotate(self, now: Optional[float] = None) -> None:
+        """
+        Queue closed segments for compression and delete those past the retention limits.
+
+        Args:
+            now: Epoch retention is measured from; defaults to the current time
+        """
+        segments = self._list()
+        if not segments:
+            return
+        active = segments[-1]
+
+        for segment in segments:
+            if is_compressed(segment.path):
+                continue
+            compressed = [segment.path + suffix for suffix in COMPRESSED_SUFFIXES.values()]
+            if any(os.path.exists(path) for path in compressed):
+                # Left over by a compression that could not remove the original
+                _remove(segment.path)
+            elif self.policy.compression and (
+                    segment != active or os.path.getsize(segment.path) >= self.policy.max_segment_bytes
+            ):
+                compressor.submit(segment.path, self.policy.compression)
+
+        self._apply_retention(segments, now)
+
+    def _apply_retention(self, segments: List[Segment], now: Optional[float]) -> None:
+        expired = []
+        kept = segments[:-1]
+        if self.policy.retention_days is not None:
+            now = time.time() if now is None else now
+            first_day = time.strftime(DAY_FORMAT, time.gmtime(now - self.policy.retention_days * 86400))
+            expired = [segment for segment in kept if segment.day < first_day]
+            kept = kept[len(expired):]
+        if self.policy.max_archive_bytes is not None:
+            total = sum(_size(segment.path) for segment in segments[len(expired):])
+            while kept and total > self.policy.max_archive_bytes:
+                total -= _size(kept[0].path)
+                expired.append(kept.pop(0))
+
+        for segment in expired:
+            for path in [segment.path, *(segment.path + suffix for suffix in COMPRESSED_SUFFIXES.values())]:
+                _remove(path)
+        if expired:
+            logging.info(f"Removed {len(expired)} archive segments past retention")
+
+    def close(self) -> None:
+        """Wait for queued segments to finish compressing."""
+        compressor.join()
+
+    def iter_records(self, start_day: Optional[str] = None, end_day: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """Stream the records of the selected segments, oldest segment first."""
+        for path in self.segments(start_day, end_day):
+            yield from iter_records(path)
+
+
+def _size(path: str, full: bool = False) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return sys.maxsize if full else 0
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.warning(f"Could not remove archive segment {path}: {e}")
+
+
+def iter_records(paths: Union[str, Sequence[str]]) -> Iterator[Dict[str, Any]]:
+    """
+    Stream records from JSON Lines segments, line by line.
+
+    Compressed segments are decompressed as they are read. A plain JSON
+    array file (the old save_to_json export) is also accepted, but is loaded
+    whole. Malformed lines, e.g. a last line truncated by a crash, are logged
+    and skipped.
+    """
+    for listed in [paths] if isinstance(paths, str) else paths:
+        path, f = open_listed_segment(listed)
+        with f:
+            if not is_compressed(path):
+                first = f.read(1)
+                while first and first.isspace():
+                    first = f.read(1)
+                f.seek(0)
+
+                if first == b'[':
+                    yield from json.load(f)
+                    continue
+
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield loads_line(line)
+                except ValueError as e:
+                    logging.warning(f"Skipping malformed line {line_number} in {path}: {e}")
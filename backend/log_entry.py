@@ -0,0 +1,91 @@
+# log_entry.py
+from dataclasses import dataclass, field, fields
+from operator import attrgetter
+from typing import Any, Dict, Optional, Tuple
+
+from backend.timeUtils import format_timestamp
+
+
+@dataclass(slots=True)
+class LogEntry:
+    """
+    One enriched session event.
+
+    Slotted so a backfill of millions of events does not pay for a per-event
+    dict; fields that are usually empty share the interned '' default.
+    """
+    epoch: int
+    event_id: int = 0
+    event_task_category: int = 0
+    record_number: int = 0
+    host: str = ''
+    event_type: str = ''
+    user: str = ''
+    domain: str = ''
+    user_sid: str = ''
+    logon_id: str = ''
+    session_duration: Optional[float] = 0
+    status: str = 'success'
+    logon_type: str = ''
+    source_ip: str = ''
+    workstation_name: str = ''
+    failure_reason: str = ''
+    auth_package: str = ''
+    elevated_token: bool = False
+    day_of_week: str = ''
+    hour_of_day: int = 0
+    is_business_hours: bool = False
+    is_rapid_login: bool = False
+    risk_score: int = 0
+    risk_factors: Tuple[str, ...] = field(default=())
+    ip_failed_attempts: int = 0
+    ip_distinct_users: int = 0
+    ip_verdict: str = ''
+    behavior_rarity: float = 0.0
+
+    @property
+    def timestamp(self) -> str:
+        """Exported timestamp string, rendered on demand from the epoch."""
+        return format_timestamp(self.epoch)
+
+    def __reduce__(self):
+        # Pickle as constructor arguments: half the cost and size of the default
+        # slots state, which counts when entries are sent to worker processes
+        return LogEntry, _field_values(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the export representation, with the timestamp rendered as a string."""
+        return {
+            'timestamp': format_timestamp(self.epoch),
+            'epoch': self.epoch,
+            'event_type': self.event_type,
+            'user': self.user,
+            'domain': self.domain,
+            'user_sid': self.user_sid,
+            'logon_id': self.logon_id,
+            'session_duration': self.session_duration,
+            'status': self.status,
+            'logon_type': self.logon_type,
+            'source_ip': self.source_ip,
+            'workstation_name': self.workstation_name,
+            'failure_reason': self.failure_reason,
+            'auth_package': self.auth_package,
+            'risk_score': self.risk_score,
+            'risk_factors': list(self.risk_factors),
+            'day_of_week': self.day_of_week,
+            'hour_of_day': self.hour_of_day,
+            'is_business_hours': self.is_business_hours,
+            'event_id': self.event_id,
+            'event_task_category': self.event_task_category,
+            'elevated_token': self.elevated_token,
+            'is_rapid_login': self.is_rapid_login,
+            'ip_failed_attempts': self.ip_failed_attempts,
+            'ip_distinct_users': self.ip_distinct_users,
+            'ip_verdict': self.ip_verdict,
+            'behavior_rarity': self.behavior_rarity,
+            'record_number': self.record_number,
+            'host': self.host,
+        }
+
+
+_field_values = attrgetter(*(f.name for f in fields(LogEntry)))
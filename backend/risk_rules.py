@@ -0,0 +1,320 @@
+# risk_rules.py
+import json
+import logging
+import operator
+import os
+from dataclasses import dataclass, fields as dataclass_fields
+from typing import Any, Callable, Dict, FrozenSet, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from backend.log_entry import LogEntry
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'risk_rules.json')
+RULES_VERSION = 1
+
+# Matched rules are reported as a bitmask, one bit per rule
+MAX_RULES = 63
+
+ENTRY_FIELDS = frozenset(field.name for field in dataclass_fields(LogEntry))
+
+# Modification time (ns) of each rules file whose last reload failed, or None if it was missing
+_failed_mtimes: Dict[str, Optional[int]] = {}
+
+_COMPARISONS = {
+    'eq': operator.eq,
+    'ne': operator.ne,
+    'lt': operator.lt,
+    'le': operator.le,
+    'gt': operator.gt,
+    'ge': operator.ge,
+}
+
+Predicate = Callable[[LogEntry], bool]
+VectorPredicate = Callable[[Mapping[str, np.ndarray]], np.ndarray]
+
+
+class RuleConfigError(ValueError):
+    """Raised when a rules file cannot be compiled."""
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    name: str
+    weight: int
+    bit: int
+    predicate: Predicate
+    vector_predicate: VectorPredicate
+    fields: FrozenSet[str]
+
+
+def compile_condition(spec: Any, rule: str) -> Tuple[Predicate, VectorPredicate, FrozenSet[str]]:
+    """
+    Compile a condition into a per-entry closure and a column-wise equivalent.
+
+    A condition is either a combinator, {"all": [...]}, {"any": [...]} or
+    {"not": {...}}, or a test on one LogEntry field: {"field": name, op: value}
+    where op is eq, ne, lt, le, gt, ge, in or not_in.
+
+    Returns:
+        The entry predicate, the vector predicate and the fields it reads
+    """
+    if not isinstance(spec, dict):
+        raise RuleConfigError(f"Rule {rule}: condition must be an object, got {spec!r}")
+
+    if 'all' in spec or 'any' in spec:
+        combinator = 'all' if 'all' in spec else 'any'
+        parts = spec[combinator]
+        if not isinstance(parts, list) or not parts:
+            raise RuleConfigError(f"Rule {rule}: '{combinator}' needs a non-empty list of conditions")
+        compiled = [compile_condition(part, rule) for part in parts]
+        predicates = tuple(c[0] for c in compiled)
+        vectors = tuple(c[1] for c in compiled)
+        fields = frozenset().union(*(c[2] for c in compiled))
+        if combinator == 'all':
+            return (
+                lambda entry: all(p(entry) for p in predicates),
+                lambda columns: np.logical_and.reduce([v(columns) for v in vectors]),
+                fields,
+            )
+        return (
+            lambda entry: any(p(entry) for p in predicates),
+            lambda columns: np.logical_or.reduce([v(columns) for v in vectors]),
+            fields,
+        )
+
+    if 'not' in spec:
+        predicate, vector, fields = compile_condition(spec['not'], rule)
+        return (lambda entry: not predicate(entry)), (lambda columns: ~vector(columns)), fields
+
+    field = spec.get('field')
+    if field not in ENTRY_FIELDS:
+        raise RuleConfigError(f"Rule {rule}: unknown field {field!r}")
+    ops = [key for key in spec if key != 'field']
+    if len(ops) != 1:
+        raise RuleConfigError(f"Rule {rule}: condition on {field} needs exactly one operator")
+    op, value = ops[0], spec[ops[0]]
+
+    if op in ('in', 'not_in'):
+        if not isinstance(value, list):
+            raise RuleConfigError(f"Rule {rule}: '{op}' needs a list of values")
+        values = frozenset(value)
+        if op == 'in':
+            return (
+                lambda entry: getattr(entry, field) in values,
+                lambda columns: pd.Series(columns[field]).isin(value).to_numpy(),
+                frozenset((field,)),
+            )
+        return (
+            lambda entry: getattr(entry, field) not in values,
+            lambda columns: ~pd.Series(columns[field]).isin(value).to_numpy(),
+            frozenset((field,)),
+        )
+
+    compare = _COMPARISONS.get(op)
+    if compare is None:
+        raise RuleConfigError(f"Rule {rule}: unknown operator {op!r}")
+    return (
+        lambda entry: compare(getattr(entry, field), value),
+        lambda columns: np.asarray(compare(columns[field], value), dtype=bool),
+        frozenset((field,)),
+    )
+
+
+class RuleSet:
+    """
+    Compiled risk rules together with the windows and thresholds they use.
+
+    Instances are never modified after construction, so a reload can build a
+    new RuleSet and swap the reference in one assignment.
+    """
+
+    def __init__(
+            self,
+            rules: Sequence[CompiledRule],
+            business_hours: Tuple[int, int] = (9, 18),
+            rapid_login_window: int = 60,
+            rapid_login_threshold: int = 2,
+            thresholds: Optional[Mapping[str, float]] = None,
+            path: Optional[str] = None,
+            mtime: Optional[int] = None
+    ):
+        """
+        Args:
+            rules: Compiled rules, in evaluation order
+            business_hours: Start and end of business hours (24-hour format)
+            rapid_login_window: Seconds around a logon in which earlier attempts count as rapid
+            rapid_login_threshold: Number of earlier attempts within the window that makes a logon rapid
+            thresholds: Minimum score per risk level
+            path: Rules file the set was loaded from, for reloads
+            mtime: Modification time (ns) of the rules file when it was loaded
+        """
+        if not (0 <= business_hours[0] < 24 and 0 <= business_hours[1] < 24):
+            raise ValueError("Business hours must be between 0 and 23")
+        if business_hours[0] >= business_hours[1]:
+            raise ValueError("Start time must be before end time")
+        if rapid_login_window <= 0:
+            raise ValueError("Rapid login window must be positive")
+        if rapid_login_threshold < 1:
+            raise ValueError("Rapid login threshold must be at least 1")
+        if len(rules) > MAX_RULES:
+            raise RuleConfigError(f"At most {MAX_RULES} rules are supported")
+
+        self.rules = tuple(rules)
+        self.business_hours = (int(business_hours[0]), int(business_hours[1]))
+        self.rapid_login_window = int(rapid_login_window)
+        self.rapid_login_threshold = int(rapid_login_threshold)
+        self.thresholds = dict(thresholds or {})
+        self.path = path
+        self.mtime = mtime
+
+        self.factor_names = tuple(rule.name for rule in self.rules)
+        self.fields = frozenset().union(*(rule.fields for rule in self.rules))
+        self._levels = sorted(((score, level) for level, score in self.thresholds.items()), reverse=True)
+        self._score_dtype = np.int64 if all(isinstance(r.weight, int) for r in self.rules) else np.float64
+        self._factors_by_mask: Dict[int, Tuple[str, ...]] = {}
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any], path: Optional[str] = None, mtime: Optional[int] = None) -> 'RuleSet':
+        """Compile a parsed rules file."""
+        if data.get('version', RULES_VERSION) != RULES_VERSION:
+            raise RuleConfigError(f"Unsupported rules version {data.get('version')}")
+
+        compiled = []
+        names = set()
+        for spec in data.get('rules', []):
+            name = spec.get('name')
+            if not name or name in names:
+                raise RuleConfigError(f"Rules need unique names, got {name!r}")
+            names.add(name)
+            if not spec.get('enabled', True):
+                continue
+            weight = spec.get('weight', 0)
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+                raise RuleConfigError(f"Rule {name}: weight must be a number")
+            predicate, vector, fields = compile_condition(spec.get('when'), name)
+            compiled.append(CompiledRule(name, weight, 1 << len(compiled), predicate, vector, fields))
+
+        rapid = data.get('windows', {}).get('rapid_login', {})
+        return cls(
+            compiled,
+            business_hours=tuple(data.get('business_hours', (9, 18))),
+            rapid_login_window=rapid.get('seconds', 60),
+            rapid_login_threshold=rapid.get('threshold', 2),
+            thresholds=data.get('thresholds'),
+            path=path,
+            mtime=mtime,
+        )
+
+    def with_windows(
+            self,
+            business_hours: Optional[Tuple[int, int]] = None,
+            rapid_login_window: Optional[int] = None,
+            rapid_login_threshold: Optional[int] = None
+    ) -> 'RuleSet':
+        """Return a copy with the given windows overridden."""
+        return RuleSet(
+            self.rules,
+            business_hours=business_hours if business_hours is not None else self.business_hours,
+            rapid_login_window=rapid_login_window if rapid_login_window is not None else self.rapid_login_window,
+            rapid_login_threshold=(
+                rapid_login_threshold if rapid_login_threshold is not None else self.rapid_login_threshold
+            ),
+            thresholds=self.thresholds,
+            path=self.path,
+            mtime=self.mtime,
+        )
+
+    def evaluate(self, entry: LogEntry) -> Tuple[Tuple[str, ...], int]:
+        """Return the names of the matching rules and the summed weight for one entry."""
+        factors = []
+        score = 0
+        for rule in self.rules:
+            if rule.predicate(entry):
+                factors.append(rule.name)
+                score += rule.weight
+        return tuple(factors), score
+
+    def evaluate_columns(self, columns: Mapping[str, np.ndarray], n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Evaluate every rule over a column-oriented batch.
+
+        Args:
+            columns: Array per LogEntry field the rules read
+            n: Number of rows
+
+        Returns:
+            The matched-rule bitmask and the score per row
+        """
+        missing = self.fields.difference(columns)
+        if missing:
+            raise ValueError(f"Batch is missing columns used by the risk rules: {sorted(missing)}")
+
+        mask = np.zeros(n, dtype=np.int64)
+        score = np.zeros(n, dtype=self._score_dtype)
+        for rule in self.rules:
+            matched = rule.vector_predicate(columns)
+            mask |= matched * rule.bit
+            score += matched * rule.weight
+        return mask, score
+
+    def decode(self, mask: int) -> Tuple[str, ...]:
+        """Return the names of the rules set in a bitmask."""
+        factors = self._factors_by_mask.get(mask)
+        if factors is None:
+            factors = tuple(rule.name for rule in self.rules if mask & rule.bit)
+            self._factors_by_mask[mask] = factors
+        return factors
+
+    def classify(self, score: float) -> str:
+        """Return the highest risk level whose threshold the score reaches, or '' if none."""
+        for minimum, level in self._levels:
+            if score >= minimum:
+                return level
+        return ''
+
+
+def load_rules(path: str = DEFAULT_RULES_PATH) -> RuleSet:
+    """Load and compile a rules file."""
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return RuleSet.from_dict(data, path=path, mtime=mtime)
+
+
+def reload_if_changed(rules: RuleSet) -> Optional[RuleSet]:
+    """
+    Recompile the rules file a RuleSet came from if it changed on disk.
+
+    A file that fails to compile is reported once and then skipped until it
+    changes again.
+
+    Returns:
+        The new RuleSet, or None if the file is unchanged or could not be compiled
+        (the caller keeps using the current rules)
+    """
+    if rules.path is None:
+        return None
+    try:
+        mtime = os.stat(rules.path).st_mtime_ns
+    except OSError:
+        # A missing file is reported once, like a broken one
+        mtime = None
+    if mtime == rules.mtime or (rules.path in _failed_mtimes and _failed_mtimes[rules.path] == mtime):
+        return None
+    try:
+        reloaded = load_rules(rules.path)
+    except (OSError, ValueError) as e:
+        _failed_mtimes[rules.path] = mtime
+        logging.error(f"Keeping current risk rules, failed to reload {rules.path}: {e}")
+        return None
+    _failed_mtimes.pop(rules.path, None)
+    logging.info(f"Reloaded {len(reloaded.rules)} risk rules from {rules.path}")
+    return reloaded
+
+
+def reject_reload(rules: RuleSet) -> None:
+    """Skip a reloaded RuleSet's file until it changes again, e.g. when the caller could not use it."""
+    if rules.path is not None:
+        _failed_mtimes[rules.path] = rules.mtime
@@ -0,0 +1,108 @@
+# run_spool.py
+import heapq
+import os
+import tempfile
+from bisect import insort
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from backend.jsonl_archive import dumps_line, loads_line
+
+DEFAULT_SLICE_SIZE = 10000
+
+
+class _Chunk(NamedTuple):
+    first_epoch: int
+    offset: int
+    length: int
+
+
+class RunSpool:
+    """
+    The enriched records of one collection run, spilled to a temporary file as they arrive.
+
+    A run is read newest first, but the archive has to be appended oldest
+    first for backward reads of it to stop early, and the feature tables need
+    every record of the run. Each batch is written as one chunk sorted by
+    epoch, so holding a run costs disk rather than memory, and reading it back
+    merges the chunks into one ascending stream holding only the records of
+    chunks that overlap in time. Records with the same epoch come back in
+    the order they were collected in, as the archive stores them.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Args:
+            directory: Where to create the temporary file, on the first add; defaults
+                to the system temp directory
+        """
+        self.directory = directory
+        self.path: Optional[str] = None
+        self._file = None
+        self._chunks: List[_Chunk] = []
+        self._records = 0
+
+    def __len__(self) -> int:
+        return self._records
+
+    def add(self, records: Iterable[Tuple[int, Dict[str, Any]]]) -> None:
+        """
+        Spill one batch of records.
+
+        Args:
+            records: (collection order, record) pairs, the records in LogEntry.to_dict form
+        """
+        records = sorted(records, key=lambda item: (item[1]['epoch'], item[0]))
+        if not records:
+            return
+        if self._file is None:
+            fd, self.path = tempfile.mkstemp(prefix='run-', suffix='.jsonl', dir=self.directory)
+            self._file = os.fdopen(fd, 'wb')
+        data = b''.join(dumps_line([order, record]) for order, record in records)
+        offset = self._file.tell()
+        self._file.write(data)
+        insort(self._chunks, _Chunk(records[0][1]['epoch'], offset, len(data)))
+        self._records += len(records)
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every record spilled so far, oldest first.
+
+        Safe to call from several threads at once: each call reads through its own handle.
+        """
+        if self._file is None:
+            return
+        self._file.flush()
+        pending: List[Tuple[int, int, Dict[str, Any]]] = []
+        with open(self.path, 'rb') as f:
+            for chunk in self._chunks:
+                # Nothing in this or a later chunk is older than its first epoch
+                while pending and pending[0][0] < chunk.first_epoch:
+                    yield heapq.heappop(pending)[2]
+                f.seek(chunk.offset)
+                for line in f.read(chunk.length).splitlines():
+                    order, record = loads_line(line)
+                    heapq.heappush(pending, (record['epoch'], order, record))
+        while pending:
+            yield heapq.heappop(pending)[2]
+
+    def iter_slices(self, size: int = DEFAULT_SLICE_SIZE) -> Iterator[List[Dict[str, Any]]]:
+        """The records of iter_records in lists of at most size, for sinks that write in bulk."""
+        batch = []
+        for record in self.iter_records():
+            batch.append(record)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self) -> None:
+        """Delete the temporary file; the spool is empty again afterwards."""
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self.path, self._file = None, None
+        self._chunks, self._records = [], 0
@@ -0,0 +1,155 @@
+# session_tracker.py
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from backend.log_entry import LogEntry
+
+DEFAULT_SESSION_TTL = 7 * 24 * 3600
+DEFAULT_MAX_OPEN = 100000
+
+SessionKey = Tuple[str, str]
+
+
+@dataclass(slots=True)
+class CompletedSession:
+    """A logon paired with its logoff."""
+    host: str
+    logon_id: str
+    user: str
+    logon_epoch: int
+    logoff_epoch: int
+
+    @property
+    def duration(self) -> float:
+        return float(self.logoff_epoch - self.logon_epoch)
+
+
+class SessionTracker:
+    """
+    Pairs 4624 logons with 4634 logoffs by (host, logon_id) in a single pass.
+
+    Events may arrive oldest-first (file order) or newest-first (backward
+    reads of the live log). A logon waits for its logoff, and a logoff seen
+    before its logon waits for the logon; whichever arrives second completes
+    the session, sets session_duration on both entries and queues a
+    CompletedSession. Unmatched entries expire once they are more than
+    ttl_seconds of event time away from the newest event processed, or when
+    more than max_open are waiting.
+    """
+
+    def __init__(self, ttl_seconds: int = DEFAULT_SESSION_TTL, max_open: int = DEFAULT_MAX_OPEN):
+        """
+        Args:
+            ttl_seconds: Event-time age after which an unmatched logon or logoff is dropped
+            max_open: Maximum unmatched logons and logoffs kept, each
+        """
+        if ttl_seconds <= 0 or max_open < 1:
+            raise ValueError("Session limits must be positive")
+        self.ttl_seconds = ttl_seconds
+        self.max_open = max_open
+
+        # Insertion order follows event order, so the stalest entries are at the front
+        self.open_logons: 'OrderedDict[SessionKey, LogEntry]' = OrderedDict()
+        self.pending_logoffs: 'OrderedDict[SessionKey, LogEntry]' = OrderedDict()
+        self._completed: Deque[CompletedSession] = deque()
+        # Called with the logon and logoff entries of each session as it completes
+        self.on_session_completed: Optional[Callable[[LogEntry, LogEntry], None]] = None
+
+        self.sessions_completed = 0
+        self.expired_logons = 0
+        self.expired_logoffs = 0
+
+    @staticmethod
+    def _key(entry: LogEntry) -> SessionKey:
+        return entry.host.lower(), entry.logon_id.lower()
+
+    def on_logon(self, entry: LogEntry) -> Optional[float]:
+        """Track a successful logon; returns the duration if its logoff was already seen."""
+        key = self._key(entry)
+        logoff = self.pending_logoffs.get(key)
+        if logoff is not None and logoff.epoch >= entry.epoch:
+            del self.pending_logoffs[key]
+            return self._complete(entry, logoff)
+
+        self.open_logons.pop(key, None)
+        self.open_logons[key] = entry
+        self._expire(self.open_logons, entry.epoch, 'expired_logons')
+        return None
+
+    def on_logoff(self, entry: LogEntry) -> Optional[float]:
+        """Track a logoff; returns the duration if its logon was already seen."""
+        key = self._key(entry)
+        logon = self.open_logons.get(key)
+        if logon is not None and logon.epoch <= entry.epoch:
+            del self.open_logons[key]
+            return self._complete(logon, entry)
+
+        entry.session_duration = None
+        self.pending_logoffs.pop(key, None)
+        self.pending_logoffs[key] = entry
+        self._expire(self.pending_logoffs, entry.epoch, 'expired_logoffs')
+        return None
+
+    def get_logon_time(self, logon_id: str, host: str = '') -> Optional[int]:
+        """Return the epoch of the open logon with this id, if any."""
+        logon = self.open_logons.get((host.lower(), logon_id.lower()))
+        return logon.epoch if logon is not None else None
+
+    def is_waiting(self, entry: LogEntry) -> bool:
+        """True if this entry is an unmatched logon or logoff still waiting for its partner."""
+        key = self._key(entry)
+        return self.open_logons.get(key) is entry or self.pending_logoffs.get(key) is entry
+
+    def restore_open_logons(self, entries: Iterable[LogEntry]) -> None:
+        """Reinstate saved open logons, oldest first, without pairing or expiry checks."""
+        for entry in entries:
+            self.open_logons[self._key(entry)] = entry
+
+    def drain_completed(self) -> List[CompletedSession]:
+        """Return and forget the sessions completed since the last call, in completion order."""
+        completed = list(self._completed)
+        self._completed.clear()
+        return completed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'open_logons': len(self.open_logons),
+            'pending_logoffs': len(self.pending_logoffs),
+            'sessions_completed': self.sessions_completed,
+            'expired_logons': self.expired_logons,
+            'expired_logoffs': self.expired_logoffs,
+        }
+
+    def clear(self) -> None:
+        self.open_logons.clear()
+        self.pending_logoffs.clear()
+        self._completed.clear()
+
+    def _complete(self, logon: LogEntry, logoff: LogEntry) -> float:
+        session = CompletedSession(
+            host=logoff.host or logon.host,
+            logon_id=logoff.logon_id,
+            user=logoff.user or logon.user,
+            logon_epoch=logon.epoch,
+            logoff_epoch=logoff.epoch,
+        )
+        duration = session.duration
+        logon.session_duration = duration
+        logoff.session_duration = duration
+        self._completed.append(session)
+        self.sessions_completed += 1
+        if self.on_session_completed is not None:
+            self.on_session_completed(logon, logoff)
+        return duration
+
+    def _expire(self, waiting: 'OrderedDict[SessionKey, LogEntry]', now: int, counter: str) -> None:
+        expired = 0
+        while waiting:
+            oldest = next(iter(waiting.values()))
+            if len(waiting) <= self.max_open and abs(now - oldest.epoch) <= self.ttl_seconds:
+                break
+            waiting.popitem(last=False)
+            expired += 1
+        if expired:
+            setattr(self, counter, getattr(self, counter) + expired)
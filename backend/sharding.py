@@ -0,0 +1,512 @@
+# sharding.py
+import heapq
+import logging
+import multiprocessing
+import os
+import zlib
+from collections import OrderedDict
+from contextlib import ExitStack
+from datetime import timedelta
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from backend.bookmarks import BookmarkStore
+from backend.event_logger import (
+    DEFAULT_CLOCK_SKEW, analyzer, calculate_cutoff_time, enrich_event, get_bookmark
+)
+from backend.event_source import EventRecord, EventSource
+from backend.ip_detector import IGNORED_SOURCE_IPS
+from backend.log_entry import LogEntry
+from backend.session_tracker import DEFAULT_MAX_OPEN, DEFAULT_SESSION_TTL, CompletedSession
+from backend.timeUtils import to_epoch
+
+DEFAULT_SHARD_BATCH_SIZE = 2000
+
+# StringInserts index of the target user name, per session event ID (see process_event)
+USER_FIELD = {4624: 5, 4625: 5, 4634: 1}
+
+# An entry as the workers and parent both know it: its source, by index or else by
+# host, and its RecordNumber, which is only unique within one log or file
+EntryKey = Tuple[Union[int, str], int]
+# Worker-side keys of waiting entries are pruned of expired sessions once there are this many
+WAITING_KEYS_PRUNE_SIZE = 1024
+
+
+def shard_for(key: str, shards: int) -> int:
+    """Shard of a user name or source IP; case-insensitive and the same in every process."""
+    return zlib.crc32(key.lower().encode('utf-8')) % shards
+
+
+def needs_source_stage(log_entry: LogEntry) -> bool:
+    """True for assessed entries whose source IP carries detector state."""
+    return log_entry.event_type != 'Logoff' and log_entry.source_ip not in IGNORED_SOURCE_IPS
+
+
+def _portable(event: Any, epoch: int) -> Tuple[Any, ...]:
+    """EventRecord fields of an event, with TimeGenerated already converted to epoch, for a worker."""
+    return (
+        event.EventID,
+        epoch,
+        event.StringInserts,
+        event.EventCategory,
+        getattr(event, 'RecordNumber', 0),
+        getattr(event, 'ComputerName', '') or '',
+    )
+
+
+def _entry_key(source: Optional[int], log_entry: LogEntry) -> EntryKey:
+    return source if source is not None else log_entry.host, log_entry.record_number
+
+
+# Worker side: each process enriches against its own module-level analyzer
+
+# Entries returned while still waiting for their session partner, with their keys,
+# by identity, so a later batch completing the session can name them to the parent
+_waiting_keys: Dict[int, Tuple[LogEntry, EntryKey]] = {}
+_waiting_keys_prune_at = WAITING_KEYS_PRUNE_SIZE
+
+
+def _prune_waiting_keys() -> None:
+    """Forget entries whose sessions expired unpaired, amortised over the entries added."""
+    global _waiting_keys_prune_at
+    if len(_waiting_keys) < _waiting_keys_prune_at:
+        return
+    sessions = analyzer.sessions
+    for expired in [key for key, (log_entry, _) in _waiting_keys.items() if not sessions.is_waiting(log_entry)]:
+        del _waiting_keys[expired]
+    _waiting_keys_prune_at = max(WAITING_KEYS_PRUNE_SIZE, 2 * len(_waiting_keys))
+
+
+def _enrich_users(
+        cutoff_epoch: int,
+        events: List[Tuple[int, Optional[int], Tuple[Any, ...]]]
+) -> Tuple[List[Tuple[int, LogEntry]], List[int], List[Tuple[EntryKey, float]]]:
+    """
+    Enrich a shard's (seq, source index, event fields) events.
+
+    Returns:
+        The (seq, entry) results; the seqs of those still waiting for their
+        session partner; and the durations of entries from earlier batches
+        whose sessions this batch completed, which the parent's copies lack
+    """
+    analyzer.reload_rules()
+    sessions = analyzer.sessions
+    completed: List[LogEntry] = []
+    sessions.on_session_completed = lambda logon, logoff: completed.extend((logon, logoff))
+    results = []
+    sources = []
+    try:
+        for seq, source, fields in events:
+            _, log_entry = enrich_event(EventRecord(*fields), cutoff_epoch, score=False)
+            if log_entry is not None:
+                results.append((seq, log_entry))
+                sources.append(source)
+    finally:
+        sessions.on_session_completed = None
+
+    durations = []
+    for log_entry in completed:
+        # Entries of this batch are returned with their duration already set
+        item = _waiting_keys.pop(id(log_entry), None)
+        if item is not None:
+            durations.append((item[1], log_entry.session_duration))
+
+    waiting = []
+    for (seq, log_entry), source in zip(results, sources):
+        if sessions.is_waiting(log_entry):
+            waiting.append(seq)
+            _waiting_keys[id(log_entry)] = (log_entry, _entry_key(source, log_entry))
+    _prune_waiting_keys()
+    return results, waiting, durations
+
+
+def _assess_sources(attempts: List[Tuple[str, str, int, bool]]) -> List[Tuple[int, int, str]]:
+    assess = analyzer.ip_detector.assess
+    return [assess(*attempt) for attempt in attempts]
+
+
+def _drain_completed() -> List[CompletedSession]:
+    return analyzer.sessions.drain_completed()
+
+
+def _commit_baselines() -> int:
+    return analyzer.baselines.commit()
+
+
+def _discard_baselines() -> None:
+    analyzer.baselines.discard()
+
+
+def _shard_stats() -> Dict[str, Dict[str, int]]:
+    return {'session_history': analyzer.session_history.stats(), 'sessions': analyzer.sessions.stats()}
+
+
+_HANDLERS = {
+    'users': _enrich_users,
+    'sources': _assess_sources,
+    'drain': _drain_completed,
+    'commit': _commit_baselines,
+    'discard': _discard_baselines,
+    'stats': _shard_stats,
+}
+
+
+def _worker_main(conn: Any) -> None:
+    """Serve requests from the parent until told to stop or the pipe closes."""
+    while True:
+        try:
+            command, args = conn.recv()
+        except EOFError:
+            return
+        if command == 'stop':
+            conn.close()
+            return
+        try:
+            conn.send((True, _HANDLERS[command](*args)))
+        except Exception as e:
+            logging.error(f"Error in shard worker {os.getpid()} handling {command}: {e}")
+            conn.send((False, str(e)))
+
+
+class ShardedAnalyzer:
+    """
+    Session enrichment spread over worker processes, each owning a slice of
+    the analyzer state.
+
+    Events are hash-partitioned by user, so each user's rapid-login window,
+    history, open sessions and baseline live in exactly one worker and see
+    that user's events in the same order a single analyzer would. Source IP
+    verdicts are a second pass partitioned by source IP, so each address's
+    detector window also lives in one worker. Results are merged back into
+    input order, which is time order, and the risk rules are evaluated in the
+    calling process.
+
+    A session completed by a later batch than one of its entries sets the
+    duration on the worker's copy, so the workers also report those
+    durations and the parent applies them to the entries it returned earlier,
+    as the single-process tracker does by updating the same object. The
+    parent keeps the entries still waiting for their partner for this, within
+    the same TTL and size limits as the workers' trackers.
+
+    Workers start with empty state; StateSnapshot only covers the in-process
+    analyzer.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        """
+        Args:
+            workers: Number of worker processes; defaults to the CPU count
+        """
+        self.workers = workers or os.cpu_count() or 1
+        if self.workers < 1:
+            raise ValueError("Workers must be at least 1")
+        self._processes: List[Any] = []
+        self._connections: List[Any] = []
+        # Returned entries whose session may still be completed by a later batch, in arrival order,
+        # and their keys by identity
+        self._waiting: 'OrderedDict[EntryKey, LogEntry]' = OrderedDict()
+        self._waiting_keys: Dict[int, EntryKey] = {}
+        self.max_waiting = 2 * DEFAULT_MAX_OPEN * self.workers
+
+    def start(self) -> None:
+        """Start the workers; called on first use."""
+        if self._processes:
+            return
+        # Spawn everywhere, as on Windows, so no worker inherits the parent's analyzer state
+        context = multiprocessing.get_context('spawn')
+        for _ in range(self.workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._connections.append(parent_conn)
+
+    def close(self) -> None:
+        """Stop the workers; their state is discarded."""
+        for conn in self._connections:
+            try:
+                conn.send(('stop', ()))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._connections:
+            conn.close()
+        self._processes, self._connections = [], []
+        self._waiting.clear()
+        self._waiting_keys.clear()
+
+    def __enter__(self) -> 'ShardedAnalyzer':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _call(self, requests: Dict[int, Tuple[str, tuple]]) -> Dict[int, Any]:
+        """Send every request before reading any reply, so the shards work in parallel."""
+        for shard, request in requests.items():
+            self._connections[shard].send(request)
+
+        replies, errors = {}, []
+        for shard in requests:
+            ok, result = self._connections[shard].recv()
+            if ok:
+                replies[shard] = result
+            else:
+                errors.append(f"shard {shard}: {result}")
+        if errors:
+            raise RuntimeError(f"Shard workers failed: {'; '.join(errors)}")
+        return replies
+
+    def enrich(
+            self,
+            events: Sequence[Tuple[int, Any]],
+            cutoff_epoch: int = 0,
+            sources: Optional[Sequence[int]] = None
+    ) -> List[LogEntry]:
+        """
+        Enrich a batch of session events.
+
+        Args:
+            events: (epoch, event) pairs in time order; later batches must continue that order
+            cutoff_epoch: Events before this time are skipped
+            sources: Index of the source each event was read from, as RecordNumbers
+                are only unique within a source; entries are told apart by host without them
+
+        Returns:
+            The enriched logons and logoffs, in the order of events
+        """
+        self.start()
+        shards = self.workers
+
+        by_user: List[List[Tuple[int, Tuple[Any, ...]]]] = [[] for _ in range(shards)]
+        for seq, (epoch, event) in enumerate(events):
+            field = USER_FIELD.get(event.EventID)
+            if field is None:
+                continue
+            data = event.StringInserts or []
+            user = data[field] if len(data) > field else ''
+            source = sources[seq] if sources is not None else None
+            by_user[shard_for(user, shards)].append((seq, source, _portable(event, epoch)))
+
+        replies = self._call({
+            shard: ('users', (cutoff_epoch, batch)) for shard, batch in enumerate(by_user) if batch
+        })
+        merged = list(heapq.merge(*(results for results, _, _ in replies.values()), key=itemgetter(0)))
+        entries = [log_entry for _, log_entry in merged]
+        self._track_sessions(
+            merged,
+            sources,
+            (seq for _, waiting, _ in replies.values() for seq in waiting),
+            (item for _, _, durations in replies.values() for item in durations)
+        )
+
+        # Only the detector inputs travel; routed in input order, so each
+        # source shard also sees its attempts in time order
+        routed: List[List[LogEntry]] = [[] for _ in range(shards)]
+        attempts: List[List[Tuple[str, str, int, bool]]] = [[] for _ in range(shards)]
+        for log_entry in entries:
+            if needs_source_stage(log_entry):
+                shard = shard_for(log_entry.source_ip, shards)
+                routed[shard].append(log_entry)
+                attempts[shard].append(
+                    (log_entry.source_ip, log_entry.user, log_entry.epoch, log_entry.status == 'failed')
+                )
+        replies = self._call({
+            shard: ('sources', (batch,)) for shard, batch in enumerate(attempts) if batch
+        })
+        for shard, verdicts in replies.items():
+            for log_entry, (failed_attempts, distinct_users, verdict) in zip(routed[shard], verdicts):
+                log_entry.ip_failed_attempts = failed_attempts
+                log_entry.ip_distinct_users = distinct_users
+                log_entry.ip_verdict = verdict
+
+        # Rules read every feature, so they are evaluated once both stages are done
+        analyzer.reload_rules()
+        rules = analyzer.rules
+        for log_entry in entries:
+            if log_entry.event_type != 'Logoff':
+                log_entry.risk_factors, log_entry.risk_score = rules.evaluate(log_entry)
+        return entries
+
+    def is_waiting(self, log_entry: LogEntry) -> bool:
+        """True if a returned entry may still get its session duration from a later batch."""
+        return id(log_entry) in self._waiting_keys
+
+    def _track_sessions(
+            self,
+            merged: List[Tuple[int, LogEntry]],
+            sources: Optional[Sequence[int]],
+            waiting_seqs: Iterable[int],
+            durations: Iterable[Tuple[EntryKey, float]]
+    ) -> None:
+        """Apply late session durations to earlier entries and remember the entries still waiting."""
+        waiting, keys = self._waiting, self._waiting_keys
+        for key, duration in durations:
+            log_entry = waiting.pop(key, None)
+            if log_entry is not None:
+                del keys[id(log_entry)]
+                log_entry.session_duration = duration
+
+        waiting_seqs = set(waiting_seqs)
+        if not waiting_seqs:
+            return
+        for seq, log_entry in merged:
+            if seq in waiting_seqs:
+                key = _entry_key(sources[seq] if sources is not None else None, log_entry)
+                replaced = waiting.pop(key, None)
+                if replaced is not None:
+                    del keys[id(replaced)]
+                waiting[key] = log_entry
+                keys[id(log_entry)] = key
+
+        # The same expiry as SessionTracker: stalest arrivals first, by event-time distance
+        now = merged[-1][1].epoch
+        while waiting:
+            oldest = next(iter(waiting.values()))
+            if len(waiting) <= self.max_waiting and abs(now - oldest.epoch) <= DEFAULT_SESSION_TTL:
+                break
+            del keys[id(waiting.popitem(last=False)[1])]
+
+    def drain_completed(self) -> List[CompletedSession]:
+        """Collect the sessions every shard paired since the last drain, by logon time."""
+        self.start()
+        replies = self._call({shard: ('drain', ()) for shard in range(self.workers)})
+        sessions = [session for completed in replies.values() for session in completed]
+        sessions.sort(key=lambda session: session.logon_epoch)
+        return sessions
+
+    def commit_baselines(self) -> int:
+        """Have every shard learn the logons its baselines observed since the last commit; returns how many."""
+        self.start()
+        replies = self._call({shard: ('commit', ()) for shard in range(self.workers)})
+        return sum(replies.values())
+
+    def discard_baselines(self) -> None:
+        """Have every shard drop the logons its baselines observed since the last commit."""
+        if self._processes:
+            self._call({shard: ('discard', ()) for shard in range(self.workers)})
+
+    def stats(self) -> List[Dict[str, Dict[str, int]]]:
+        """History and session counters per shard."""
+        self.start()
+        replies = self._call({shard: ('stats', ()) for shard in range(self.workers)})
+        return [replies[shard] for shard in range(self.workers)]
+
+
+def _iter_source(
+        source: EventSource,
+        last_seen: Optional[int],
+        cutoff_epoch: int,
+        stop_before: int,
+        stop_at_cutoff: bool,
+        newest_records: Dict[int, int],
+        index: int
+) -> Iterator[Tuple[int, int, Any]]:
+    """(epoch, index, event) of one source's session events, newest first, stopping like iter_session_events."""
+    for events in source.read_batches():
+        buffer_past_cutoff = True
+        for event in events:
+            if last_seen is not None and event.RecordNumber <= last_seen:
+                return
+            newest_records.setdefault(index, event.RecordNumber)
+            try:
+                epoch = to_epoch(event.TimeGenerated)
+            except ValueError:
+                buffer_past_cutoff = False
+                continue
+            if epoch >= stop_before:
+                buffer_past_cutoff = False
+            if epoch >= cutoff_epoch and event.EventID in USER_FIELD:
+                yield epoch, index, event
+        if stop_at_cutoff and buffer_past_cutoff:
+            return
+
+
+def iter_sharded_session_events(
+        sources: Sequence[EventSource],
+        workers: Optional[int] = None,
+        minutes_back: Optional[int] = None,
+        days_back: Optional[int] = None,
+        bookmarks: Optional[BookmarkStore] = None,
+        stop_at_cutoff: bool = True,
+        clock_skew: timedelta = DEFAULT_CLOCK_SKEW,
+        batch_size: int = DEFAULT_SHARD_BATCH_SIZE,
+        sharded: Optional[ShardedAnalyzer] = None
+) -> Iterator[List[LogEntry]]:
+    """
+    Stream enriched session events from one or more sources through a
+    ShardedAnalyzer, newest first, in batches.
+
+    The sources, e.g. live logs or EVTX archives from several hosts, are
+    merged by event time before enrichment, so per-user and per-IP windows see
+    one time-ordered stream just as a single analyzer reading them would.
+
+    Args:
+        sources: Event sources to read, each newest first
+        workers: Worker processes when sharded is not given; defaults to the CPU count
+        minutes_back: Number of minutes to look back
+        days_back: Number of days to look back
+        bookmarks: Optional store of the last processed RecordNumber per source;
+            advanced only once every source has been fully consumed, as are the
+            workers' behavioral baselines
+        stop_at_cutoff: Stop reading a source after a buffer entirely before the cutoff
+        clock_skew: How far before the cutoff an event must be before it may end a read
+        batch_size: Events sent to the workers at a time
+        sharded: Running ShardedAnalyzer to keep state across calls; one is
+            started and stopped here otherwise
+
+    Yields:
+        Lists of enriched logon and logoff entries
+    """
+    if batch_size < 1:
+        raise ValueError("Batch size must be at least 1")
+    owned = sharded is None
+    if owned:
+        sharded = ShardedAnalyzer(workers)
+
+    try:
+        # Logons of a run that was not read to the end are read again by the next one
+        sharded.discard_baselines()
+        cutoff_epoch = int(calculate_cutoff_time(minutes_back, days_back).timestamp())
+        stop_before = cutoff_epoch - int(clock_skew.total_seconds())
+        newest_records: Dict[int, int] = {}
+
+        with ExitStack() as stack:
+            streams = []
+            for index, source in enumerate(sources):
+                stack.enter_context(source)
+                streams.append(_iter_source(
+                    source, get_bookmark(source, bookmarks), cutoff_epoch, stop_before,
+                    stop_at_cutoff, newest_records, index
+                ))
+
+            batch: List[Tuple[int, Any]] = []
+            batch_sources: List[int] = []
+            for epoch, index, event in heapq.merge(*streams, key=itemgetter(0), reverse=True):
+                batch.append((epoch, event))
+                batch_sources.append(index)
+                if len(batch) >= batch_size:
+                    yield sharded.enrich(batch, cutoff_epoch, batch_sources)
+                    batch, batch_sources = [], []
+            if batch:
+                yield sharded.enrich(batch, cutoff_epoch, batch_sources)
+
+            sharded.commit_baselines()
+            if bookmarks is not None and newest_records:
+                for index, record_number in newest_records.items():
+                    bookmarks.update(sources[index].host, sources[index].channel, record_number)
+                bookmarks.save()
+
+        logging.info(f"Read {len(sources)} sources with {sharded.workers} shard workers")
+
+    except Exception as e:
+        logging.error(f"Error in iter_sharded_session_events: {e}")
+
+    finally:
+        if owned:
+            sharded.close()
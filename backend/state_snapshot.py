@@ -0,0 +1,130 @@
+# state_snapshot.py
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from backend.analyzer import SessionAnalyzer
+from backend.bookmarks import BookmarkStore
+from backend.log_entry import LogEntry
+
+SNAPSHOT_VERSION = 1
+
+
+class StateSnapshot:
+    """
+    Persist the detection state of a SessionAnalyzer across restarts.
+
+    The snapshot holds each user's rapid-login window and behavioral
+    baseline, the open logon sessions and the bookmarks (last processed
+    RecordNumber per channel) the state corresponds to. Without it every boot
+    starts with empty windows and has to re-read history before rapid logins,
+    session durations and unusual logons are detected again.
+
+    Save only once a run has been read to the end and its bookmarks saved:
+    a run cut short is read again from the old bookmark, so its events would
+    be recorded twice. For the same reason, the windows and open sessions of
+    a snapshot taken past the current bookmarks, e.g. after the bookmarks file
+    was lost, are discarded on restore.
+
+    File layout (compact JSON):
+        {"version": 1, "saved_at": <epoch>, "records": {"host/channel": n},
+         "recent_logons": {"user": [epoch, ...]},
+         "open_sessions": [[host, logon_id, epoch, user], ...],
+         "baselines": {"user": {...}}}
+    """
+
+    def __init__(
+            self,
+            path: str,
+            analyzer: SessionAnalyzer,
+            bookmarks: Optional[BookmarkStore] = None
+    ):
+        """
+        Args:
+            path: JSON file holding the snapshot
+            analyzer: Analyzer whose state is saved and restored
+            bookmarks: Bookmarks recorded alongside the state
+        """
+        self.path = path
+        self.analyzer = analyzer
+        self.bookmarks = bookmarks
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the analyzer state in snapshot form."""
+        return {
+            'version': SNAPSHOT_VERSION,
+            'saved_at': int(time.time()),
+            'records': self.bookmarks.as_dict() if self.bookmarks is not None else {},
+            'recent_logons': {
+                user: list(window) for user, window in self.analyzer.recent_logons.items() if window
+            },
+            'open_sessions': [
+                [entry.host, entry.logon_id, entry.epoch, entry.user]
+                for entry in self.analyzer.sessions.open_logons.values()
+            ],
+            'baselines': self.analyzer.baselines.to_dict(),
+        }
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Load snapshot data into the analyzer, replacing its windows, open sessions and baselines."""
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {data.get('version')}")
+
+        records = data.get('records', {})
+        current = self.bookmarks.as_dict() if self.bookmarks is not None else records
+        # Records past the bookmarks will be read again, and recorded again
+        ahead = [key for key, record in records.items() if record > current.get(key, 0)]
+        if ahead:
+            logging.warning(
+                f"State snapshot was taken at records {records}, bookmarks are at {current}; "
+                f"discarding its rapid-login windows and open sessions"
+            )
+
+        self.analyzer.restore_recent_logons({} if ahead else data.get('recent_logons', {}))
+        sessions = self.analyzer.sessions
+        sessions.clear()
+        if not ahead:
+            sessions.restore_open_logons(
+                LogEntry(epoch=int(epoch), host=host, event_type='Logon', user=user, logon_id=logon_id)
+                for host, logon_id, epoch, user in data.get('open_sessions', [])
+            )
+        self.analyzer.baselines.restore(data.get('baselines', {}))
+
+    def load(self) -> bool:
+        """
+        Restore the analyzer from the snapshot file.
+
+        Returns:
+            True if state was restored, False if there was no usable snapshot
+        """
+        if not os.path.exists(self.path):
+            return False
+        try:
+            start = time.perf_counter()
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.restore(json.load(f))
+            logging.info(
+                f"Restored analyzer state from {self.path} in "
+                f"{(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+            return True
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logging.warning(f"Ignoring unreadable state snapshot {self.path}: {e}")
+            return False
+
+    def save(self) -> None:
+        """Write the snapshot atomically so a crash never leaves a truncated file."""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Failed to save state snapshot to {self.path}: {e}")
@@ -1,9 +1,17 @@
+import calendar
 import logging
+import time
 from datetime import datetime, timezone
-from typing import Union
+from typing import Tuple, Union
 
 from dateutil import parser
 
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+DAY_NAMES = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+# 1970-01-01 was a Thursday
+_EPOCH_WEEKDAY = 3
+
 
 def parse_timestamp(
         time_str: Union[str, datetime, None]
@@ -33,4 +41,46 @@ def parse_timestamp(
         return dt.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
     except Exception as e:
         logging.error(f"Error parsing timestamp {time_str}: {e}")
-        raise ValueError(f"Invalid timestamp format: {time_str}")
\ No newline at end of file
+        raise ValueError(f"Invalid timestamp format: {time_str}")
+
+
+def to_epoch(value: Union[str, datetime, int, float, None]) -> int:
+    """
+    Convert an event time to whole epoch seconds, the canonical time in the backend.
+
+    Naive datetimes and strings without an offset are taken as UTC, matching
+    parse_timestamp.
+
+    Raises:
+        ValueError: If the value cannot be interpreted as a time
+    """
+    if value is None:
+        raise ValueError("Timestamp cannot be None")
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        return calendar.timegm(value.utctimetuple())
+
+    text = str(value)
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            dt = parser.parse(text)
+        except (ValueError, OverflowError) as e:
+            logging.error(f"Error parsing timestamp {text}: {e}")
+            raise ValueError(f"Invalid timestamp format: {text}")
+    return calendar.timegm(dt.utctimetuple())
+
+
+def split_epoch(epoch: int) -> Tuple[int, int]:
+    """Return the (hour of day, weekday) of an epoch, with Monday as weekday 0."""
+    hour = epoch // 3600 % 24
+    weekday = (epoch // 86400 + _EPOCH_WEEKDAY) % 7
+    return hour, weekday
+
+
+def format_timestamp(epoch: int) -> str:
+    """Render an epoch as the timestamp string used in exports."""
+    return time.strftime(TIMESTAMP_FORMAT, time.gmtime(epoch))
+
@@ -0,0 +1,161 @@
+# window_reader.py
+import logging
+import os
+import sqlite3
+import time
+from operator import itemgetter
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from backend.jsonl_archive import JsonlArchive, is_compressed, loads_line, open_listed_segment
+from database.db_utils import connections
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+def reverse_lines(path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Yield the non-empty lines of a file last line first, reading it in blocks from the end.
+
+    Only the blocks holding the lines consumed are read, so taking the last
+    few lines of a file costs the same whatever its size.
+    """
+    with open(path, 'rb') as f:
+        yield from _reverse_file_lines(f, block_size)
+
+
+def _reverse_file_lines(f: BinaryIO, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[bytes]:
+    position = f.seek(0, os.SEEK_END)
+    remainder = b''
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        f.seek(position)
+        lines = (f.read(size) + remainder).split(b'\n')
+        # The first piece may continue in the previous block
+        remainder = lines[0]
+        for line in reversed(lines[1:]):
+            if line.strip():
+                yield line
+    if remainder.strip():
+        yield remainder
+
+
+def _segment_lines_reversed(path: str) -> Iterator[bytes]:
+    path, f = open_listed_segment(path)
+    with f:
+        if not is_compressed(path):
+            yield from _reverse_file_lines(f)
+            return
+        # Compressed segments cannot be read from the end; rotation bounds their size
+        lines = [line for line in f if line.strip()]
+    yield from reversed(lines)
+
+
+def iter_archive_reverse(archive: JsonlArchive) -> Iterator[Dict[str, Any]]:
+    """Stream an archive's records newest first, newest segment first."""
+    for path in reversed(archive.segments()):
+        for line in _segment_lines_reversed(path):
+            try:
+                yield loads_line(line)
+            except ValueError as e:
+                logging.warning(f"Skipping malformed line in {path}: {e}")
+
+
+def _matches(record: Dict[str, Any], user: Optional[str], host: Optional[str]) -> bool:
+    return (user is None or record.get('user') == user) and (host is None or record.get('host') == host)
+
+
+def _cutoff(minutes: Optional[int], now: Optional[float]) -> Optional[int]:
+    if minutes is None:
+        return None
+    return int((time.time() if now is None else now) - minutes * 60)
+
+
+def tail_archive(
+        archive: JsonlArchive,
+        count: Optional[int] = None,
+        minutes: Optional[int] = None,
+        user: Optional[str] = None,
+        host: Optional[str] = None,
+        now: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    The last events in an archive, read backwards from its newest segment.
+
+    Reading stops at the count-th match or at the first record older than
+    the time window, so the cost depends on the window rather than on the
+    archive size; only a user or host filter matching few records reads further.
+
+    Args:
+        archive: Archive to read
+        count: At most this many events
+        minutes: Only events in the last minutes
+        user: Only this user's events
+        host: Only this host's events
+        now: Epoch the time window ends at; defaults to the current time
+
+    Returns:
+        The matching records, oldest first
+    """
+    cutoff = _cutoff(minutes, now)
+    window = []
+    if count == 0:
+        return window
+    for record in iter_archive_reverse(archive):
+        if cutoff is not None and record['epoch'] < cutoff:
+            break
+        if _matches(record, user, host):
+            window.append(record)
+            if count is not None and len(window) >= count:
+                break
+    # Late events written to a newer part of an earlier day can arrive slightly out of order
+    window.sort(key=itemgetter('epoch'))
+    return window
+
+
+def tail_database(
+        db_name: str,
+        count: Optional[int] = None,
+        minutes: Optional[int] = None,
+        user: Optional[str] = None,
+        host: Optional[str] = None,
+        now: Optional[float] = None,
+        table_name: str = 'session_logs'
+) -> List[Dict[str, Any]]:
+    """
+    The last events in a database written by save_to_database.
+
+    Served by the (epoch), (user, epoch) and (host, epoch) indexes, so only
+    the rows returned are read, on a pooled read-only connection that does
+    not wait for the collector's writes. Arguments are as for tail_archive.
+
+    Returns:
+        The matching rows as dicts, oldest first
+    """
+    conditions, params = ['epoch IS NOT NULL'], []
+    cutoff = _cutoff(minutes, now)
+    if cutoff is not None:
+        conditions.append('epoch >= ?')
+        params.append(cutoff)
+    if user is not None:
+        conditions.append('user = ?')
+        params.append(user)
+    if host is not None:
+        conditions.append('host = ?')
+        params.append(host)
+    query = f"SELECT * FROM {table_name} WHERE {' AND '.join(conditions)} ORDER BY epoch DESC"
+    if count is not None:
+        query += " LIMIT ?"
+        params.append(count)
+
+    try:
+        with connections.reader(db_name) as conn:
+            cursor = conn.execute(query, params)
+            columns = [description[0] for description in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logging.error(f"Database error reading the window from {db_name}: {e}")
+        return []
+
+    rows.reverse()
+    return rows
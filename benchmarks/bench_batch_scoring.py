@@ -0,0 +1,79 @@
+"""
+Risk scoring cost for a backfill: assess_risk one entry at a time versus the
+vectorized batch scorer, on synthetic newest-first logons. Also checks that
+both paths produce identical scores.
+
+Usage:
+    python -m benchmarks.bench_batch_scoring [--events N] [--users N]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from backend.analyzer import SessionAnalyzer
+from backend.batch_scoring import score_batch
+from backend.log_entry import LogEntry
+from backend.timeUtils import split_epoch
+import backend.event_logger as event_logger
+
+
+def synthetic_entries(n, users, seed=0):
+    """Newest-first logons, a tenth failed, bursty enough that some are rapid."""
+    rng = random.Random(seed)
+    epoch = 1_738_368_000 + n * 10
+    entries = []
+    for _ in range(n):
+        epoch -= rng.choice((0, 1, 5, 20, 30))
+        hour, _ = split_epoch(epoch)
+        entries.append(LogEntry(
+            epoch=epoch,
+            event_type='Logon',
+            user=f"user{rng.randrange(users)}",
+            status='failed' if rng.random() < 0.1 else 'success',
+            hour_of_day=hour,
+        ))
+    return entries
+
+
+def per_event(entries):
+    # A fresh analyzer so the run starts from empty windows, like the batch scorer
+    event_logger.analyzer = analyzer = SessionAnalyzer()
+    start = time.perf_counter()
+    for entry in entries:
+        event_logger.assess_risk(entry)
+        analyzer.record_session(entry)
+    return time.perf_counter() - start
+
+
+def run(n, users):
+    entries = synthetic_entries(n, users)
+    epochs = np.array([e.epoch for e in entries], dtype=np.int64)
+    names = np.array([e.user for e in entries], dtype=object)
+    statuses = np.array([e.status for e in entries], dtype=object)
+
+    before = per_event(entries)
+    start = time.perf_counter()
+    scores = score_batch(epochs, names, statuses)
+    after = time.perf_counter() - start
+
+    mismatches = sum(
+        (e.is_business_hours, e.is_rapid_login, e.risk_factors, e.risk_score) != row
+        for e, row in zip(entries, zip(
+            scores.is_business_hours.tolist(), scores.is_rapid_login.tolist(),
+            scores.risk_factors(), scores.risk_score.tolist()
+        ))
+    )
+    print(f"events: {n}  users: {users}  rapid: {int(scores.is_rapid_login.sum())}")
+    print(f"per-event assess_risk: {before:8.3f}s  ({n / before:12,.0f} events/s)")
+    print(f"batch score_batch:     {after:8.3f}s  ({n / after:12,.0f} events/s)")
+    print(f"speedup: {before / after:.1f}x  mismatches: {mismatches}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=200)
+    args = parser.parse_args()
+    run(args.events, args.users)
@@ -0,0 +1,78 @@
+"""
+Memory held by enriched events: the 25-key dict create_base_entry used to
+build versus the slotted LogEntry, over a replay cycled to N events.
+
+Usage:
+    python -m benchmarks.bench_log_entry [path ...] [--events N]
+"""
+import argparse
+import itertools
+import tracemalloc
+
+from backend.event_processor import process_event
+from backend.event_source import ReplayEventSource
+from backend.timeUtils import format_timestamp, to_epoch
+
+
+def legacy_dict(entry):
+    """The per-event dict the pipeline allocated before LogEntry."""
+    return {
+        'timestamp': format_timestamp(entry.epoch),
+        'event_type': entry.event_type,
+        'user': entry.user,
+        'domain': entry.domain,
+        'user_sid': entry.user_sid,
+        'logon_id': entry.logon_id,
+        'session_duration': entry.session_duration,
+        'status': entry.status,
+        'logon_type': entry.logon_type,
+        'source_ip': entry.source_ip,
+        'destination_ip': '',
+        'is_rapid_logon': '',
+        'workstation_name': entry.workstation_name,
+        'failure_reason': entry.failure_reason,
+        'process_name': '',
+        'auth_package': entry.auth_package,
+        'risk_score': entry.risk_score,
+        'day_of_week': entry.day_of_week,
+        'hour_of_day': entry.hour_of_day,
+        'is_business_hours': entry.is_business_hours,
+        'event_id': entry.event_id,
+        'event_task_category': entry.event_task_category,
+        'elevated_token': entry.elevated_token,
+        'is_rapid_login': entry.is_rapid_login,
+    }
+
+
+def measure(build, events):
+    tracemalloc.start()
+    held = [build(event) for event in events]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, len(held)
+
+
+def run(paths, n):
+    recorded = list(ReplayEventSource(paths))
+    events = list(itertools.islice(itertools.cycle(recorded), n))
+
+    def build_entry(event):
+        return process_event(event, event.StringInserts or [], to_epoch(event.TimeGenerated))
+
+    def build_dict(event):
+        return legacy_dict(build_entry(event))
+
+    dict_bytes, count = measure(build_dict, events)
+    entry_bytes, _ = measure(build_entry, events)
+    print(f"events: {count}")
+    print(f"dict entries:     {dict_bytes / 2 ** 20:8.1f} MiB  ({dict_bytes / count:6.0f} B/event)")
+    print(f"LogEntry entries: {entry_bytes / 2 ** 20:8.1f} MiB  ({entry_bytes / count:6.0f} B/event)")
+    print(f"reduction: {1 - entry_bytes / dict_bytes:.0%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', default=['exports/session_logons.json', 'exports/session_logoffs.json'])
+    parser.add_argument('--events', type=int, default=1_000_000)
+    args = parser.parse_args()
+    run(args.paths, args.events)
@@ -0,0 +1,34 @@
+"""
+Replay recorded events through the enrichment pipeline and report throughput.
+
+Usage:
+    python -m benchmarks.bench_replay [path ...] [--repeat N]
+"""
+import argparse
+import time
+
+from backend.event_logger import process_single_event
+from backend.event_source import ReplayEventSource
+
+
+def run(paths, repeat):
+    events = list(ReplayEventSource(paths))
+    session_logons, session_logoffs = [], []
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for event in events:
+            process_single_event(event, 0, session_logons, session_logoffs)
+    elapsed = time.perf_counter() - start
+
+    total = len(events) * repeat
+    print(f"events: {total}  logons: {len(session_logons)}  logoffs: {len(session_logoffs)}")
+    print(f"elapsed: {elapsed:.3f}s  throughput: {total / elapsed:,.0f} events/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='*', default=['exports/session_logons.json', 'exports/session_logoffs.json'])
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+    run(args.paths, args.repeat)
@@ -0,0 +1,122 @@
+"""
+Enrichment throughput of the single-process pipeline versus the sharded one,
+on synthetic newest-first session events from several hosts. Also checks
+that both produce identical entries.
+
+Usage:
+    python -m benchmarks.bench_sharding [--events N] [--users N] [--hosts N] [--workers N]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+
+from backend.event_logger import iter_session_events
+from backend.event_source import EventRecord, EventSource
+from backend.sharding import iter_sharded_session_events
+
+BASE_EPOCH = 1_738_368_000
+LOOKBACK_DAYS = 36500
+
+
+class ListEventSource(EventSource):
+    """Events held in memory, handed out newest first in fixed-size buffers."""
+
+    def __init__(self, events, host, batch_size=128):
+        self.events = events
+        self.host = host
+        self.channel = 'Security'
+        self.batch_size = batch_size
+
+    def read_batches(self):
+        for start in range(0, len(self.events), self.batch_size):
+            yield self.events[start:start + self.batch_size]
+
+
+def synthetic_events(n, users, host, seed):
+    """
+    Newest-first logons, failures from a few spraying addresses, and logoffs.
+
+    Most logoffs are followed, further back in the stream, by the logon they
+    end, at a random distance, so sessions span enrichment batches.
+    """
+    rng = random.Random(seed)
+    epoch = BASE_EPOCH + n * 10
+    events = []
+    # Logged-off sessions whose logon is still to come, as (user, logon_id)
+    open_sessions = []
+    for record_number in range(n, 0, -1):
+        epoch -= rng.choice((0, 1, 5, 20, 30))
+        user = f"user{rng.randrange(users)}"
+        logon_id = f"0x{rng.randrange(1 << 40):x}"
+        roll = rng.random()
+        if roll >= 0.4 and open_sessions and rng.random() < 0.8:
+            user, logon_id = open_sessions.pop(rng.randrange(len(open_sessions)))
+        if roll < 0.1:
+            event_id = 4625
+            data = [''] * 20
+            data[3], data[5], data[6], data[7], data[8] = '0x0', user, 'CORP', '0xc000006a', '10'
+            data[19] = f"203.0.113.{rng.randrange(8)}"
+        elif roll < 0.4:
+            event_id = 4634
+            data = ['S-1-5-21', user, 'CORP', logon_id, '2']
+            open_sessions.append((user, logon_id))
+        else:
+            event_id = 4624
+            data = [''] * 21
+            data[1], data[4], data[5], data[6], data[7] = f"WS{rng.randrange(20)}", 'S-1-5-21', user, 'CORP', logon_id
+            data[8] = rng.choice(('2', '10', '7'))
+            data[18] = rng.choice(('-', f"10.0.{rng.randrange(4)}.{rng.randrange(250)}"))
+            data[20] = '%%1843'
+        events.append(EventRecord(
+            EventID=event_id,
+            TimeGenerated=datetime.fromtimestamp(epoch, tz=timezone.utc),
+            StringInserts=data,
+            RecordNumber=record_number,
+            ComputerName=host,
+        ))
+    return events
+
+
+def run(n, users, hosts, workers):
+    archives = [synthetic_events(n // hosts, users, f"host{h}", seed=h) for h in range(hosts)]
+
+    # The single-process reader takes one source, so feed it the merged stream
+    merged = sorted(
+        (event for events in archives for event in events),
+        key=lambda event: event.TimeGenerated, reverse=True
+    )
+    start = time.perf_counter()
+    serial = list(iter_session_events(
+        days_back=LOOKBACK_DAYS, source=ListEventSource(merged, 'merged'), stop_at_cutoff=False
+    ))
+    before = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sharded = [
+        entry
+        for batch in iter_sharded_session_events(
+            [ListEventSource(events, f"host{h}") for h, events in enumerate(archives)],
+            workers=workers, days_back=LOOKBACK_DAYS, stop_at_cutoff=False
+        )
+        for entry in batch
+    ]
+    after = time.perf_counter() - start
+
+    mismatches = sum(a.to_dict() != b.to_dict() for a, b in zip(serial, sharded))
+    mismatches += abs(len(serial) - len(sharded))
+    total = sum(len(events) for events in archives)
+    print(f"events: {total}  hosts: {hosts}  users: {users}  entries: {len(serial)}")
+    print(f"single process:          {before:8.3f}s  ({total / before:12,.0f} events/s)")
+    print(f"sharded ({workers} workers):   {after:8.3f}s  ({total / after:12,.0f} events/s)")
+    print(f"speedup: {before / after:.1f}x  mismatches: {mismatches}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=200_000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--hosts', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    run(args.events, args.users, args.hosts, args.workers)
@@ -0,0 +1,68 @@
+"""
+Per-event timestamp handling cost: the string round-trips the backend used to
+make versus one epoch conversion plus integer arithmetic.
+
+Usage:
+    python -m benchmarks.bench_timestamps [--events N]
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+from backend.timeUtils import DAY_NAMES, parse_timestamp, split_epoch, to_epoch
+
+FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def string_path(time_generated, history):
+    """parse_timestamp, then strptime in process_single_event, create_base_entry,
+    is_business_hours and is_rapid_login (once per history entry)."""
+    timestamp = parse_timestamp(time_generated)
+    datetime.strptime(timestamp, FORMAT)
+    dt = datetime.strptime(timestamp, FORMAT)
+    day_of_week, hour = dt.strftime('%A'), dt.hour
+    9 <= datetime.strptime(timestamp, FORMAT).hour < 18
+    current = datetime.strptime(timestamp, FORMAT)
+    for entry in history:
+        abs((datetime.strptime(entry, FORMAT) - current).total_seconds()) <= 60
+    return timestamp, day_of_week, hour
+
+
+def epoch_path(time_generated, history):
+    """One to_epoch conversion; everything else is integer arithmetic."""
+    epoch = to_epoch(time_generated)
+    hour, weekday = split_epoch(epoch)
+    day_of_week = DAY_NAMES[weekday]
+    9 <= hour < 18
+    for entry in history:
+        abs(entry - epoch) <= 60
+    return epoch, day_of_week, hour
+
+
+def measure(func, events, history):
+    start = time.perf_counter()
+    for event in events:
+        func(event, history)
+    return (time.perf_counter() - start) / len(events)
+
+
+def run(n, history_size):
+    base = datetime(2025, 2, 1, tzinfo=timezone.utc)
+    events = [base + timedelta(seconds=i) for i in range(n)]
+    string_history = [e.strftime(FORMAT) for e in events[:history_size]]
+    epoch_history = [to_epoch(e) for e in events[:history_size]]
+
+    before = measure(string_path, events, string_history)
+    after = measure(epoch_path, events, epoch_history)
+    print(f"events: {n}  history entries per event: {history_size}")
+    print(f"string timestamps: {before * 1e6:8.2f} us/event")
+    print(f"epoch timestamps:  {after * 1e6:8.2f} us/event")
+    print(f"speedup: {before / after:.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--history', type=int, default=5)
+    args = parser.parse_args()
+    run(args.events, args.history)
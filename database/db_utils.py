@@ -1,7 +1,15 @@
+import atexit
+import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
 
 Export_fields = [
     'timestamp',
+    'epoch',
     'event_type',
     'user',
     'domain',
@@ -14,14 +22,27 @@ Export_fields = [
     'source_ip',
     'workstation_name',
     'is_business_hours',
-    'is_rapid_logon',
+    'is_rapid_login',
     'day_of_week',
     'hour_of_day',
     'risk_score',
     'event_id',
     'event_task_category',
+    'ip_failed_attempts',
+    'ip_distinct_users',
+    'ip_verdict',
+    'behavior_rarity',
+    'host',
 ]
 
+# Column types for fields added to existing tables; anything else is TEXT
+Export_field_types = {
+    'epoch': 'INTEGER',
+    'ip_failed_attempts': 'INTEGER',
+    'ip_distinct_users': 'INTEGER',
+    'behavior_rarity': 'REAL',
+}
+
 
 def ensure_columns_exist(cursor, table_name, columns):
     """Ensure all required columns exist in the table schema."""
@@ -29,63 +50,230 @@ def ensure_columns_exist(cursor, table_name, columns):
     existing_columns = {col[1] for col in cursor.fetchall()}
     for col in columns:
         if col not in existing_columns:
-            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} TEXT")
+            cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN {col} {Export_field_types.get(col, 'TEXT')}")
+
+
+# Indexes for reading the latest events overall, per user and per host
+Window_indexes = {
+    'epoch': ['epoch'],
+    'user_epoch': ['user', 'epoch'],
+    'host_epoch': ['host', 'epoch'],
+}
+
+
+def ensure_indexes_exist(cursor, table_name):
+    """Ensure the indexes behind the window queries exist."""
+    for name, columns in Window_indexes.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_{name} ON {table_name} ({', '.join(columns)})")
+
+
+def create_table(cursor, table_name):
+    """Create the session log table if it doesn't exist."""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT,
+            epoch INTEGER,
+            event_type TEXT,
+            user TEXT,
+            domain TEXT,
+            user_sid TEXT,
+            logon_type TEXT,
+            status TEXT,
+            failure_reason TEXT,
+            logon_id TEXT,
+            session_duration REAL,
+            source_ip TEXT,
+            workstation_name TEXT,
+            is_business_hours BOOLEAN,
+            is_rapid_login BOOLEAN,
+            day_of_week TEXT,
+            hour_of_day INTEGER,
+            risk_score REAL,
+            event_id INTEGER,
+            event_task_category TEXT,
+            ip_failed_attempts INTEGER,
+            ip_distinct_users INTEGER,
+            ip_verdict TEXT,
+            behavior_rarity REAL,
+            host TEXT
+        )
+    """)
+
+
+class ConnectionManager:
+    """
+    Long-lived SQLite connections, kept per database file for the life of the process.
+
+    Each database gets one writer connection, used by one thread at a time
+    under a lock, and a pool of read-only connections. The writer switches
+    the file to WAL with synchronous=NORMAL, so commits skip most fsyncs and
+    readers, in this process or another such as the dashboard, read the last
+    committed state without blocking the writer or being blocked by it. Schema
+    checks run once per process for each table.
+    """
+
+    def __init__(self, read_pool_size=4, cache_kib=16 * 1024, mmap_bytes=256 * 1024 * 1024, busy_timeout=5.0):
+        """
+        Args:
+            read_pool_size: Most read-only connections open per database
+            cache_kib: Page cache per connection, in KiB
+            mmap_bytes: Bytes of the database file read through memory mapping
+            busy_timeout: Seconds to wait for a lock held by another process
+        """
+        self.read_pool_size = read_pool_size
+        self.cache_kib = cache_kib
+        self.mmap_bytes = mmap_bytes
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._writers = {}
+        self._write_locks = {}
+        self._readers = {}
+        self._reader_counts = {}
+        self._checked_tables = set()
+
+    @staticmethod
+    def _key(db_name):
+        return os.path.abspath(db_name)
+
+    def _tune(self, conn):
+        conn.execute(f"PRAGMA cache_size = -{self.cache_kib}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_bytes}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+    def _open_writer(self, key):
+        conn = sqlite3.connect(key, timeout=self.busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        self._tune(conn)
+        return conn
+
+    def _open_reader(self, key):
+        uri = f"{Path(key).as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout, check_same_thread=False)
+        self._tune(conn)
+        return conn
+
+    @contextmanager
+    def writer(self, db_name):
+        """
+        The database's writer connection, held exclusively for the block.
+
+        The block's changes are committed when it exits, or rolled back if it raises.
+        """
+        key = self._key(db_name)
+        with self._lock:
+            write_lock = self._write_locks.setdefault(key, threading.Lock())
+        with write_lock:
+            conn = self._writers.get(key)
+            if conn is None:
+                conn = self._writers[key] = self._open_writer(key)
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def reader(self, db_name):
+        """A read-only connection from the database's pool, returned to it when the block exits."""
+        key = self._key(db_name)
+        with self._lock:
+            pool = self._readers.setdefault(key, queue.LifoQueue())
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                conn = None
+                if self._reader_counts.get(key, 0) < self.read_pool_size:
+                    conn = self._open_reader(key)
+                    self._reader_counts[key] = self._reader_counts.get(key, 0) + 1
+        if conn is None:
+            # Every pooled connection is in use; wait for one
+            conn = pool.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            pool.put(conn)
+
+    def check_schema(self, db_name, table_name='session_logs'):
+        """Create the table and its missing columns and indexes, once per process."""
+        check = (self._key(db_name), table_name)
+        if check in self._checked_tables:
+            return
+        with self.writer(db_name) as conn:
+            cursor = conn.cursor()
+            create_table(cursor, table_name)
+            ensure_columns_exist(cursor, table_name, Export_fields)
+            ensure_indexes_exist(cursor, table_name)
+        self._checked_tables.add(check)
+
+    def close(self):
+        """
+        Close every connection; the next use reopens them.
+
+        Readers are closed first, so that the writer, closed last, can
+        checkpoint the whole WAL into the database file and truncate it;
+        SQLite then removes the -wal and -shm files.
+        """
+        with self._lock:
+            writers = list(self._writers.items())
+            readers = []
+            for pool in self._readers.values():
+                while not pool.empty():
+                    readers.append(pool.get_nowait())
+            self._writers.clear()
+            self._readers.clear()
+            self._reader_counts.clear()
+        for conn in readers:
+            conn.close()
+        for key, conn in writers:
+            # Wait for a write in progress to commit
+            with self._write_locks[key]:
+                try:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error as e:
+                    print(f"Error checkpointing {key}: {e}")
+                conn.close()
+
+
+connections = ConnectionManager()
+# Checkpoint the WAL into the database files before the process exits
+atexit.register(connections.close)
 
 
 def save_to_database(logs, db_name):
-    """Save logs to an SQLite database, ensuring no duplicate rows are inserted."""
-    if not logs:
+    """
+    Save logs to an SQLite database, ensuring no duplicate rows are inserted.
+
+    Args:
+        logs: List or any iterable of LogEntry records, e.g. a batch from
+            iter_session_events, or of their to_dict records; it is consumed
+            once while inserting.
+        db_name: Path to the SQLite database file.
+    """
+    if isinstance(logs, (list, tuple)) and not logs:
         print("No logs to save.")
         return
 
     try:
-        # Connect to SQLite database
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
-
-        # Create the session_logs table if it doesn't exist
-        cursor.execute(f"""
-            CREATE TABLE IF NOT EXISTS session_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                event_type TEXT,
-                user TEXT,
-                domain TEXT,
-                user_sid TEXT,
-                logon_type TEXT,
-                status TEXT,
-                failure_reason TEXT,
-                logon_id TEXT,
-                session_duration REAL,
-                source_ip TEXT,
-                workstation_name TEXT,
-                is_business_hours BOOLEAN,
-                is_rapid_login BOOLEAN,
-                day_of_week TEXT,
-                hour_of_day INTEGER,
-                risk_score REAL,
-                event_id INTEGER,
-                event_task_category TEXT
-            )
-        """)
-
-        # Ensure all required columns exist
-        ensure_columns_exist(cursor, "session_logs", Export_fields)
-
-        # Prepare logs for insertion
-        formatted_logs = []
-        for log in logs:
-            formatted_log = {field: log.get(field, '') for field in Export_fields}
-            formatted_logs.append(formatted_log)
-
-        # Insert logs into the table
+        # Create the table, missing columns and indexes on first use in this process
+        connections.check_schema(db_name)
+
+        # Prepare logs for insertion lazily so iterables are streamed into executemany;
+        # the timestamp string is only rendered here, from the entry's epoch
+        formatted_logs = (
+            {field: record.get(field, '') for field in Export_fields}
+            for record in (log if isinstance(log, dict) else log.to_dict() for log in logs)
+        )
+
+        # Insert logs into the table; the block commits on exit
         fields_str, placeholders = ', '.join(Export_fields), ', '.join([f":{field}" for field in Export_fields])
         query = f"INSERT OR IGNORE INTO session_logs ({fields_str}) VALUES ({placeholders})"
-        cursor.executemany(query, formatted_logs)
-
-        # Commit changes and close the connection
-        conn.commit()
-        conn.close()
+        with connections.writer(db_name) as conn:
+            conn.executemany(query, formatted_logs)
 
         print(f"Logs successfully saved to database: {db_name}")
     except Exception as e:
@@ -95,9 +283,6 @@ def save_to_database(logs, db_name):
 def query_database(db_name, table_name='session_logs'):
     """Query selected columns from the database."""
     try:
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
-
         # Define columns to fetch
         selected_columns = [
             'timestamp',
@@ -109,18 +294,16 @@ def query_database(db_name, table_name='session_logs'):
             'logon_type',
             'source_ip'
         ]
-        ensure_columns_exist(cursor, table_name, selected_columns)
+        connections.check_schema(db_name, table_name)
 
         # Query the database
         fields_str = ', '.join(selected_columns)
         query = f"SELECT {fields_str} FROM {table_name}"
-        cursor.execute(query)
-        rows = cursor.fetchall()
+        with connections.reader(db_name) as conn:
+            rows = conn.execute(query).fetchall()
 
         # Convert rows into dictionaries
-        data = [dict(zip(selected_columns, row)) for row in rows]
-        conn.close()
-        return data
+        return [dict(zip(selected_columns, row)) for row in rows]
     except sqlite3.Error as e:
         print(f"Database error: {str(e)}")
         return []
@@ -141,9 +324,6 @@ def query_last_logon_session(db_name, table_name='session_logs'):
         dict: The latest logon session entry.
     """
     try:
-        conn = sqlite3.connect(db_name)
-        cursor = conn.cursor()
-
         # Define columns to fetch
         selected_columns = [
             'timestamp',
@@ -164,10 +344,8 @@ def query_last_logon_session(db_name, table_name='session_logs'):
         ORDER BY timestamp DESC
         LIMIT 1
         """
-        cursor.execute(query)
-        row = cursor.fetchone()
-
-        conn.close()
+        with connections.reader(db_name) as conn:
+            row = conn.execute(query).fetchone()
 
         # Convert row into a dictionary
         if row:
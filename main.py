@@ -1,24 +1,39 @@
+import atexit
 import logging
+import multiprocessing
 import os
 import sys
-from collections import defaultdict
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timezone
+from functools import partial
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import win32com
 
 from GUI.email_script import send_email
 from GUI.userSettings import App
 from ML.model import start_model
-from backend.event_logger import get_session_logs
-from backend.export_utils import save_to_json, save_json_file_to_csv, analyze_first_three_logs
-from data_clean import clean_csv
+from backend.bookmarks import BookmarkStore
+from backend.columnar_export import PYARROW_AVAILABLE, ColumnarExporter
+from backend.event_logger import ReadStats, analyzer as session_analyzer, iter_session_events
+from backend.event_source import Win32EventSource
+from backend.export_pipeline import MODEL_WINDOW, SinkResult, export_features, model_features, run_sinks
+from backend.jsonl_archive import JsonlArchive, RotationPolicy
+from backend.log_entry import LogEntry
+from backend.run_spool import RunSpool
+from backend.sharding import ShardedAnalyzer, iter_sharded_session_events
+from backend.state_snapshot import StateSnapshot
+from backend.window_reader import tail_archive
 from database.db_utils import save_to_database
 from enableEV import enable_failed_login_auditing
 
 APP_NAME = "LogGuard"
 EXE_NAME = "LogGuard.exe"
+COLLECT_BATCH_SIZE = 500
+# Entries held back waiting for their session partner before they are rechecked
+HELD_RECHECK_SIZE = 1000
+ARCHIVE_RETENTION_DAYS = 90
 
 
 def get_log_directory():
@@ -94,58 +109,207 @@ def Confrmation():
     print("Added to startup")
 
 
+def _write_slices(write: Callable[[List[Dict[str, Any]]], Any], *spools: RunSpool) -> int:
+    """Feed spooled records to a bulk writer oldest first, a slice at a time; returns the records written."""
+    written = 0
+    for spool in spools:
+        for records in spool.iter_slices():
+            write(records)
+            written += len(records)
+    return written
+
+
 class LogAnalyzer:
     def __init__(self):
         self.database_dir = None
-        self.logons = []
-        self.logoffs = []
+        self.sessions = []
         base_dir = get_base_path()
         self.export_dir = base_dir / 'Exports'
         self.export_dir.mkdir(parents=True, exist_ok=True)
-
-    def collect_logs(self, minutes_back: Optional[int] = None, days_back: Optional[int] = None) -> None:
-        """Collect system logon logs."""
+        self.bookmarks = BookmarkStore(get_export_path('bookmarks.json'))
+        archive_policy = RotationPolicy(retention_days=ARCHIVE_RETENTION_DAYS)
+        self.logon_archive = JsonlArchive(get_export_path('archive'), 'session_logons', archive_policy)
+        self.logoff_archive = JsonlArchive(get_export_path('archive'), 'session_logoffs', archive_policy)
+        # Let closed segments finish compressing before the process exits
+        atexit.register(self.logon_archive.close)
+        # Parquet dataset of logons and logoffs for notebooks, when pyarrow is installed
+        self.columnar = ColumnarExporter(get_export_path('columnar')) if PYARROW_AVAILABLE else None
+        self.snapshot = StateSnapshot(get_export_path('analyzer_state.json'), session_analyzer, self.bookmarks)
+        self.snapshot.load()
+
+        # What the summary needs of a run; the entries themselves are exported as they arrive
+        self.logon_count = 0
+        self.logon_epochs: Optional[Tuple[int, int]] = None
+        self.risk_scores: Counter = Counter()
+        # Entries waiting for their session partner, with their position in the run
+        self._held: List[Tuple[int, LogEntry]] = []
+        self._held_limit = HELD_RECHECK_SIZE
+        self._received = 0
+        self.logon_spool = RunSpool(str(self.export_dir))
+        self.logoff_spool = RunSpool(str(self.export_dir))
+        atexit.register(self._clear_spools)
+
+    def _clear_spools(self) -> None:
+        self.logon_spool.close()
+        self.logoff_spool.close()
+
+    def collect_logs(
+            self,
+            minutes_back: Optional[int] = None,
+            days_back: Optional[int] = None,
+            workers: Optional[int] = None
+    ) -> None:
+        """
+        Collect system logon logs, exporting them to the databases batch by batch.
+
+        Only the run's summary is kept in memory. Each batch goes to the
+        databases and to the run's spools, which export_data drains into the
+        archive, the Parquet dataset and the feature tables. A logon or logoff
+        still waiting for its session partner is held back until the partner
+        arrives, expires or the run ends, so it is exported with its duration.
+
+        Args:
+            minutes_back: Number of minutes to look back
+            days_back: Number of days to look back
+            workers: Enrich in this many shard worker processes instead of in-process;
+                for busy servers, at the cost of starting without the saved state
+        """
         enable_failed_login_auditing()
-        self.logons, self.logoffs = get_session_logs(days_back=days_back) if days_back else get_session_logs(
-            minutes_back=minutes_back)
+        window = {'days_back': days_back} if days_back else {'minutes_back': minutes_back}
+
+        self.sessions = []
+        self.logon_count, self.logon_epochs, self.risk_scores = 0, None, Counter()
+        self._received = 0
+        self._clear_spools()
+        if workers:
+            self._collect_sharded(workers, window)
+            return
+
+        is_waiting = session_analyzer.sessions.is_waiting
+        stats = ReadStats()
+        for batch in iter_session_events(
+                bookmarks=self.bookmarks, batch_size=COLLECT_BATCH_SIZE, stats=stats, **window
+        ):
+            self._add_batch(batch, is_waiting)
+            self.sessions.extend(session_analyzer.sessions.drain_completed())
+        self._release_held()
+        self.sessions.extend(session_analyzer.sessions.drain_completed())
+        # Only a run read to the end matches the bookmarks it saved; a failed one is read again
+        if stats.stop_reason != 'error':
+            self.snapshot.save()
+
+    def _collect_sharded(self, workers: int, window: Dict[str, Optional[int]]) -> None:
+        with ShardedAnalyzer(workers) as sharded:
+            for batch in iter_sharded_session_events(
+                    [Win32EventSource()], bookmarks=self.bookmarks, sharded=sharded, **window
+            ):
+                self._add_batch(batch, sharded.is_waiting)
+            self.sessions.extend(sharded.drain_completed())
+        self._release_held()
+
+    def _add_batch(self, batch: List[LogEntry], is_waiting: Callable[[LogEntry], bool]) -> None:
+        ready = []
+        for entry in batch:
+            if entry.event_type != 'Logoff':
+                self.logon_count += 1
+                self.risk_scores[entry.risk_score] += 1
+                first = self.logon_epochs[0] if self.logon_epochs else entry.epoch
+                self.logon_epochs = first, entry.epoch
+            (self._held if is_waiting(entry) else ready).append((self._received, entry))
+            self._received += 1
+        self._export_batch(ready)
+
+        if len(self._held) >= self._held_limit:
+            # Recheck in bulk, so the cost stays amortised O(1) per held entry
+            waiting, completed = [], []
+            for item in self._held:
+                (waiting if is_waiting(item[1]) else completed).append(item)
+            self._export_batch(completed)
+            self._held = waiting
+            self._held_limit = max(HELD_RECHECK_SIZE, 2 * len(waiting))
+
+    def _release_held(self) -> None:
+        """Export the entries still held at the end of a run as they are."""
+        held, self._held, self._held_limit = self._held, [], HELD_RECHECK_SIZE
+        self._export_batch(held)
+
+    def _export_batch(self, entries: List[Tuple[int, LogEntry]]) -> None:
+        # Held entries are released in bulk; render them a batch at a time
+        for start in range(0, len(entries), COLLECT_BATCH_SIZE):
+            self._export_slice(entries[start:start + COLLECT_BATCH_SIZE])
+
+    def _export_slice(self, entries: List[Tuple[int, LogEntry]]) -> None:
+        logons, logoffs = [], []
+        for order, entry in entries:
+            (logoffs if entry.event_type == 'Logoff' else logons).append((order, entry.to_dict()))
+        for records, spool, db_name in (
+                (logons, self.logon_spool, 'session_logons.db'),
+                (logoffs, self.logoff_spool, 'session_logoffs.db'),
+        ):
+            if records:
+                save_to_database([record for _, record in records], get_export_path(db_name))
+                spool.add(records)
 
     def analyze_time_range(self) -> Optional[Tuple[datetime, datetime]]:
         """Analyze the time range of logs."""
-        if not self.logons:
+        if self.logon_epochs is None:
             return None
-        first_log = datetime.strptime(self.logons[0]['timestamp'], '%Y-%m-%d %H:%M:%S')
-        last_log = datetime.strptime(self.logons[-1]['timestamp'], '%Y-%m-%d %H:%M:%S')
+        first_log = datetime.fromtimestamp(self.logon_epochs[0], tz=timezone.utc)
+        last_log = datetime.fromtimestamp(self.logon_epochs[1], tz=timezone.utc)
         return first_log, last_log
 
     def analyze_risk_distribution(self) -> Dict[int, int]:
         """Analyze risk scores in logs."""
-        risk_groups = defaultdict(list)
-        for log in self.logons:
-            risk_groups[log.get('risk_score', 0)].append(log)
-        return {score: len(events) for score, events in risk_groups.items()}
-
-    def export_data(self):
-        """Export logs to JSON, CSV, and database."""
+        levels = Counter()
+        for score, count in self.risk_scores.items():
+            levels[session_analyzer.rules.classify(score)] += count
+        logging.info(f"Risk levels: {dict(levels)}")
+        return dict(self.risk_scores)
+
+    def export_data(self) -> Dict[str, SinkResult]:
+        """
+        Export the collected run to the archive, the Parquet dataset and the CSV feature tables.
+
+        The databases were written batch by batch during collection. These
+        sinks read the run back from its spools, oldest first, so the archive
+        stays in time order; they run concurrently, the feature tables are
+        built in memory, and a failing sink does not stop the others.
+
+        Returns:
+            Each sink's result or error and duration, by sink name
+        """
+        sinks = {
+            'logons_archive': partial(_write_slices, self.logon_archive.append, self.logon_spool),
+            'logoffs_archive': partial(_write_slices, self.logoff_archive.append, self.logoff_spool),
+            'feature_csvs': partial(
+                export_features,
+                self.logon_spool.iter_records(),
+                exported_csv_path=get_export_path('exported_logons.csv'),
+                cleaned_csv_path=get_export_path('cleaned_logons.csv'),
+            ),
+        }
+        if self.columnar is not None:
+            sinks['columnar'] = partial(_write_slices, self.columnar.write, self.logon_spool, self.logoff_spool)
         try:
-            logons_json_path = get_export_path('session_logons.json')
-            logoffs_json_path = get_export_path('session_logoffs.json')
+            return run_sinks(sinks)
+        finally:
+            self._clear_spools()
 
-            save_to_database(self.logons, get_export_path('session_logons.db'))
-            save_to_database(self.logoffs, get_export_path('session_logoffs.db'))
-            save_to_json(self.logons, logons_json_path)
-            save_to_json(self.logoffs, logoffs_json_path)
+    def model_input(self, count: int = MODEL_WINDOW) -> Optional[Dict[str, Any]]:
+        """
+        Aggregate the most recent logons into the model's input.
 
-            logons_csv_path = get_export_path('exported_logons.csv')
-            csv_path = save_json_file_to_csv(logons_json_path, logons_csv_path)
-
-            if not csv_path or not os.path.exists(csv_path):
-                raise FileNotFoundError(f"Failed to create CSV file: {csv_path}")
-
-            cleaned_csv_path = get_export_path('cleaned_logons.csv')
-            clean_csv(logons_csv_path, cleaned_csv_path)
+        The logons are read backwards from the end of the archive, so earlier
+        runs count and the cost does not grow with the archive.
 
+        Returns:
+            The aggregated input, or None with fewer than count archived logons
+        """
+        try:
+            return model_features(tail_archive(self.logon_archive, count=count), count)
         except Exception as e:
-            logging.error(f"❌ Error exporting data: {e}")
+            logging.error(f"❌ Error reading the latest logons: {e}")
+            return None
 
 
 def main():
@@ -158,8 +322,11 @@ def main():
         analyzer.analyze_risk_distribution()
         analyzer.export_data()
 
-        latest_log = analyze_first_three_logs(get_export_path('cleaned_logons.csv'))
-        output = start_model(latest_log)
+        latest_log = analyzer.model_input()
+        if latest_log is None:
+            logging.warning("No model input from the archived logons, skipping detection")
+        else:
+            output = start_model(latest_log)
 
         if getattr(sys, 'frozen', False):
             input("\nPress Enter to exit...")  # Keeps window open in EXE mode
@@ -174,6 +341,8 @@ def main():
 
 
 if __name__ == '__main__':
+    # Shard workers are spawned by re-running the executable when frozen
+    multiprocessing.freeze_support()
     add_to_startup()
     Confrmation()
 
@@ -0,0 +1,178 @@
+"""
+Writes the small .evtx files under tests/data that the EVTX tests read.
+
+Only the structures EvtxReader reads are written: the file header magic,
+64 KiB chunks with their record range and free-space offset, and records
+made of one resident BinXML template per chunk plus a substitution array.
+
+Usage:
+    python -m tests.evtx_fixture
+"""
+import os
+import struct
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Sequence
+
+from backend.event_source import rebuild_string_inserts
+from backend.evtx_reader import (
+    CHUNK_HEADER_SIZE, CHUNK_MAGIC, CHUNK_SIZE, FILE_HEADER_SIZE, FILE_MAGIC, FILETIME_EPOCH, RECORD_MAGIC,
+    TOKEN_ATTRIBUTE, TOKEN_CLOSE_EMPTY_ELEMENT, TOKEN_CLOSE_START_ELEMENT, TOKEN_END_ELEMENT,
+    TOKEN_END_OF_STREAM, TOKEN_FRAGMENT_HEADER, TOKEN_OPEN_START_ELEMENT, TOKEN_OPTIONAL_SUBSTITUTION,
+    TOKEN_TEMPLATE_INSTANCE, TYPE_FILETIME, TYPE_NULL, TYPE_WSTRING
+)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+HOST = 'DC01.corp.example'
+# Every Data element is a substitution, so one template serves all three event IDs
+DATA_FIELDS = 21
+TYPE_UINT16 = 0x06
+TEMPLATE_GUID = bytes(range(16))
+# The first record of each chunk holds the template definition, after its
+# record header, fragment header and template instance header
+TEMPLATE_OFFSET = CHUNK_HEADER_SIZE + 24 + 4 + 10
+
+# Exported entries per fixture file, oldest first: (file name, records per chunk, entries)
+FIXTURES = [
+    ('security-2001.evtx', 4, [
+        {'record_number': 1, 'event_id': 4624, 'time': '2001-03-01T08:00:00', 'user': 'alice', 'logon_id': '0x1001'},
+        {'record_number': 2, 'event_id': 4625, 'time': '2001-03-01T08:05:00', 'user': 'bob',
+         'failure_reason': '0xc000006a', 'source_ip': '203.0.113.7'},
+        {'record_number': 3, 'event_id': 4634, 'time': '2001-03-01T09:00:00', 'user': 'alice', 'logon_id': '0x1001'},
+    ]),
+    ('security-2025.evtx', 3, [
+        {'record_number': 4, 'event_id': 4624, 'time': '2025-06-02T08:00:00', 'user': 'alice', 'logon_id': '0x2001'},
+        {'record_number': 5, 'event_id': 4624, 'time': '2025-06-02T08:10:00', 'user': 'bob', 'logon_id': '0x2002'},
+        {'record_number': 6, 'event_id': 4634, 'time': '2025-06-02T08:40:00', 'user': 'bob', 'logon_id': '0x2002'},
+        {'record_number': 7, 'event_id': 4634, 'time': '2025-06-02T09:00:00', 'user': 'alice', 'logon_id': '0x2001'},
+        {'record_number': 8, 'event_id': 4672, 'time': '2025-06-02T09:01:00', 'user': 'alice'},
+    ]),
+]
+
+
+def to_filetime(time_text: str) -> int:
+    """FILETIME of a UTC time given as ISO text."""
+    moment = datetime.fromisoformat(time_text).replace(tzinfo=timezone.utc)
+    return int((moment - FILETIME_EPOCH).total_seconds()) * 10_000_000
+
+
+def _name(text: str) -> bytes:
+    """An inline name: next-name offset, hash, length, UTF-16 characters and terminator."""
+    return struct.pack('<IHH', 0, 0, len(text)) + text.encode('utf-16-le') + b'\x00\x00'
+
+
+class _Fragment:
+    """BinXML written at a known chunk offset, so inline names can point at themselves."""
+
+    def __init__(self, base: int):
+        self.base = base
+        self.data = bytearray()
+
+    def open(self, name: str, attributes: Sequence[str] = ()) -> None:
+        token = TOKEN_OPEN_START_ELEMENT | (0x40 if attributes else 0)
+        node = self.base + len(self.data)
+        self.data += bytes([token]) + struct.pack('<HI', 0xFFFF, 0)
+        self.data += struct.pack('<I', node + 11) + _name(name)
+        if attributes:
+            self.data += struct.pack('<I', 0)
+
+    def attribute(self, name: str) -> None:
+        node = self.base + len(self.data)
+        self.data += bytes([TOKEN_ATTRIBUTE]) + struct.pack('<I', node + 5) + _name(name)
+
+    def substitution(self, index: int, value_type: int) -> None:
+        self.data += bytes([TOKEN_OPTIONAL_SUBSTITUTION]) + struct.pack('<HB', index, value_type)
+
+    def element(self, name: str, index: int, value_type: int) -> None:
+        self.open(name)
+        self.data += bytes([TOKEN_CLOSE_START_ELEMENT])
+        self.substitution(index, value_type)
+        self.data += bytes([TOKEN_END_ELEMENT])
+
+
+def _template(base: int) -> bytes:
+    """Event/System/{EventID, Task, TimeCreated, Computer} and EventData/Data, all substituted."""
+    body = _Fragment(base)
+    body.data += bytes([TOKEN_FRAGMENT_HEADER, 1, 1, 0])
+    body.open('Event')
+    body.data += bytes([TOKEN_CLOSE_START_ELEMENT])
+    body.open('System')
+    body.data += bytes([TOKEN_CLOSE_START_ELEMENT])
+    body.element('EventID', 0, TYPE_UINT16)
+    body.element('Task', 1, TYPE_UINT16)
+    body.open('TimeCreated', attributes=['SystemTime'])
+    body.attribute('SystemTime')
+    body.substitution(2, TYPE_FILETIME)
+    body.data += bytes([TOKEN_CLOSE_EMPTY_ELEMENT])
+    body.element('Computer', 3, TYPE_WSTRING)
+    body.data += bytes([TOKEN_END_ELEMENT])
+    body.open('EventData')
+    body.data += bytes([TOKEN_CLOSE_START_ELEMENT])
+    for index in range(DATA_FIELDS):
+        body.element('Data', 4 + index, TYPE_WSTRING)
+    body.data += bytes([TOKEN_END_ELEMENT, TOKEN_END_ELEMENT, TOKEN_END_OF_STREAM])
+    return bytes(body.data)
+
+
+def _values(event_id: int, filetime: int, host: str, inserts: List[str]) -> bytes:
+    values = [
+        (struct.pack('<H', event_id), TYPE_UINT16),
+        (struct.pack('<H', 12544), TYPE_UINT16),
+        (struct.pack('<Q', filetime), TYPE_FILETIME),
+        (host.encode('utf-16-le'), TYPE_WSTRING),
+    ]
+    for index in range(DATA_FIELDS):
+        text = inserts[index] if index < len(inserts) else ''
+        values.append((text.encode('utf-16-le'), TYPE_WSTRING if text else TYPE_NULL))
+    descriptors = b''.join(struct.pack('<HBB', len(raw), value_type, 0) for raw, value_type in values)
+    return struct.pack('<I', len(values)) + descriptors + b''.join(raw for raw, _ in values)
+
+
+def _record(entry: Dict[str, Any], resident: bool) -> bytes:
+    event_id = entry['event_id']
+    filetime = to_filetime(entry['time'])
+    inserts = []
+    if event_id in (4624, 4625, 4634):
+        # Interactive, so the pipeline keeps the logons as human sessions
+        inserts = rebuild_string_inserts({'logon_type': 'Interactive', **entry}, event_id)
+
+    body = bytearray([TOKEN_FRAGMENT_HEADER, 1, 1, 0])
+    body += bytes([TOKEN_TEMPLATE_INSTANCE, 0x01]) + struct.pack('<II', 0, TEMPLATE_OFFSET)
+    if resident:
+        # Later records of the chunk point back at this definition
+        template = _template(TEMPLATE_OFFSET + 24)
+        body += struct.pack('<I', 0) + TEMPLATE_GUID + struct.pack('<I', len(template)) + template
+    body += _values(event_id, filetime, entry.get('host', HOST), inserts)
+
+    size = 24 + len(body) + 4
+    header = RECORD_MAGIC + struct.pack('<IQQ', size, entry['record_number'], filetime)
+    return header + bytes(body) + struct.pack('<I', size)
+
+
+def build_evtx(path: str, entries: Sequence[Dict[str, Any]], records_per_chunk: int) -> None:
+    """Write entries, oldest first, to an .evtx file with records_per_chunk records per chunk."""
+    data = bytearray(FILE_HEADER_SIZE)
+    data[:8] = FILE_MAGIC
+    for start in range(0, len(entries), records_per_chunk):
+        batch = entries[start:start + records_per_chunk]
+        chunk = bytearray(CHUNK_HEADER_SIZE)
+        chunk[:8] = CHUNK_MAGIC
+        for position, entry in enumerate(batch):
+            chunk += _record(entry, resident=position == 0)
+        first, last = batch[0]['record_number'], batch[-1]['record_number']
+        struct.pack_into('<QQQQ', chunk, 8, first, last, first, last)
+        struct.pack_into('<III', chunk, 40, 128, 0, len(chunk))
+        data += chunk + bytes(CHUNK_SIZE - len(chunk))
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def main() -> None:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    for name, records_per_chunk, entries in FIXTURES:
+        path = os.path.join(DATA_DIR, name)
+        build_evtx(path, entries, records_per_chunk)
+        print(f"Wrote {path}")
+
+
+if __name__ == '__main__':
+    main()
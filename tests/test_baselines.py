@@ -0,0 +1,48 @@
+from backend.baselines import BaselineStore
+from backend.log_entry import LogEntry
+
+DAY = 86400
+
+
+def _logon(day, hour):
+    return LogEntry(
+        epoch=day * DAY + hour * 3600, event_type='Logon', user='alice',
+        day_of_week='Monday', hour_of_day=hour, logon_type='Interactive'
+    )
+
+
+def test_newest_first_run_is_scored_against_earlier_runs_only():
+    store = BaselineStore()
+    for day in range(10):
+        store.observe(_logon(day, 9))
+    assert store.commit() == 10
+
+    # A newest-first run of logons at an hour never seen before
+    rarities = [store.observe(_logon(day, 3)) for day in range(19, 9, -1)]
+    assert rarities == [1.0] * 10
+
+    store.commit()
+    assert store.observe(_logon(20, 3)) < 1.0
+
+
+def test_commit_learns_in_time_order_whatever_the_read_order():
+    forward, backward = BaselineStore(), BaselineStore()
+    logons = [_logon(day, 9 + day % 3) for day in range(30)]
+    for log_entry in logons:
+        forward.observe(log_entry)
+    for log_entry in reversed(logons):
+        backward.observe(log_entry)
+    forward.commit()
+    backward.commit()
+
+    assert backward.to_dict() == forward.to_dict()
+
+
+def test_discarded_run_is_not_learnt():
+    store = BaselineStore()
+    for day in range(10):
+        store.observe(_logon(day, 9))
+    store.discard()
+
+    assert store.commit() == 0
+    assert 'alice' not in store
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from backend.columnar_export import MAX_PARTITION_FILES, ColumnarExporter, _data_files
+from backend.log_entry import LogEntry
+
+pytest.importorskip('pyarrow')
+
+DAY = 86400
+
+
+def _entries(start, count, host='DC01'):
+    # Newest first, as collected
+    return [
+        LogEntry(epoch=start + n * 60, event_type='Logon', user=f"user{n % 3}", host=host, logon_type='Interactive')
+        for n in range(count - 1, -1, -1)
+    ]
+
+
+def _partition(exporter, day, host):
+    return os.path.join(exporter.directory, f"date={day}", f"host={host}")
+
+
+def test_written_rows_read_back_oldest_first(tmp_path):
+    exporter = ColumnarExporter(str(tmp_path))
+    assert exporter.write(_entries(0, 5) + _entries(DAY, 5, host='DC02')) == 10
+
+    table = exporter.query(start='1970-01-02')
+    assert table.column('epoch').to_pylist() == [DAY + n * 60 for n in range(5)]
+    assert set(table.column('host').to_pylist()) == {'DC02'}
+    assert exporter.query(users=['user1']).num_rows == 4
+
+
+def test_small_writes_are_merged_per_partition(tmp_path):
+    exporter = ColumnarExporter(str(tmp_path))
+    for run in range(3 * MAX_PARTITION_FILES):
+        exporter.write(_entries(run * 600, 5))
+
+    files = _data_files(_partition(exporter, '1970-01-01', 'DC01'))
+    assert 1 <= len(files) <= MAX_PARTITION_FILES
+    epochs = exporter.query().column('epoch').to_pylist()
+    assert epochs == sorted(run * 600 + n * 60 for run in range(3 * MAX_PARTITION_FILES) for n in range(5))
+
+    assert exporter.compact() == (1 if len(files) > 1 else 0)
+    assert len(_data_files(_partition(exporter, '1970-01-01', 'DC01'))) == 1
+    assert exporter.query().column('epoch').to_pylist() == epochs
@@ -0,0 +1,54 @@
+import os
+
+from backend.csv_index import CsvRowIndex, _HEADER, append_unique_rows, compact
+
+COLUMNS = ['user', 'risk_score']
+
+
+def _rows(count, start=0):
+    return [(f"user{n}", n) for n in range(start, start + count)]
+
+
+def _lines(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def test_rebuild_indexes_every_row(tmp_path):
+    path = str(tmp_path / 'logons.csv')
+    append_unique_rows(path, COLUMNS, _rows(50))
+
+    index = CsvRowIndex(path)
+    index.rebuild()
+    assert os.path.getsize(index.index_path) == _HEADER.size + 50 * 8
+    assert index.load()
+    assert len(index) == 50
+
+
+def test_reappending_the_same_rows_adds_nothing(tmp_path):
+    path = str(tmp_path / 'logons.csv')
+    assert append_unique_rows(path, COLUMNS, _rows(50)) == 50
+    assert append_unique_rows(path, COLUMNS, _rows(50)) == 0
+    assert len(_lines(path)) == 51
+
+
+def test_append_after_rebuild_keeps_earlier_rows(tmp_path):
+    path = str(tmp_path / 'logons.csv')
+    append_unique_rows(path, COLUMNS, _rows(10))
+    CsvRowIndex(path).rebuild()
+
+    assert append_unique_rows(path, COLUMNS, _rows(15)) == 5
+    assert append_unique_rows(path, COLUMNS, _rows(20)) == 5
+    assert len(_lines(path)) == 21
+    assert CsvRowIndex(path).load()
+
+
+def test_append_after_compact_keeps_earlier_rows(tmp_path):
+    path = str(tmp_path / 'logons.csv')
+    append_unique_rows(path, COLUMNS, _rows(10))
+    with open(path, 'a', encoding='utf-8', newline='') as f:
+        f.write(f"user0,0{os.linesep}user1,1{os.linesep}")
+
+    assert compact(path) == (10, 2)
+    assert append_unique_rows(path, COLUMNS, _rows(12)) == 2
+    assert len(_lines(path)) == 13
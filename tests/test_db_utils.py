@@ -0,0 +1,21 @@
+import os
+import sqlite3
+
+from database.db_utils import ConnectionManager
+
+
+def test_close_checkpoints_the_wal_and_removes_its_files(tmp_path):
+    db_name = str(tmp_path / 'sessions.db')
+    manager = ConnectionManager()
+    manager.check_schema(db_name)
+    with manager.writer(db_name) as conn:
+        conn.executemany("INSERT INTO session_logs (epoch, user) VALUES (?, ?)", [(i, 'alice') for i in range(100)])
+    # A pooled reader left open would keep the WAL from being checkpointed
+    with manager.reader(db_name) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM session_logs").fetchone() == (100,)
+    assert os.path.exists(db_name + '-wal')
+
+    manager.close()
+
+    assert sorted(os.listdir(tmp_path)) == ['sessions.db']
+    assert sqlite3.connect(db_name).execute("SELECT COUNT(*) FROM session_logs").fetchone() == (100,)
@@ -0,0 +1,62 @@
+import os
+from datetime import datetime, timezone
+
+import pytest
+
+from backend.bookmarks import BookmarkStore
+from backend.evtx_reader import EvtxEventSource, evtx_sources
+from backend.sharding import iter_sharded_session_events
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+ARCHIVE = os.path.join(DATA_DIR, 'security-2001.evtx')
+CURRENT = os.path.join(DATA_DIR, 'security-2025.evtx')
+
+
+def _days_since(year):
+    return (datetime.now(timezone.utc) - datetime(year, 1, 1, tzinfo=timezone.utc)).days
+
+
+def test_reads_session_events_newest_chunk_first():
+    source = EvtxEventSource(CURRENT)
+    with source:
+        batches = [[event.RecordNumber for event in events] for events in source.read_batches()]
+
+    # 4672 is not a session event and is not decoded
+    assert batches == [[7], [6, 5, 4]]
+    assert source.record_range() == (4, 8)
+    assert source.host == CURRENT
+
+
+def test_decodes_string_inserts_like_the_live_log():
+    with EvtxEventSource(ARCHIVE) as source:
+        events = [event for events in source.read_batches() for event in events]
+
+    logoff, failed, logon = events
+    assert (logon.EventID, logon.StringInserts[5], logon.StringInserts[7]) == (4624, 'alice', '0x1001')
+    assert (failed.EventID, failed.StringInserts[7], failed.StringInserts[19]) == (4625, '0xc000006a', '203.0.113.7')
+    assert (logoff.EventID, logoff.StringInserts[1], logoff.StringInserts[3]) == (4634, 'alice', '0x1001')
+    assert logon.TimeGenerated == datetime(2001, 3, 1, 8, 0, tzinfo=timezone.utc)
+    assert logon.ComputerName == 'DC01.corp.example'
+
+
+def test_one_source_per_file():
+    with pytest.raises(TypeError):
+        EvtxEventSource([ARCHIVE, CURRENT])
+
+
+def test_older_file_first_does_not_stop_the_read_or_share_a_bookmark(tmp_path):
+    bookmarks = BookmarkStore(str(tmp_path / 'bookmarks.json'))
+
+    # The older file is entirely before the cutoff; the newer one must still be read
+    entries = [
+        entry
+        for batch in iter_sharded_session_events(
+            evtx_sources([ARCHIVE, CURRENT]), workers=1, days_back=_days_since(2010), bookmarks=bookmarks
+        )
+        for entry in batch
+    ]
+
+    assert [entry.record_number for entry in entries] == [7, 6, 5, 4]
+    assert [entry.session_duration for entry in entries] == [3600.0, 1800.0, 1800.0, 3600.0]
+    assert bookmarks.get(ARCHIVE, 'Security') == 3
+    assert bookmarks.get(CURRENT, 'Security') == 7
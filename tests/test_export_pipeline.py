@@ -0,0 +1,19 @@
+from backend.export_pipeline import export_features, model_features
+from backend.log_entry import LogEntry
+
+
+def _logons(statuses):
+    # Newest first, as collected
+    return [
+        LogEntry(epoch=1000 - n * 60, event_type='Logon', user='alice', status=status, risk_score=n, day_of_week='Monday')
+        for n, status in enumerate(statuses)
+    ]
+
+
+def test_export_and_reader_model_inputs_agree_whatever_values_appear():
+    for statuses in (['success'] * 3, ['failed'] * 3, ['success', 'failed', 'success']):
+        entries = _logons(statuses)
+        exported = export_features(entries).model_input
+        # tail_archive returns the newest window oldest first
+        assert exported == model_features([entry.to_dict() for entry in reversed(entries)])
+        assert exported['status'] == (1 if statuses[0] == 'success' else 0)
@@ -0,0 +1,64 @@
+import random
+
+from backend.history_store import SessionHistoryStore, estimate_entry_size
+from backend.log_entry import LogEntry
+
+
+def _entry(epoch, user='alice'):
+    return LogEntry(epoch=epoch, event_type='Logon', user=user)
+
+
+def _epochs(store, user='alice'):
+    return [entry.epoch for entry in store[user]]
+
+
+def test_user_cap_keeps_newest_entries_of_newest_first_stream():
+    store = SessionHistoryStore(max_per_user=3)
+    for epoch in range(1010, 1000, -1):
+        store.append(_entry(epoch))
+
+    assert _epochs(store) == [1008, 1009, 1010]
+    assert store.evicted_by_user_cap == 7
+
+
+def test_user_cap_keeps_newest_entries_of_forward_stream():
+    store = SessionHistoryStore(max_per_user=3)
+    for epoch in range(1001, 1011):
+        store.append(_entry(epoch))
+
+    assert _epochs(store) == [1008, 1009, 1010]
+
+
+def test_age_check_drops_oldest_entries_of_newest_first_stream():
+    store = SessionHistoryStore(retention_seconds=100)
+    for epoch in (1200, 1150, 1120, 1090, 1010):
+        store.append(_entry(epoch))
+
+    assert _epochs(store) == [1120, 1150, 1200]
+    assert store.evicted_by_age == 2
+
+
+def test_shuffled_stream_keeps_newest_entries_in_order():
+    epochs = list(range(1000, 1200))
+    random.Random(3).shuffle(epochs)
+    store = SessionHistoryStore(max_per_user=20)
+    for epoch in epochs:
+        store.append(_entry(epoch))
+
+    assert _epochs(store) == list(range(1180, 1200))
+
+
+def test_memory_budget_evicts_smallest_epoch_of_least_recent_user():
+    store = SessionHistoryStore()
+    for epoch in (1005, 1004, 1003):
+        store.append(_entry(epoch, 'bob'))
+    store.append(_entry(1001, 'alice'))
+    newer = _entry(1002, 'alice')
+    # Room for the new entry once one of bob's is evicted
+    store.max_bytes = store.memory_bytes + estimate_entry_size(newer) - 1
+
+    store.append(newer)
+
+    assert _epochs(store, 'bob') == [1004, 1005]
+    assert _epochs(store) == [1001, 1002]
+    assert store.evicted_by_budget == 1
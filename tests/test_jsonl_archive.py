@@ -0,0 +1,27 @@
+from backend.jsonl_archive import JsonlArchive, RotationPolicy, compress_segment, iter_records
+from backend.window_reader import iter_archive_reverse
+
+DAY = 86400
+
+
+def _archive(tmp_path):
+    archive = JsonlArchive(str(tmp_path), 'session_logons', RotationPolicy(compression=None))
+    archive.append([{'epoch': day * DAY + offset, 'user': 'alice'} for day in range(3) for offset in (10, 20)])
+    return archive
+
+
+def test_segment_compressed_after_listing_is_read_from_its_copy(tmp_path):
+    archive = _archive(tmp_path)
+    listed = archive.segments()
+    compress_segment(listed[0], 'gzip')
+
+    assert [record['epoch'] for record in iter_records(listed)] == [10, 20, DAY + 10, DAY + 20, 2 * DAY + 10, 2 * DAY + 20]
+
+
+def test_reverse_read_follows_a_segment_compressed_after_listing(tmp_path, monkeypatch):
+    archive = _archive(tmp_path)
+    listed = archive.segments()
+    compress_segment(listed[1], 'gzip')
+    monkeypatch.setattr(archive, 'segments', lambda: listed)
+
+    assert [record['epoch'] for record in iter_archive_reverse(archive)] == [2 * DAY + 20, 2 * DAY + 10, DAY + 20, DAY + 10, 20, 10]
@@ -0,0 +1,82 @@
+import random
+
+from backend.analyzer import SessionAnalyzer
+from backend.log_entry import LogEntry
+from backend.state_snapshot import StateSnapshot
+
+
+def _logon(epoch, user='alice'):
+    return LogEntry(epoch=epoch, event_type='Logon', user=user)
+
+
+def _run(analyzer, epochs, user='alice'):
+    """Check and record logons as the collector does, returning the rapid flags."""
+    flags = []
+    for epoch in epochs:
+        entry = _logon(epoch, user)
+        flags.append(analyzer.is_rapid_login(entry))
+        analyzer.record_session(entry)
+    return flags
+
+
+def _restored(analyzer, tmp_path):
+    snapshot = StateSnapshot(str(tmp_path / 'state.json'), analyzer)
+    restored = SessionAnalyzer()
+    StateSnapshot(str(tmp_path / 'state.json'), restored).restore(snapshot.to_dict())
+    return restored
+
+
+def _scan(history, epoch, window=60, threshold=2):
+    """The full scan over every earlier logon that the window replaces."""
+    return sum(abs(earlier - epoch) <= window for earlier in history) >= threshold
+
+
+def test_restore_then_newer_logon_is_not_rapid(tmp_path):
+    analyzer = SessionAnalyzer()
+    _run(analyzer, [1000, 995, 990])
+
+    restored = _restored(analyzer, tmp_path)
+
+    # Only 1000 is within 60 s of 1058
+    assert restored.is_rapid_login(_logon(1058)) is False
+
+
+def test_newest_first_runs_across_restores_match_full_scan(tmp_path):
+    rng = random.Random(7)
+    analyzer = SessionAnalyzer()
+    history = []
+    newest = 10_000
+    for run in range(40):
+        # Each bookmarked run reads events newer than the last, newest first
+        epochs = sorted((newest + rng.randint(1, 400) for _ in range(rng.randint(1, 8))), reverse=True)
+        newest = epochs[0]
+        if run % 3 == 0:
+            analyzer = _restored(analyzer, tmp_path)
+        for epoch, flag in zip(epochs, _run(analyzer, epochs)):
+            assert flag == _scan(history, epoch), (run, epoch)
+            history.append(epoch)
+
+
+def test_oldest_first_run_after_restore_matches_full_scan(tmp_path):
+    analyzer = SessionAnalyzer()
+    history = [1000, 980, 960]
+    _run(analyzer, history)
+    analyzer = _restored(analyzer, tmp_path)
+
+    epochs = [1010, 1030, 1100, 1120, 1125, 1300]
+    for epoch, flag in zip(epochs, _run(analyzer, epochs)):
+        assert flag == _scan(history, epoch), epoch
+        history.append(epoch)
+
+
+def test_oldest_first_replay_matches_full_scan_in_bounded_memory():
+    rng = random.Random(11)
+    analyzer = SessionAnalyzer()
+    history = []
+    epoch = 50_000
+    for _ in range(2000):
+        epoch += rng.randint(0, 90)
+        assert analyzer.is_rapid_login(_logon(epoch)) == _scan(history, epoch), epoch
+        analyzer.record_session(_logon(epoch))
+        history.append(epoch)
+    assert len(analyzer.recent_logons['alice']) < 20
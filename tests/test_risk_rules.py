@@ -0,0 +1,36 @@
+import logging
+import os
+import shutil
+
+from backend.risk_rules import DEFAULT_RULES_PATH, load_rules, reload_if_changed
+
+
+def _touch(path, seconds):
+    os.utime(path, ns=(seconds * 10**9, seconds * 10**9))
+
+
+def test_broken_rules_file_is_reported_once_per_change(tmp_path, caplog):
+    path = str(tmp_path / 'risk_rules.json')
+    shutil.copy(DEFAULT_RULES_PATH, path)
+    _touch(path, 1000)
+    rules = load_rules(path)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"version": 1, "rules": [')
+    _touch(path, 2000)
+    with caplog.at_level(logging.ERROR):
+        assert reload_if_changed(rules) is None
+        assert reload_if_changed(rules) is None
+    assert len(caplog.records) == 1
+
+    # Still broken, but changed again: reported again
+    _touch(path, 3000)
+    with caplog.at_level(logging.ERROR):
+        assert reload_if_changed(rules) is None
+    assert len(caplog.records) == 2
+
+    shutil.copy(DEFAULT_RULES_PATH, path)
+    _touch(path, 4000)
+    reloaded = reload_if_changed(rules)
+    assert reloaded is not None and reloaded.factor_names == rules.factor_names
+    assert reload_if_changed(reloaded) is None
@@ -0,0 +1,52 @@
+import os
+import random
+
+from backend.run_spool import RunSpool
+
+
+def _record(epoch, user='alice'):
+    return {'epoch': epoch, 'user': user}
+
+
+def test_newest_first_batches_read_back_oldest_first(tmp_path):
+    spool = RunSpool(str(tmp_path))
+    order = 0
+    for newest in range(1000, 0, -100):
+        batch = []
+        for epoch in range(newest, newest - 100, -1):
+            batch.append((order, _record(epoch)))
+            order += 1
+        spool.add(batch)
+
+    assert len(spool) == 1000
+    assert [record['epoch'] for record in spool.iter_records()] == list(range(1, 1001))
+    assert [len(records) for records in spool.iter_slices(300)] == [300, 300, 300, 100]
+
+
+def test_overlapping_chunks_merge_in_time_then_collection_order(tmp_path):
+    rng = random.Random(5)
+    items = [(order, _record(rng.randrange(50), f"user{order}")) for order in range(400)]
+    spool = RunSpool(str(tmp_path))
+    for start in range(0, len(items), 37):
+        spool.add(items[start:start + 37])
+
+    expected = [record for _, record in sorted(items, key=lambda item: (item[1]['epoch'], item[0]))]
+    assert list(spool.iter_records()) == expected
+
+
+def test_close_removes_the_file_and_empties_the_spool(tmp_path):
+    spool = RunSpool(str(tmp_path))
+    assert list(spool.iter_records()) == []
+    assert os.listdir(tmp_path) == []
+
+    spool.add([(0, _record(1))])
+    path = spool.path
+    assert os.path.exists(path)
+
+    spool.close()
+    assert not os.path.exists(path)
+    assert len(spool) == 0 and list(spool.iter_records()) == []
+
+    spool.add([(0, _record(2))])
+    assert [record['epoch'] for record in spool.iter_records()] == [2]
+    spool.close()
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+from backend.event_source import EventRecord
+from backend.sharding import ShardedAnalyzer
+
+BASE_EPOCH = 1_738_368_000
+
+
+def _logon(epoch, user, logon_id, record_number):
+    data = [''] * 21
+    data[1], data[4], data[5], data[6], data[7], data[8] = 'WS1', 'S-1-5-21', user, 'CORP', logon_id, '2'
+    data[18], data[20] = '-', '%%1843'
+    return _event(4624, epoch, data, record_number)
+
+
+def _logoff(epoch, user, logon_id, record_number):
+    return _event(4634, epoch, ['S-1-5-21', user, 'CORP', logon_id, '2'], record_number)
+
+
+def _event(event_id, epoch, data, record_number):
+    return EventRecord(
+        EventID=event_id,
+        TimeGenerated=datetime.fromtimestamp(epoch, tz=timezone.utc),
+        StringInserts=data,
+        RecordNumber=record_number,
+        ComputerName='host1',
+    )
+
+
+def test_durations_reach_entries_from_earlier_batches():
+    # Ten sessions of 100 s, read newest first: every logoff is 10 events ahead of its logon
+    events = []
+    for i in range(10):
+        epoch = BASE_EPOCH + 1000 - i
+        events.append((epoch, _logoff(epoch, f"user{i % 3}", f"0x{i:x}", 100 - i)))
+    for i in range(10):
+        epoch = BASE_EPOCH + 900 - i
+        events.append((epoch, _logon(epoch, f"user{i % 3}", f"0x{i:x}", 50 - i)))
+
+    entries = []
+    with ShardedAnalyzer(workers=2) as sharded:
+        for start in range(0, len(events), 4):
+            entries.extend(sharded.enrich(events[start:start + 4]))
+
+    assert len(entries) == 20
+    assert [entry.session_duration for entry in entries] == [100.0] * 20
+
+
+def test_equal_record_numbers_from_two_sources_keep_their_own_durations():
+    # Two replays of one host's log: the same RecordNumbers, different sessions
+    events = [
+        (BASE_EPOCH + 1000, _logoff(BASE_EPOCH + 1000, 'alice', '0x1', 11)),
+        (BASE_EPOCH + 990, _logoff(BASE_EPOCH + 990, 'bob', '0x2', 11)),
+        (BASE_EPOCH + 900, _logon(BASE_EPOCH + 900, 'alice', '0x1', 10)),
+        (BASE_EPOCH + 800, _logon(BASE_EPOCH + 800, 'bob', '0x2', 10)),
+    ]
+    sources = [0, 1, 0, 1]
+
+    entries = []
+    with ShardedAnalyzer(workers=2) as sharded:
+        for start in range(len(events)):
+            entries.extend(sharded.enrich(events[start:start + 1], sources=sources[start:start + 1]))
+        assert not any(sharded.is_waiting(entry) for entry in entries)
+
+    assert [entry.session_duration for entry in entries] == [100.0, 190.0, 100.0, 190.0]
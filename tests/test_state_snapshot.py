@@ -0,0 +1,70 @@
+import os
+from datetime import datetime, timezone
+
+from backend.analyzer import SessionAnalyzer
+from backend.bookmarks import BookmarkStore
+from backend.event_logger import analyzer, iter_session_events
+from backend.evtx_reader import EvtxEventSource
+from backend.log_entry import LogEntry
+from backend.state_snapshot import StateSnapshot
+
+CURRENT = os.path.join(os.path.dirname(__file__), 'data', 'security-2025.evtx')
+DAYS_BACK = (datetime.now(timezone.utc) - datetime(2010, 1, 1, tzinfo=timezone.utc)).days
+
+
+def _restart(snapshot):
+    """Start over with empty state, as a new process does, then load the snapshot."""
+    analyzer.restore_recent_logons({})
+    analyzer.sessions.clear()
+    analyzer.baselines.clear()
+    snapshot.load()
+
+
+def _read(bookmarks):
+    return iter_session_events(source=EvtxEventSource(CURRENT), days_back=DAYS_BACK, bookmarks=bookmarks)
+
+
+def test_crash_then_restart_records_each_logon_once(tmp_path):
+    bookmarks = BookmarkStore(str(tmp_path / 'bookmarks.json'))
+    snapshot = StateSnapshot(str(tmp_path / 'state.json'), analyzer, bookmarks)
+    _restart(snapshot)
+
+    # The first run dies after one entry, before its bookmark or snapshot is saved
+    events = _read(bookmarks)
+    next(events)
+    events.close()
+    assert bookmarks.get(CURRENT, 'Security') is None
+
+    _restart(snapshot)
+    entries = list(_read(bookmarks))
+    snapshot.save()
+    logons = {entry.user: [entry.epoch] for entry in entries if entry.event_type == 'Logon'}
+    assert dict(analyzer.recent_logons) == logons
+
+    # A clean restart finds the run complete and reads nothing again
+    _restart(snapshot)
+    assert list(_read(BookmarkStore(str(tmp_path / 'bookmarks.json')))) == []
+    assert dict(analyzer.recent_logons) == logons
+
+
+def test_snapshot_ahead_of_bookmarks_drops_windows_and_open_sessions(tmp_path):
+    saved = SessionAnalyzer()
+    saved.record_session(LogEntry(epoch=1000, event_type='Logon', user='alice'))
+    saved.sessions.restore_open_logons([LogEntry(epoch=1000, host='h', event_type='Logon', user='alice', logon_id='0x1')])
+    saved.baselines.observe(LogEntry(epoch=1000, event_type='Logon', user='alice'))
+    saved.baselines.commit()
+    bookmarks = BookmarkStore(str(tmp_path / 'bookmarks.json'))
+    bookmarks.update('h', 'Security', 10)
+    data = StateSnapshot(str(tmp_path / 'state.json'), saved, bookmarks).to_dict()
+
+    # The bookmarks were lost, so records up to 10 will be read again
+    restored = SessionAnalyzer()
+    StateSnapshot(str(tmp_path / 'state.json'), restored, BookmarkStore(str(tmp_path / 'lost.json'))).restore(data)
+    assert not any(restored.recent_logons.values())
+    assert not restored.sessions.open_logons
+    assert 'alice' in restored.baselines
+
+    restored = SessionAnalyzer()
+    StateSnapshot(str(tmp_path / 'state.json'), restored, bookmarks).restore(data)
+    assert restored.recent_logons['alice'] == [1000]
+    assert len(restored.sessions.open_logons) == 1